@@ -1,17 +1,56 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
-from process_manager import ProcessManager
-from domain_manager import load_domains, save_domains, apply_active_domain
+from process_manager import ProcessManager, HEALTH_CHECK_INTERVAL, MAX_LOG_LINES
+from domain_manager import DOMAINS_FILE, load_domains, save_domains, start_apply_job, get_job
+from domain_prober import DomainProber
+from job_runner import JobRunner
+import config_store
+import dir_browser
+import file_watch
+import health_probe
+import log_export
+import log_parse
+import metrics
+import profiling
+import scheduler
 import mq_store
+import serving
+from serving import offload, sse_event, sse_headers
+import argparse
+import json
 import os
 import subprocess
 import re
+import threading
+import time
+
+LOG_STREAM_INTERVAL = 0.5  # seconds between log tail checks per stream
+MQ_STREAM_INTERVAL = 1.0  # seconds between MQ change checks per stream
+JOB_STREAM_INTERVAL = 0.25  # seconds between job progress checks per stream
+STREAM_KEEPALIVE = 15  # seconds of silence before a keepalive comment
+MERGED_PAGE = 500  # lines per merged-log page / stream event
 
 app = Flask(__name__, static_folder="../frontend", static_url_path="")
 CORS(app)
 
-manager = ProcessManager()
-manager.cleanup_and_start_all()
+if os.environ.get("CMD_PATROL_SUPERVISOR"):
+    # Services live in supervisor.py; this process is a restartable front end
+    from supervisor import RemoteManager
+    manager = RemoteManager()
+else:
+    manager = ProcessManager()
+    manager.cleanup_and_start_all()
+    manager.start_watching()
+    manager.start_sampling()
+    manager.start_probing()
+    manager.start_scheduling()
+
+prober = DomainProber()
+prober.start()
+# load_domains() caches by file signature; external edits just need a re-probe
+file_watch.watch(DOMAINS_FILE, lambda _: prober.wake())
+jobs = JobRunner()
+NGROK_TIMEOUT = 30  # seconds
 
 
 @app.route("/")
@@ -19,10 +58,161 @@ def index():
     return send_from_directory(app.static_folder, "index.html")
 
 
+# ── Metrics ──
+http_requests = metrics.Counter("cmd_patrol_http_requests_total", "HTTP requests handled",
+                                ("endpoint", "method", "status"))
+http_latency = metrics.Histogram("cmd_patrol_http_request_duration_seconds",
+                                 "Time to produce the response (streams: until the first byte)",
+                                 ("endpoint", "method"))
+
+
+@app.before_request
+def _start_timer():
+    request.environ["cmd_patrol.t0"] = time.perf_counter()
+
+
+@app.after_request
+def _observe_request(resp):
+    t0 = request.environ.get("cmd_patrol.t0")
+    if t0 is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+        http_latency.observe(time.perf_counter() - t0, endpoint, request.method)
+        http_requests.inc(endpoint, request.method, str(resp.status_code))
+    return resp
+
+
+@metrics.collector
+def _service_metrics():
+    rows = manager.metrics()
+    def per(key):
+        return [({"service": r["name"], "id": r["id"], "group": r["group"]}, r[key]) for r in rows]
+    return [
+        ("cmd_patrol_service_up", "gauge", "1 if the service is running",
+         [({"service": r["name"], "id": r["id"], "group": r["group"]}, int(r["status"] == "running")) for r in rows]),
+        ("cmd_patrol_service_status", "gauge", "Current lifecycle status (1 for the active one)",
+         [({"service": r["name"], "id": r["id"], "status": r["status"]}, 1) for r in rows]),
+        ("cmd_patrol_service_health", "gauge", "Active probe verdict (1 for the current one; services with probes)",
+         [({"service": r["name"], "id": r["id"], "health": r["health"]}, 1) for r in rows if r.get("health")]),
+        ("cmd_patrol_service_uptime_seconds", "gauge", "Seconds since the current run started", per("uptime")),
+        ("cmd_patrol_service_restarts_total", "counter", "Restarts via the API", per("restarts")),
+        ("cmd_patrol_log_lines_total", "counter", "Log lines ingested", per("log_lines")),
+        ("cmd_patrol_log_bytes_total", "counter", "Raw log bytes ingested", per("log_bytes")),
+        ("cmd_patrol_log_dropped_total", "counter", "Log lines evicted from the buffer (size/age limits)", per("log_dropped")),
+        ("cmd_patrol_log_buffered_lines", "gauge", "Log lines currently held in memory", per("log_buffered")),
+        ("cmd_patrol_log_compressed_bytes", "gauge", "Compressed size of older log lines held in memory",
+         per("log_compressed_bytes")),
+        ("cmd_patrol_log_level_lines_total", "counter", "Parsed log lines by level (services with a log_format)",
+         [({"service": r["name"], "id": r["id"], "level": level}, n)
+          for r in rows for level, n in r.get("log_levels", {}).items()]),
+    ]
+
+
+@metrics.collector
+def _mq_metrics():
+    depth = mq_store.depth()
+    return [
+        ("cmd_patrol_mq_messages", "gauge", "Messages in the queue by status and source",
+         [({"status": status, "source": source}, n) for (status, source), n in sorted(depth.items())]),
+        ("cmd_patrol_mq_published_total", "counter", "Messages published since backend start",
+         [({}, mq_store.published_total())]),
+    ]
+
+
+@metrics.collector
+def _job_metrics():
+    counts = {}
+    for job in jobs.list_all():
+        counts[job.job_status] = counts.get(job.job_status, 0) + 1
+    return [("cmd_patrol_jobs", "gauge", "Retained ad-hoc command jobs by status",
+             [({"status": status}, n) for status, n in sorted(counts.items())])]
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+
+@app.route("/debug/spans", methods=["GET"])
+def debug_spans():
+    if isinstance(manager, ProcessManager):
+        return jsonify({"spans": profiling.span_stats()})
+    return jsonify({"spans": profiling.span_stats(), "supervisor_spans": manager.span_stats()})
+
+
+def _profile_processes(seconds: float, interval: float) -> dict:
+    """Sample this process, and in supervisor mode the supervisor too, over the same window."""
+    if isinstance(manager, ProcessManager):
+        return profiling.merge({"app": profiling.sample(seconds, interval)})
+    remote = {}
+
+    def supervisor_side():
+        try:
+            remote["profile"] = manager.profile(seconds, interval)
+        except Exception as e:
+            remote["error"] = str(e)
+    thread = threading.Thread(target=supervisor_side, daemon=True, name="profile-supervisor")
+    thread.start()
+    local = profiling.sample(seconds, interval)
+    thread.join()
+    if "profile" not in remote:
+        return {**profiling.merge({"app": local}), "errors": {"supervisor": remote.get("error")}}
+    return profiling.merge({"app": local, "supervisor": remote["profile"]})
+
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    """Sample all threads (app and supervisor) for ?seconds=N; ?format=collapsed for flamegraph input."""
+    seconds = request.args.get("seconds", 5, type=float)
+    interval = request.args.get("interval", profiling.PROFILE_INTERVAL, type=float)
+    try:
+        profile = offload(_profile_processes, seconds, max(0.001, interval))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    if request.args.get("format") == "collapsed":
+        return Response(profiling.collapsed(profile), mimetype="text/plain")
+    return jsonify(profiling.summary(profile, top=request.args.get("top", 50, type=int)))
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Readiness probe: answers as soon as the server is serving, touches nothing."""
+    return jsonify({"ok": True})
+
+
+def _checked(fn, *args):
+    """Health-check, then fn(*args). Both can block (killing dead trees, per-service
+    locks held by a stop, supervisor IPC), so callers run this through offload()."""
+    manager.health_check(min_interval=HEALTH_CHECK_INTERVAL)
+    return fn(*args)
+
+
+def _apply(proc, **fields):
+    """Update a service's settings and save, off the event loop: update() waits on the
+    service lock, which a concurrent stop() holds for up to its grace period."""
+    def apply():
+        proc.update(**fields)
+        manager._save()
+        return proc.to_dict()
+    return offload(apply)
+
+
 @app.route("/api/services", methods=["GET"])
 def list_services():
-    manager.health_check()
-    return jsonify([p.to_dict() for p in manager.list_all()])
+    # Built even for a 304: building reconciles exited children, which bumps the version
+    etag, services = offload(_checked, manager.listing)
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify(services)
+    resp.set_etag(etag)
+    return resp
+
+
+@app.route("/api/services/changes", methods=["GET"])
+def list_service_changes():
+    since = request.args.get("since", 0, type=int)
+    epoch = request.args.get("epoch", "")
+    return jsonify(offload(_checked, manager.changes, since, epoch))
 
 
 @app.route("/api/services", methods=["POST"])
@@ -34,35 +224,57 @@ def register_service():
     if not script_path or not os.path.exists(script_path):
         return jsonify({"error": "Invalid script path"}), 400
     
-    proc = manager.register(script_path, name)
-    return jsonify(proc.to_dict())
+    proc = offload(manager.register, script_path, name)
+    return jsonify(offload(proc.to_dict))
+
+
+@app.route("/api/services/discover", methods=["POST"])
+def discover_services():
+    data = request.json or {}
+    roots = data.get("roots") or []
+    if isinstance(roots, str):
+        roots = [roots]
+    if not roots:
+        return jsonify({"error": "roots required"}), 400
+    candidates = offload(manager.discover, roots, (data.get("q") or "").strip())
+    return jsonify({"candidates": candidates})
+
+
+@app.route("/api/services/bulk", methods=["POST"])
+def register_services_bulk():
+    items = (request.json or {}).get("items") or []
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items required"}), 400
+    items = [i if isinstance(i, dict) else {"script_path": str(i)} for i in items]
+    added, skipped = offload(manager.register_many, items)
+    return jsonify({"registered": [p.to_dict() for p in added], "skipped": skipped})
 
 
 @app.route("/api/services/<id>", methods=["DELETE"])
 def unregister_service(id):
-    if manager.unregister(id):
+    if offload(manager.unregister, id):
         return jsonify({"success": True})
     return jsonify({"error": "Service not found"}), 404
 
 
 @app.route("/api/services/<id>/start", methods=["POST"])
 def start_service(id):
-    if manager.start(id):
-        return jsonify(manager.get(id).to_dict())
+    if offload(manager.start, id):
+        return jsonify(offload(manager.get(id).to_dict))
     return jsonify({"error": "Failed to start"}), 400
 
 
 @app.route("/api/services/<id>/stop", methods=["POST"])
 def stop_service(id):
-    if manager.stop(id):
-        return jsonify(manager.get(id).to_dict())
+    if offload(manager.stop, id):
+        return jsonify(offload(manager.get(id).to_dict))
     return jsonify({"error": "Failed to stop"}), 400
 
 
 @app.route("/api/services/<id>/restart", methods=["POST"])
 def restart_service(id):
-    if manager.restart(id):
-        return jsonify(manager.get(id).to_dict())
+    if offload(manager.restart, id):
+        return jsonify(offload(manager.get(id).to_dict))
     return jsonify({"error": "Failed to restart"}), 400
 
 
@@ -70,12 +282,273 @@ def restart_service(id):
 def get_logs(id):
     offset = request.args.get("offset", 0, type=int)
     tail = request.args.get("tail", 0, type=int)
-    lines, total, pruned = manager.get_logs(id, offset)
-    if tail > 0 and len(lines) > tail:
-        skipped = len(lines) - tail
-        lines = lines[-tail:]
-        offset = total  # advance offset to end so next poll is incremental
-    return jsonify({"lines": lines, "offset": total, "total": total})
+    filter_text = request.args.get("filter", "")
+    if request.args.get("level"):
+        filter_text = ",".join(f for f in (filter_text, f"level>={request.args['level']}") if f)
+    if filter_text:
+        # Structured query over the service's log index (needs a log_format)
+        try:
+            numbers, lines, total, levels = manager.query_logs(id, filter_text, offset, tail or 1000)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"lines": lines, "line_numbers": numbers, "offset": total, "total": total, "levels": levels})
+    # replace=1: also re-send the line before `offset`; the newest line can still change
+    # (repeat count, progress bar redrawn with "\r") and `first` tells the client where it goes
+    if request.args.get("replace", type=int) and offset > 0:
+        offset -= 1
+    # Never more than MAX_LOG_LINES per response; the buffer only unpacks the blocks it returns
+    tail = min(tail, MAX_LOG_LINES) if tail > 0 else MAX_LOG_LINES
+    lines, total, pruned = manager.get_logs(id, offset, tail)
+    return jsonify({"lines": lines, "offset": total, "total": total, "first": total - len(lines)})
+
+
+@app.route("/api/services/<id>/logs/stream", methods=["GET"])
+def stream_logs(id):
+    """Server-Sent Events live tail of a service's log, starting at `offset`."""
+    proc = manager.get(id)
+    if not proc:
+        return jsonify({"error": "Service not found"}), 404
+    offset = request.args.get("offset", 0, type=int)
+
+    def generate():
+        nonlocal offset
+        yield sse_event({"offset": offset}, "hello")
+        idle = 0.0
+        last = None  # text sent for line offset-1, re-checked because it can still change
+        while manager.get(id) is not None:
+            start = offset - 1 if last is not None else offset
+            lines, total, _ = proc.read_logs(start)
+            first = total - len(lines)
+            if lines and first == start and last is not None and lines[0] == last:
+                lines = lines[1:]
+                first += 1
+            if lines:
+                event = {"lines": lines, "offset": total}
+                if first < offset:
+                    event.update(replace=True, first=first)
+                yield sse_event(event)
+                last = lines[-1]
+                idle = 0.0
+            elif idle >= STREAM_KEEPALIVE:
+                yield ": keepalive\n\n"
+                idle = 0.0
+            offset = total
+            serving.sleep(LOG_STREAM_INTERVAL)
+            idle += LOG_STREAM_INTERVAL
+
+    return Response(generate(), mimetype="text/event-stream", headers=sse_headers())
+
+
+def _log_services(text: str):
+    """Services for "a,b,c" (ids, aliases or names; empty = all) -> ({id: display name}, unknown)."""
+    procs = manager.list_all()
+    found, unknown = {}, []
+    for key in [k.strip() for k in (text or "").split(",") if k.strip()] or [p.id for p in procs]:
+        proc = next((p for p in procs if key in (p.id, p.alias, p.name)), None)
+        if proc is None:
+            unknown.append(key)
+        else:
+            found[proc.id] = proc.alias or proc.name
+    return found, unknown
+
+
+def _export_response(services: dict, label: str):
+    fmt = request.args.get("format", "txt")
+    method = request.args.get("compress", "gzip")
+    if fmt not in log_export.FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(log_export.FORMATS)}"}), 400
+    if method not in log_export.COMPRESSIONS:
+        return jsonify({"error": f"compress must be one of {', '.join(log_export.COMPRESSIONS)}"}), 400
+    try:
+        since = log_export.parse_time(request.args.get("since"))
+        until = log_export.parse_time(request.args.get("until"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    stream = log_export.export(manager, list(services), services, fmt, method, since, until)
+    mimetype = log_export.COMPRESSIONS[method][0] or log_export.FORMATS[fmt][0]
+    name = log_export.filename(label, fmt, method)
+    return Response(stream, mimetype=mimetype,
+                    headers={"Content-Disposition": log_export.content_disposition(name),
+                             "Cache-Control": "no-cache"})
+
+
+@app.route("/api/services/<id>/logs/export", methods=["GET"])
+def export_logs(id):
+    """Download a service's buffered log: ?since=&until=&format=txt|jsonl&compress=gzip|zstd|none."""
+    proc = manager.get(id)
+    if not proc:
+        return jsonify({"error": "Service not found"}), 404
+    name = proc.alias or proc.name
+    return _export_response({proc.id: name}, name)
+
+
+@app.route("/api/logs/export", methods=["GET"])
+def export_merged_logs():
+    """Several services in one download (?services=a,b), interleaved by timestamp."""
+    services, unknown = _log_services(request.args.get("services", ""))
+    if unknown:
+        return jsonify({"error": f"Unknown services: {', '.join(unknown)}"}), 404
+    if not services:
+        return jsonify({"error": "No services"}), 404
+    return _export_response(services, "-".join(services.values()) if len(services) <= 3 else "services")
+
+
+def _merged_rows(rows, services):
+    return [{"service": services.get(id, id), "id": id, "n": n, "ts": ts, "line": line}
+            for ts, id, n, line in rows]
+
+
+@app.route("/api/logs/merged", methods=["GET"])
+def merged_logs():
+    """One timestamp-ordered log across services (?services=a,b,c).
+
+    Page forward with ?since= (first page) then ?cursor= from the previous
+    response; ?tail=N returns the newest N lines instead.
+    """
+    services, unknown = _log_services(request.args.get("services", ""))
+    if unknown:
+        return jsonify({"error": f"Unknown services: {', '.join(unknown)}"}), 404
+    limit = max(1, min(request.args.get("limit", MERGED_PAGE, type=int), log_export.EXPORT_PAGE))
+    tail = request.args.get("tail", 0, type=int)
+    try:
+        since = log_export.parse_time(request.args.get("since"))
+        positions = log_export.parse_cursor(request.args.get("cursor", ""))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if tail > 0:
+        rows, positions = log_export.merged_tail(manager, list(services), min(tail, limit))
+    else:
+        rows, positions = log_export.merged_page(manager, list(services), positions, since, limit)
+    return jsonify({
+        "lines": _merged_rows(rows, services),
+        "cursor": log_export.format_cursor(positions),
+        "more": len(rows) >= limit and not tail,
+    })
+
+
+@app.route("/api/logs/merged/stream", methods=["GET"])
+def stream_merged_logs():
+    """Server-Sent Events live tail of the merged log, from ?cursor=, ?since= or now."""
+    services, unknown = _log_services(request.args.get("services", ""))
+    if unknown:
+        return jsonify({"error": f"Unknown services: {', '.join(unknown)}"}), 404
+    try:
+        since = log_export.parse_time(request.args.get("since"))
+        positions = log_export.parse_cursor(request.args.get("cursor", ""))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    ids = list(services)
+
+    def generate():
+        nonlocal positions, since
+        if not positions and since is None:
+            positions = {id: log_export.log_total(manager, id) for id in ids}
+        yield sse_event({"cursor": log_export.format_cursor(positions)}, "hello")
+        idle = 0.0
+        while True:
+            rows, positions = log_export.merged_page(manager, ids, positions, since, MERGED_PAGE)
+            if rows:
+                since = None  # positions are exact from here on
+                yield sse_event({"lines": _merged_rows(rows, services),
+                                 "cursor": log_export.format_cursor(positions)})
+                idle = 0.0
+                if len(rows) >= MERGED_PAGE:
+                    continue  # catching up: next page right away
+            elif idle >= STREAM_KEEPALIVE:
+                yield ": keepalive\n\n"
+                idle = 0.0
+            serving.sleep(LOG_STREAM_INTERVAL)
+            idle += LOG_STREAM_INTERVAL
+
+    return Response(generate(), mimetype="text/event-stream", headers=sse_headers())
+
+
+@app.route("/api/services/<id>/crashes", methods=["GET"])
+def list_crashes(id):
+    """Crash records (exit code, runtime, final log lines, resource samples), newest first."""
+    if not manager.get(id):
+        return jsonify({"error": "Service not found"}), 404
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify({"crashes": manager.crashes(id, limit)})
+
+
+@app.route("/api/services/<id>/health", methods=["GET"])
+def service_health(id):
+    """Active probe results: health, per-probe last result and recent history."""
+    if not manager.get(id):
+        return jsonify({"error": "Service not found"}), 404
+    return jsonify(manager.health(id))
+
+
+@app.route("/api/services/<id>/probes", methods=["PUT"])
+def set_probes(id):
+    """Set health probes: {"probes": [{"type": "tcp|http|log", ...}], "health_restart": bool}."""
+    proc = manager.get(id)
+    if not proc:
+        return jsonify({"error": "Service not found"}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        probes = health_probe.validate(data.get("probes") or [])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    health_restart = bool(data.get("health_restart", proc.health_restart))
+    return jsonify(_apply(proc, probes=probes, health_restart=health_restart))
+
+
+@app.route("/api/services/<id>/schedule", methods=["PUT"])
+def set_schedule(id):
+    """Run as a scheduled one-shot: {"schedule": "*/15 * * * *" | "every 10m" | "", "max_runtime": seconds}."""
+    proc = manager.get(id)
+    if not proc:
+        return jsonify({"error": "Service not found"}), 404
+    data = request.get_json(silent=True) or {}
+    schedule = (data.get("schedule") or "").strip()
+    try:
+        if schedule:
+            scheduler.parse(schedule).next_after(time.time())
+        max_runtime = float(data.get("max_runtime", proc.max_runtime) or 0)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if max_runtime < 0:
+        return jsonify({"error": "max_runtime must be >= 0"}), 400
+    state = _apply(proc, schedule=schedule, max_runtime=max_runtime)
+    offload(manager.schedule_changed)
+    return jsonify(state)
+
+
+@app.route("/api/services/<id>/runs", methods=["GET"])
+def list_runs(id):
+    """Run history of a scheduled service (trigger, times, exit code), newest first."""
+    if not manager.get(id):
+        return jsonify({"error": "Service not found"}), 404
+    return jsonify({"runs": manager.runs(id)})
+
+
+@app.route("/api/services/<id>/runs/<int:number>/logs", methods=["GET"])
+def get_run_logs(id, number):
+    """The log segment of one run; `complete` is false if part of it was pruned."""
+    result = manager.run_logs(id, number)
+    if result is None:
+        return jsonify({"error": "Run not found"}), 404
+    lines, complete = result
+    return jsonify({"lines": lines, "complete": complete})
+
+
+@app.route("/api/services/<id>/log-format", methods=["PUT"])
+def set_log_format(id):
+    """Enable structured parsing: {"log_format": "json|level|regex:<expr>|", "log_fields": [...]}."""
+    proc = manager.get(id)
+    if not proc:
+        return jsonify({"error": "Service not found"}), 404
+    data = request.get_json(silent=True) or {}
+    log_format = (data.get("log_format") or "").strip()
+    log_fields = [str(f).strip() for f in data.get("log_fields") or [] if str(f).strip()]
+    try:
+        if log_format:
+            log_parse.LogParser(log_format, log_fields)
+    except (ValueError, re.error) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(_apply(proc, log_format=log_format, log_fields=log_fields))
 
 
 @app.route("/api/services/<id>/port", methods=["PUT"])
@@ -83,9 +556,7 @@ def set_port(id):
     proc = manager.get(id)
     if not proc:
         return jsonify({"error": "Service not found"}), 404
-    proc.port = request.json.get("port", "")
-    manager._save()
-    return jsonify(proc.to_dict())
+    return jsonify(_apply(proc, port=request.json.get("port", "")))
 
 
 @app.route("/api/services/<id>/pin", methods=["PUT"])
@@ -93,9 +564,7 @@ def set_pin(id):
     proc = manager.get(id)
     if not proc:
         return jsonify({"error": "Service not found"}), 404
-    proc.pinned = bool(request.json.get("pinned", False))
-    manager._save()
-    return jsonify(proc.to_dict())
+    return jsonify(_apply(proc, pinned=bool(request.json.get("pinned", False))))
 
 
 @app.route("/api/services/<id>/alias", methods=["PUT"])
@@ -103,9 +572,7 @@ def set_alias(id):
     proc = manager.get(id)
     if not proc:
         return jsonify({"error": "Service not found"}), 404
-    proc.alias = (request.json.get("alias") or "").strip()
-    manager._save()
-    return jsonify(proc.to_dict())
+    return jsonify(_apply(proc, alias=(request.json.get("alias") or "").strip()))
 
 
 @app.route("/api/services/<id>/group", methods=["PUT"])
@@ -113,9 +580,7 @@ def set_group(id):
     proc = manager.get(id)
     if not proc:
         return jsonify({"error": "Service not found"}), 404
-    proc.group = (request.json.get("group") or "").strip()
-    manager._save()
-    return jsonify(proc.to_dict())
+    return jsonify(_apply(proc, group=(request.json.get("group") or "").strip()))
 
 
 @app.route("/api/groups/<group_name>/<action>", methods=["POST"])
@@ -127,11 +592,11 @@ def group_action(group_name, action):
         if proc.group != group_name:
             continue
         if action == "start":
-            ok = proc.start()
+            ok = offload(proc.start)
         elif action == "stop":
-            ok = proc.stop()
+            ok = offload(proc.stop)
         else:
-            ok = proc.restart()
+            ok = offload(proc.restart)
         results.append({"id": proc.id, "name": proc.alias or proc.name, "ok": ok})
     manager._save()
     return jsonify({"results": results})
@@ -142,44 +607,135 @@ def set_config_path(id):
     proc = manager.get(id)
     if not proc:
         return jsonify({"error": "Service not found"}), 404
-    proc.config_file = request.json.get("config_file", "")
-    manager._save()
-    return jsonify(proc.to_dict())
+    return jsonify(_apply(proc, config_file=request.json.get("config_file", "")))
 
 
-@app.route("/api/services/<id>/config", methods=["GET"])
-def read_config(id):
+def _config_target(id):
+    """(path, None) for a service's config file, or (None, error response)."""
     proc = manager.get(id)
     if not proc:
-        return jsonify({"error": "Service not found"}), 404
-    if not proc.config_file or not os.path.isfile(proc.config_file):
-        return jsonify({"error": "No config file set", "config_file": proc.config_file}), 404
+        return None, (jsonify({"error": "Service not found"}), 404)
+    if not proc.config_file:
+        return None, (jsonify({"error": "No config file set", "config_file": ""}), 400)
+    return proc.config_file, None
+
+
+def _if_match():
+    """ETag the client edited against: If-Match header, or "etag" in the JSON body."""
+    if request.if_match:
+        return next(iter(request.if_match.as_set()), "*" if request.if_match.star_tag else None)
+    return (request.get_json(silent=True) or {}).get("etag")
+
+
+def _config_conflict(e: config_store.ConfigConflict):
+    resp = jsonify({"error": "配置文件已被其他人修改", "etag": e.etag})
+    resp.status_code = 412
+    resp.set_etag(e.etag)
+    return resp
+
+
+@app.route("/api/services/<id>/config", methods=["GET"])
+def read_config(id):
+    path, err = _config_target(id)
+    if err:
+        return err
+    if not os.path.isfile(path):
+        return jsonify({"error": "No config file set", "config_file": path}), 404
+    offset = request.args.get("offset", 0, type=int)
+    length = request.args.get("length", config_store.CONFIG_PAGE_SIZE, type=int)
     try:
-        for enc in ("utf-8", "gbk", "latin-1"):
-            try:
-                content = open(proc.config_file, encoding=enc).read()
-                return jsonify({"config_file": proc.config_file, "content": content})
-            except UnicodeDecodeError:
-                continue
-        return jsonify({"error": "Cannot decode file"}), 500
+        page = offload(config_store.read_range, path, offset, length)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    resp = jsonify({"config_file": path, **page})
+    resp.set_etag(page["etag"])
+    return resp
+
+
+@app.route("/api/services/<id>/config/raw", methods=["GET"])
+def read_config_raw(id):
+    """Whole file as bytes; supports Range and If-None-Match via send_file."""
+    path, err = _config_target(id)
+    if err:
+        return err
+    if not os.path.isfile(path):
+        return jsonify({"error": "Config file not found", "config_file": path}), 404
+    return send_file(path, mimetype="text/plain", conditional=True, etag=config_store.etag(path))
 
 
 @app.route("/api/services/<id>/config", methods=["PUT"])
 def write_config(id):
-    proc = manager.get(id)
-    if not proc:
-        return jsonify({"error": "Service not found"}), 404
-    if not proc.config_file:
-        return jsonify({"error": "No config file set"}), 400
-    content = request.json.get("content", "")
+    path, err = _config_target(id)
+    if err:
+        return err
+    if_match = _if_match()
+    if not if_match and os.path.isfile(path):
+        return jsonify({"error": "If-Match (or etag) is required to overwrite a config file"}), 428
+    content = (request.get_json(silent=True) or {}).get("content", "")
+    try:
+        tag = offload(config_store.write_text, path, content, if_match)
+    except config_store.ConfigConflict as e:
+        return _config_conflict(e)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    resp = jsonify({"success": True, "config_file": path, "etag": tag})
+    resp.set_etag(tag)
+    return resp
+
+
+@app.route("/api/services/<id>/config", methods=["PATCH"])
+def patch_config(id):
+    path, err = _config_target(id)
+    if err:
+        return err
+    if not os.path.isfile(path):
+        return jsonify({"error": "Config file not found", "config_file": path}), 404
+    if_match = _if_match()
+    if not if_match:
+        return jsonify({"error": "If-Match (or etag) is required for partial updates"}), 428
+    edits = (request.get_json(silent=True) or {}).get("edits") or []
     try:
-        with open(proc.config_file, "w", encoding="utf-8") as f:
-            f.write(content)
-        return jsonify({"success": True, "config_file": proc.config_file})
+        tag = offload(config_store.apply_edits, path, edits, if_match)
+    except config_store.ConfigConflict as e:
+        return _config_conflict(e)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    resp = jsonify({"success": True, "config_file": path, "etag": tag})
+    resp.set_etag(tag)
+    return resp
+
+
+@app.route("/api/services/<id>/config/history", methods=["GET"])
+def config_history(id):
+    path, err = _config_target(id)
+    if err:
+        return err
+    return jsonify({"config_file": path, "versions": config_store.history(path)})
+
+
+@app.route("/api/services/<id>/config/history/<version>/restore", methods=["POST"])
+def restore_config(id, version):
+    path, err = _config_target(id)
+    if err:
+        return err
+    if_match = _if_match()
+    if not if_match and os.path.isfile(path):
+        return jsonify({"error": "If-Match (or etag) is required to overwrite a config file"}), 428
+    try:
+        tag = offload(config_store.restore, path, version, if_match)
+    except config_store.ConfigConflict as e:
+        return _config_conflict(e)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    resp = jsonify({"success": True, "config_file": path, "etag": tag})
+    resp.set_etag(tag)
+    return resp
 
 
 @app.route("/api/services/<id>/open-folder", methods=["POST"])
@@ -203,7 +759,7 @@ def kill_process():
         if not pid.isdigit():
             return jsonify({"error": "Invalid PID"}), 400
         try:
-            subprocess.run(["taskkill", "/PID", pid, "/F"], capture_output=True, timeout=10)
+            offload(subprocess.run, ["taskkill", "/PID", pid, "/F"], capture_output=True, timeout=10)
             results.append(f"Killed PID {pid}")
         except Exception as e:
             results.append(f"Failed to kill PID {pid}: {e}")
@@ -213,8 +769,8 @@ def kill_process():
         if not port.isdigit():
             return jsonify({"error": "Invalid port"}), 400
         try:
-            out = subprocess.run(
-                ["netstat", "-ano"], capture_output=True, text=True, timeout=10
+            out = offload(
+                subprocess.run, ["netstat", "-ano"], capture_output=True, text=True, timeout=10
             ).stdout
             killed = set()
             for line in out.splitlines():
@@ -222,7 +778,7 @@ def kill_process():
                     parts = line.split()
                     p = parts[-1]
                     if p.isdigit() and p != "0" and p not in killed:
-                        subprocess.run(["taskkill", "/PID", p, "/F"], capture_output=True, timeout=10)
+                        offload(subprocess.run, ["taskkill", "/PID", p, "/F"], capture_output=True, timeout=10)
                         killed.add(p)
                         results.append(f"Killed PID {p} on port {port}")
             if not killed:
@@ -251,19 +807,32 @@ def browse_dir():
     if os.path.isfile(path):
         return jsonify({"current": path, "items": [], "is_file": True})
     
-    items = []
+    cursor = request.args.get("cursor", "")
+    limit = max(1, min(request.args.get("limit", dir_browser.BROWSE_PAGE_SIZE, type=int), 5000))
+    q = request.args.get("q", "").strip()
     try:
-        for name in sorted(os.listdir(path)):
-            full = os.path.join(path, name)
-            is_dir = os.path.isdir(full)
-            ext = os.path.splitext(name)[1].lower()
-            if is_dir or ext in (".cmd", ".bat", ".ps1", ".sh"):
-                items.append({"name": name, "path": full, "type": "dir" if is_dir else "file"})
+        page = dir_browser.browse(path, cursor=cursor, limit=limit, q=q)
     except PermissionError:
         return jsonify({"error": "Access denied"}), 403
     
     parent = os.path.dirname(path)
-    return jsonify({"current": path, "parent": parent if parent != path else "", "items": items})
+    return jsonify({"current": path, "parent": parent if parent != path else "", **page})
+
+
+@app.route("/api/browse/find", methods=["GET"])
+def find_scripts():
+    """Stream scripts found under `root` as NDJSON, one object per line."""
+    root = request.args.get("root", "")
+    if not root or not os.path.isdir(root):
+        return jsonify({"error": "Path not found"}), 404
+    q = request.args.get("q", "").strip()
+    limit = max(1, min(request.args.get("limit", 5000, type=int), 50000))
+
+    def generate():
+        for item in dir_browser.find_scripts(os.path.abspath(root), q=q, max_results=limit):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
 
 
 @app.route("/api/domains", methods=["GET"])
@@ -283,38 +852,145 @@ def put_domains():
         cfg["candidates"] = _migrate_candidates(data["candidates"])
     if "targets" in data and isinstance(data.get("targets"), dict):
         cfg["targets"] = data.get("targets")
+    if "probe" in data and isinstance(data.get("probe"), dict):
+        cfg["probe"] = data.get("probe")
 
     save_domains(cfg)
+    prober.wake()
     return jsonify(cfg)
 
 
+@app.route("/api/domains/probe", methods=["GET"])
+def get_domain_probe():
+    return jsonify(prober.status())
+
+
+@app.route("/api/domains/probe", methods=["POST"])
+def run_domain_probe():
+    return jsonify(offload(prober.probe_once))
+
+
 @app.route("/api/domains/run-ngrok", methods=["POST"])
 def run_ngrok():
     data = request.json or {}
     cmd = (data.get("cmd") or "").strip()
     if not cmd:
         return jsonify({"error": "cmd is required"}), 400
+    job = jobs.submit(cmd, timeout=NGROK_TIMEOUT, kind="ngrok")
+    return jsonify({"job_id": job.id, **job.to_dict()}), 202
+
+
+# ── Job endpoints ─────────────────────────────────────────────
+
+@app.route("/api/jobs", methods=["POST"])
+def submit_job():
+    data = request.json or {}
+    cmd = (data.get("cmd") or "").strip()
+    if not cmd:
+        return jsonify({"error": "cmd is required"}), 400
+    cwd = data.get("cwd") or None
+    if cwd and not os.path.isdir(cwd):
+        return jsonify({"error": "Invalid cwd"}), 400
     try:
-        result = subprocess.run(
-            cmd, shell=True, capture_output=True, text=True, timeout=30
-        )
-        return jsonify({
-            "exit_code": result.returncode,
-            "stdout": result.stdout,
-            "stderr": result.stderr
-        })
-    except subprocess.TimeoutExpired:
-        return jsonify({"error": "Command timed out (30s)"}), 500
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        timeout = float(data.get("timeout") or 0)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid timeout"}), 400
+    job = jobs.submit(cmd, cwd=cwd, timeout=timeout)
+    return jsonify(job.to_dict()), 202
+
+
+@app.route("/api/jobs", methods=["GET"])
+def list_jobs():
+    return jsonify([j.to_dict() for j in reversed(jobs.list_all())])
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_command_job(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    if not jobs.get(job_id):
+        return jsonify({"error": "Job not found"}), 404
+    if not offload(jobs.cancel, job_id):
+        return jsonify({"error": "Job already finished"}), 400
+    return jsonify(jobs.get(job_id).to_dict())
+
+
+@app.route("/api/jobs/<job_id>/logs", methods=["GET"])
+def get_job_logs(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    lines, total, _ = job.read_logs(request.args.get("offset", 0, type=int))
+    return jsonify({"lines": lines, "offset": total, "total": total, "status": job.job_status})
+
+
+@app.route("/api/jobs/<job_id>/stream", methods=["GET"])
+def stream_job(job_id):
+    """Server-Sent Events: job output lines, then a final `result` event."""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    offset = request.args.get("offset", 0, type=int)
+
+    def generate():
+        nonlocal offset
+        while True:
+            finished = job.finished  # read before draining so no tail line is missed
+            lines, total, _ = job.read_logs(offset)
+            if lines:
+                yield sse_event({"lines": lines, "offset": total})
+            offset = total
+            if finished:
+                yield sse_event(job.to_dict(), "result")
+                return
+            serving.sleep(LOG_STREAM_INTERVAL)
+
+    return Response(generate(), mimetype="text/event-stream", headers=sse_headers())
 
 
 @app.route("/api/domains/apply", methods=["POST"])
 def apply_domains():
     cfg = load_domains()
     active = str((cfg.get("active") or "")).strip()
-    results = apply_active_domain(active)
-    return jsonify({"active": active, "results": results})
+    job = start_apply_job(active)
+    data = job.to_dict()
+    return jsonify({"active": active, "job_id": job.id, "results": data["results"]}), 202
+
+
+@app.route("/api/domains/jobs/<job_id>", methods=["GET"])
+def get_apply_job(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/api/domains/jobs/<job_id>/stream", methods=["GET"])
+def stream_apply_job(job_id):
+    """Server-Sent Events: per-target apply/commit/push progress until the job is done."""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        seq = 0
+        while True:
+            events = job.events_since(seq)
+            for ev in events:
+                yield sse_event(ev, ev["stage"])
+            seq += len(events)
+            if events and events[-1]["stage"] == "done":
+                yield sse_event(job.to_dict(), "result")
+                return
+            serving.sleep(JOB_STREAM_INTERVAL)
+
+    return Response(generate(), mimetype="text/event-stream", headers=sse_headers())
 
 
 # ── MQ endpoints ──────────────────────────────────────────────
@@ -390,12 +1066,37 @@ def mq_stats():
     return jsonify(mq_store.stats())
 
 
+@app.route("/api/mq/stream", methods=["GET"])
+def mq_stream():
+    """Server-Sent Events: pushes MQ stats whenever the queue changes."""
+    def generate():
+        seen = None
+        idle = 0.0
+        while True:
+            current = mq_store.version()
+            if current != seen:
+                seen = current
+                yield sse_event(mq_store.stats(), "stats")
+                idle = 0.0
+            elif idle >= STREAM_KEEPALIVE:
+                yield ": keepalive\n\n"
+                idle = 0.0
+            serving.sleep(MQ_STREAM_INTERVAL)
+            idle += MQ_STREAM_INTERVAL
+
+    return Response(generate(), mimetype="text/event-stream", headers=sse_headers())
+
+
 @app.route("/api/services/start-all", methods=["POST"])
 def start_all_services():
-    started = manager.cleanup_and_start_all()
+    started = offload(manager.cleanup_and_start_all)
     total = len(manager.list_all())
     return jsonify({"started": started, "total": total})
 
 
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=51314, debug=False, threaded=True)
+    parser = argparse.ArgumentParser(description="cmd-patrol backend")
+    parser.add_argument("--server", choices=serving.SERVER_MODES, default=None,
+                        help="threaded (default) or eventlet; env CMD_PATROL_SERVER")
+    args = parser.parse_args()
+    serving.serve(app, "127.0.0.1", 51314, args.server or "")
@@ -0,0 +1,117 @@
+"""
+Streaming load benchmark for cmd-patrol.
+
+Opens N concurrent Server-Sent Events clients against a running backend and
+reports how many connect, receive their first frame, and stay connected for
+the hold period. Uses a single selector loop, so the benchmark itself can
+hold thousands of sockets without threads.
+
+Usage:
+    python app.py --server eventlet            # in another terminal
+    python bench_streams.py --clients 100,1000,5000 --path /api/mq/stream
+    python bench_streams.py --path /api/services/<id>/logs/stream --hold 30
+
+Output (JSON to stdout, one result per client count):
+    [{"clients": N, "connected": n, "first_frame": n, "alive_after_hold": n,
+      "first_frame_p50_ms": x, "first_frame_p99_ms": x, "errors": n}, ...]
+"""
+
+import argparse
+import json
+import selectors
+import socket
+import sys
+import time
+from urllib.parse import urlsplit
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_level(host: str, port: int, path: str, clients: int, hold: float, timeout: float) -> dict:
+    sel = selectors.DefaultSelector()
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nAccept: text/event-stream\r\n\r\n".encode()
+    state = {}
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(clients):
+        try:
+            s = socket.create_connection((host, port), timeout=timeout)
+            s.sendall(request)
+            s.setblocking(False)
+        except OSError:
+            errors += 1
+            continue
+        state[s] = {"t0": time.perf_counter(), "first": None, "buf": b""}
+        sel.register(s, selectors.EVENT_READ)
+
+    def pump(until: float, stop_when_all_first: bool):
+        while time.perf_counter() < until and sel.get_map():
+            if stop_when_all_first and all(st["first"] is not None or st.get("closed") for st in state.values()):
+                return
+            for key, _ in sel.select(timeout=0.2):
+                s = key.fileobj
+                st = state[s]
+                try:
+                    data = s.recv(65536)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    data = b""
+                if not data:
+                    sel.unregister(s)
+                    st["closed"] = True
+                    continue
+                if st["first"] is None:
+                    st["buf"] += data
+                    _, sep, body = st["buf"].partition(b"\r\n\r\n")
+                    if sep and b"\n\n" in body:
+                        st["first"] = time.perf_counter() - st["t0"]
+                        st["buf"] = b""
+
+    # Phase 1: wait for every client's first frame; phase 2: hold them open
+    pump(start + timeout, stop_when_all_first=True)
+    pump(time.perf_counter() + hold, stop_when_all_first=False)
+
+    first = [st["first"] * 1000 for st in state.values() if st["first"] is not None]
+    alive = sum(1 for st in state.values() if not st.get("closed"))
+    for s in list(state):
+        if not state[s].get("closed"):
+            sel.unregister(s)
+        s.close()
+    sel.close()
+    return {
+        "clients": clients,
+        "connected": len(state),
+        "first_frame": len(first),
+        "alive_after_hold": alive,
+        "first_frame_p50_ms": round(_percentile(first, 50), 2),
+        "first_frame_p99_ms": round(_percentile(first, 99), 2),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cmd-patrol streaming load benchmark")
+    parser.add_argument("--url", default="http://127.0.0.1:51314", help="cmd-patrol base URL")
+    parser.add_argument("--path", default="/api/mq/stream", help="SSE endpoint to open")
+    parser.add_argument("--clients", default="100,500,1000", help="comma-separated client counts")
+    parser.add_argument("--hold", type=float, default=10.0, help="seconds to keep clients connected")
+    parser.add_argument("--timeout", type=float, default=10.0, help="connect / first-frame timeout")
+    args = parser.parse_args()
+
+    u = urlsplit(args.url)
+    results = []
+    for n in (int(x) for x in args.clients.split(",") if x.strip()):
+        r = run_level(u.hostname, u.port or 80, args.path, n, args.hold, args.timeout)
+        results.append(r)
+        print(f"[bench] {r}", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Benchmark suite for cmd-patrol's core paths.
+
+Runs in-process against a throwaway sandbox directory (services.json,
+mq.json and script_meta.json are redirected there), so it needs no real
+services and runs the same on Linux and Windows:
+
+  mq        publish / query latency with 1k, 10k, 100k messages already queued
+  ingest    log lines/sec from a synthetic chatty child through _read_output
+  get_logs  read_logs latency at several offsets into a full buffer
+  list      /api/services handler work (health sweep + to_dict + JSON) from
+            concurrent threads; with --url, real HTTP requests to a backend
+  startup   ProcessManager load time with N registered services
+
+Usage:
+    python bench_suite.py --out results.json
+    python bench_suite.py --only mq,ingest --quick
+    python bench_suite.py --compare baseline.json --out new.json
+
+Output: JSON {"meta": {...}, "results": {bench: [rows...]}}. --compare prints
+the ratio new/baseline for every numeric field of matching rows.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import mq_store
+import process_manager as pm
+import script_meta
+from bench_streams import _percentile
+
+CHATTY_CHILD = """
+import sys
+n = int(sys.argv[1])
+line = "2024-01-01 12:00:00 INFO worker-3 processed item %d in 12ms status=ok\\n"
+out = sys.stdout
+for i in range(n):
+    out.write(line % i)
+out.flush()
+"""
+
+
+def _timings(samples: list[float]) -> dict:
+    """p50/p99/mean of second-valued samples, in microseconds."""
+    us = [s * 1e6 for s in samples]
+    return {
+        "p50_us": round(_percentile(us, 50), 1),
+        "p99_us": round(_percentile(us, 99), 1),
+        "mean_us": round(sum(us) / len(us), 1) if us else 0.0,
+    }
+
+
+@contextmanager
+def _sandbox():
+    """Point every persistent file at a temp dir for the duration of a bench."""
+    saved = (pm.SERVICES_FILE, script_meta.META_FILE, script_meta._cache, mq_store.MQ_FILE)
+    with tempfile.TemporaryDirectory(prefix="cmd-patrol-bench-") as tmp:
+        root = Path(tmp)
+        pm.SERVICES_FILE = root / "services.json"
+        script_meta.META_FILE = root / "script_meta.json"
+        script_meta._cache = None
+        mq_store.MQ_FILE = root / "mq.json"
+        try:
+            yield root
+        finally:
+            pm.SERVICES_FILE, script_meta.META_FILE, script_meta._cache, mq_store.MQ_FILE = saved
+
+
+def _message(i: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()), "source": f"bench-{i % 8}", "type": "bench", "title": f"message {i}",
+        "detail": "x" * 80, "status": ("new", "ack", "done")[i % 3],
+        "created_at": datetime.now().isoformat(), "acked_at": None, "done_at": None, "meta": {},
+    }
+
+
+# ── Benches ──
+def bench_mq(sizes: list[int]) -> list[dict]:
+    rows = []
+    for n in sizes:
+        with _sandbox():
+            mq_store.MQ_FILE.write_text(json.dumps([_message(i) for i in range(n)]), encoding="utf-8")
+            ops = max(5, min(200, 200_000 // n))
+            publish = []
+            for i in range(ops):
+                t0 = time.perf_counter()
+                mq_store.publish("bench", "bench", f"publish {i}")
+                publish.append(time.perf_counter() - t0)
+            query = []
+            for _ in range(ops):
+                t0 = time.perf_counter()
+                mq_store.query(status="new", source="bench-1", limit=200)
+                query.append(time.perf_counter() - t0)
+            rows.append({
+                "messages": n,
+                "ops": ops,
+                "publish_per_sec": round(ops / sum(publish), 1),
+                "publish": _timings(publish),
+                "query_per_sec": round(ops / sum(query), 1),
+                "query": _timings(query),
+            })
+    return rows
+
+
+def bench_ingest(lines: int) -> list[dict]:
+    with _sandbox() as root:
+        child = root / "chatty.py"
+        child.write_text(CHATTY_CHILD, encoding="utf-8")
+        proc = pm.ManagedProcess(id="bench-ingest", name="chatty", script_path=str(child), cwd=str(root),
+                                 command=f'"{sys.executable}" "{child}" {lines}')
+        t0 = time.perf_counter()
+        if not proc.start():
+            return [{"lines": lines, "error": "failed to start child"}]
+        proc._reader.join()
+        elapsed = time.perf_counter() - t0
+        return [{
+            "lines": lines,
+            "ingested": proc.log_lines_total,
+            "bytes": proc.log_bytes_total,
+            "seconds": round(elapsed, 3),
+            "lines_per_sec": round(proc.log_lines_total / elapsed, 1),
+            "mb_per_sec": round(proc.log_bytes_total / elapsed / 1e6, 2),
+        }]
+
+
+def bench_get_logs(reps: int) -> list[dict]:
+    proc = pm.ManagedProcess(id="bench-logs", name="logs", script_path="", cwd=".", command="")
+    for i in range(pm.MAX_LOG_LINES + 1000):
+        proc._emit_line(b"2024-01-01 12:00:00 INFO worker processed item %d status=ok" % i)
+    _, total, pruned = proc.read_logs(0)
+    rows = []
+    for label, offset in (("from_start", 0), ("middle", pruned + (total - pruned) // 2),
+                          ("tail_100", total - 100), ("caught_up", total)):
+        samples = []
+        returned = 0
+        for _ in range(reps):
+            t0 = time.perf_counter()
+            lines, _, _ = proc.read_logs(offset)
+            samples.append(time.perf_counter() - t0)
+            returned = len(lines)
+        rows.append({"offset": label, "lines_returned": returned, **_timings(samples)})
+    return rows
+
+
+def _list_in_process(services: int, threads: list[int], reps: int) -> list[dict]:
+    rows = []
+    with _sandbox() as root:
+        manager = pm.ProcessManager()
+        scripts = []
+        for i in range(services):
+            path = root / f"svc_{i}.sh"
+            path.write_text(f"echo {i}\n", encoding="utf-8")
+            scripts.append({"script_path": str(path)})
+        manager.register_many(scripts)
+        for t in threads:
+            samples: list[float] = []
+            lock = threading.Lock()
+
+            def worker():
+                local = []
+                for _ in range(reps):
+                    t0 = time.perf_counter()
+                    manager.health_check(min_interval=pm.HEALTH_CHECK_INTERVAL)
+                    json.dumps([p.to_dict() for p in manager.list_all()])
+                    local.append(time.perf_counter() - t0)
+                with lock:
+                    samples.extend(local)
+            start = time.perf_counter()
+            workers = [threading.Thread(target=worker) for _ in range(t)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            elapsed = time.perf_counter() - start
+            rows.append({"mode": "in_process", "services": services, "threads": t,
+                         "requests_per_sec": round(len(samples) / elapsed, 1), **_timings(samples)})
+        manager.flush()
+    return rows
+
+
+def _list_http(url: str, threads: list[int], reps: int) -> list[dict]:
+    u = urlsplit(url)
+    rows = []
+    for t in threads:
+        samples: list[float] = []
+        errors = [0]
+        lock = threading.Lock()
+
+        def worker():
+            conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=30)
+            local = []
+            for _ in range(reps):
+                t0 = time.perf_counter()
+                try:
+                    conn.request("GET", "/api/services")
+                    conn.getresponse().read()
+                    local.append(time.perf_counter() - t0)
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    with lock:
+                        errors[0] += 1
+            conn.close()
+            with lock:
+                samples.extend(local)
+        start = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(t)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+        rows.append({"mode": "http", "threads": t, "errors": errors[0],
+                     "requests_per_sec": round(len(samples) / elapsed, 1), **_timings(samples)})
+    return rows
+
+
+def bench_list(services: int, threads: list[int], reps: int, url: str = "") -> list[dict]:
+    rows = _list_in_process(services, threads, reps)
+    if url:
+        rows += _list_http(url, threads, reps)
+    return rows
+
+
+def bench_startup(counts: list[int]) -> list[dict]:
+    rows = []
+    for n in counts:
+        with _sandbox() as root:
+            items = []
+            for i in range(n):
+                path = root / f"start_svc_{i}.sh"
+                path.write_text(f"python -m http.server {10000 + i}\n", encoding="utf-8")
+                items.append({"id": str(uuid.uuid4()), "name": f"svc_{i}", "script_path": str(path),
+                              "cwd": str(root), "command": f'bash "{path}"', "last_status": "stopped"})
+            pm.SERVICES_FILE.write_text(json.dumps(items), encoding="utf-8")
+            timings = {}
+            for label in ("cold", "warm"):  # warm: script_meta.json already populated
+                script_meta._cache = None
+                t0 = time.perf_counter()
+                manager = pm.ProcessManager()
+                manager.flush()
+                timings[f"{label}_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+                assert len(manager.list_all()) == n
+            rows.append({"services": n, **timings})
+    return rows
+
+
+# ── Runner ──
+def _meta() -> dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        rev = ""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "git_rev": rev,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _flatten(row: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in row.items():
+        if isinstance(v, dict):
+            out.update(_flatten(v, f"{prefix}{k}."))
+        else:
+            out[prefix + k] = v
+    return out
+
+
+def compare(baseline: dict, current: dict):
+    """Print new/baseline ratios for numeric fields of rows with matching parameters."""
+    for bench, rows in current["results"].items():
+        base_rows = baseline.get("results", {}).get(bench, [])
+        for row in rows:
+            flat = _flatten(row)
+            key = {k: v for k, v in flat.items() if isinstance(v, str) or k in ("messages", "lines", "services", "threads")}
+            match = next((b for b in map(_flatten, base_rows)
+                          if all(b.get(k) == v for k, v in key.items())), None)
+            if match is None:
+                continue
+            ratios = {k: round(v / match[k], 2) for k, v in flat.items()
+                      if k not in key and isinstance(v, (int, float)) and isinstance(match.get(k), (int, float)) and match[k]}
+            print(f"[compare] {bench} {key}: {ratios}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cmd-patrol benchmark suite")
+    parser.add_argument("--only", default="mq,ingest,get_logs,list,startup", help="comma-separated benches")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes for a fast smoke run")
+    parser.add_argument("--url", default="", help="also benchmark GET /api/services on a running backend")
+    parser.add_argument("--out", default="", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", default="", help="baseline JSON to compare against")
+    args = parser.parse_args()
+
+    quick = args.quick
+    benches = {
+        "mq": lambda: bench_mq([1000, 10000] if quick else [1000, 10000, 100000]),
+        "ingest": lambda: bench_ingest(20000 if quick else 200000),
+        "get_logs": lambda: bench_get_logs(20 if quick else 200),
+        "list": lambda: bench_list(50 if quick else 200, [1, 8] if quick else [1, 8, 32],
+                                   20 if quick else 200, args.url),
+        "startup": lambda: bench_startup([10, 100] if quick else [10, 100, 1000]),
+    }
+    results = {}
+    for name in (n.strip() for n in args.only.split(",") if n.strip()):
+        if name not in benches:
+            parser.error(f"unknown bench: {name} (choose from {', '.join(benches)})")
+        print(f"[bench] {name}...", file=sys.stderr, flush=True)
+        results[name] = benches[name]()
+        for row in results[name]:
+            print(f"[bench] {name} {row}", file=sys.stderr, flush=True)
+
+    report = {"meta": {**_meta(), "quick": quick}, "results": results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Service config file access for the config editor (/api/services/<id>/config).
+
+Configs can be several megabytes, so nothing here holds a whole file in
+memory unless the caller asks for the whole file:
+- read_range decodes one byte window, cut on a character boundary, and
+  reports the byte offset the next window starts at.
+- ETags come from mtime_ns + size (one stat, no read). Writes to an existing
+  file must carry the ETag the client last saw (or "*"); if it is missing or
+  the file changed since, ConfigConflict is raised instead of silently
+  overwriting someone else's edit.
+- Before every write the current file is copied to config_history/ (the last
+  CONFIG_HISTORY versions per file are kept) and the new content replaces it
+  atomically, in the file's original encoding; text that encoding can't
+  represent is rejected with ValueError rather than re-encoding the file.
+- apply_edits splices byte-range edits while streaming the old file into the
+  replacement, so a one-line change doesn't round-trip the full content.
+"""
+
+import codecs
+import hashlib
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from persist import atomic_writer
+
+HISTORY_DIR = Path(__file__).parent / "config_history"
+CONFIG_HISTORY = 20  # backup versions kept per config file
+CONFIG_PAGE_SIZE = 1 << 20  # bytes per read_range window
+COPY_CHUNK = 1 << 16
+ENCODINGS = ("utf-8", "gbk", "latin-1")
+
+
+class ConfigConflict(Exception):
+    def __init__(self, etag: str):
+        super().__init__("Config file was modified elsewhere")
+        self.etag = etag
+
+
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_encodings: dict[str, tuple[str, str]] = {}  # path -> (etag, encoding)
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def etag(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def _detect(path: str) -> str:
+    for enc in ENCODINGS[:-1]:
+        decoder = codecs.getincrementaldecoder(enc)()
+        try:
+            with open(path, "rb") as f:
+                while chunk := f.read(COPY_CHUNK):
+                    decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return ENCODINGS[-1]
+
+
+def encoding(path: str) -> str:
+    """The file's encoding (streaming trial decode, cached per ETag)."""
+    tag = etag(path)
+    hit = _encodings.get(path)
+    if hit and hit[0] == tag:
+        return hit[1]
+    enc = _detect(path)
+    _encodings[path] = (tag, enc)
+    return enc
+
+
+def read_range(path: str, offset: int = 0, length: int = CONFIG_PAGE_SIZE) -> dict[str, Any]:
+    """Decode `length` bytes from `offset`, stopping before a split character."""
+    tag = etag(path)
+    enc = encoding(path)
+    size = os.path.getsize(path)
+    offset = max(0, min(offset, size))
+    with open(path, "rb") as f:
+        f.seek(offset)
+        raw = f.read(max(4, length))
+    eof = offset + len(raw) >= size
+    decoder = codecs.getincrementaldecoder(enc)(errors="replace")
+    content = decoder.decode(raw, final=eof)
+    next_offset = offset + len(raw) - len(decoder.getstate()[0])
+    return {
+        "content": content,
+        "offset": offset,
+        "next_offset": next_offset,
+        "size": size,
+        "eof": eof,
+        "encoding": enc,
+        "etag": tag,
+    }
+
+
+# ── History ──
+def _history_dir(path: str) -> Path:
+    return HISTORY_DIR / hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+
+
+def _backup(path: str):
+    """Copy the current file into its history folder and prune old versions."""
+    tag = etag(path)
+    folder = _history_dir(path)
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / "source.txt").write_text(os.path.abspath(path), encoding="utf-8")
+    versions = sorted(folder.glob("*.bak"))
+    if not any(v.stem.endswith(tag) for v in versions):
+        shutil.copyfile(path, folder / f"{int(time.time() * 1000)}-{tag}.bak")
+        versions = sorted(folder.glob("*.bak"))
+    for old in versions[:-CONFIG_HISTORY]:
+        old.unlink(missing_ok=True)
+
+
+def history(path: str) -> list[dict[str, Any]]:
+    """Saved versions of `path`, newest first."""
+    folder = _history_dir(path)
+    if not folder.is_dir():
+        return []
+    out = []
+    for v in sorted(folder.glob("*.bak"), reverse=True):
+        saved_ms = int(v.stem.split("-", 1)[0])
+        out.append({
+            "version": v.stem,
+            "size": v.stat().st_size,
+            "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(saved_ms / 1000)),
+        })
+    return out
+
+
+# ── Writes ──
+def _check(path: str, if_match: str | None):
+    current = etag(path)
+    if if_match != "*" and if_match != current:
+        raise ConfigConflict(current)
+
+
+def _encode(text: str, enc: str) -> bytes:
+    try:
+        return text.encode(enc)
+    except UnicodeEncodeError as e:
+        raise ValueError(f"{e.object[e.start:e.end]!r} cannot be saved in this file's encoding ({enc})") from None
+
+
+def write_text(path: str, content: str, if_match: str | None = None) -> str:
+    """Replace the whole file (keeping its encoding). Returns the new ETag.
+
+    `if_match` may only be omitted when the file doesn't exist yet.
+    """
+    with _lock_for(path):
+        exists = os.path.isfile(path)
+        if exists:
+            _check(path, if_match)
+        data = _encode(content, encoding(path) if exists else "utf-8")
+        if exists:
+            _backup(path)
+        with atomic_writer(Path(path)) as f:
+            f.write(data)
+        return etag(path)
+
+
+def apply_edits(path: str, edits: list[dict[str, Any]], if_match: str) -> str:
+    """Splice byte-range edits into the file. Returns the new ETag.
+
+    Each edit is {"offset": int, "delete": int, "text": str}; offsets are byte
+    offsets into the version identified by `if_match` (as returned by
+    read_range's offset/next_offset). Edits must not overlap.
+    """
+    with _lock_for(path):
+        _check(path, if_match)
+        size = os.path.getsize(path)
+        ordered = sorted(edits, key=lambda e: int(e.get("offset", 0)))
+        pos = 0
+        for e in ordered:
+            start, delete = int(e.get("offset", 0)), int(e.get("delete", 0))
+            if start < pos or delete < 0 or start + delete > size:
+                raise ValueError(f"Invalid or overlapping edit at offset {start}")
+            pos = start + delete
+        enc = encoding(path)
+        texts = [_encode(str(e.get("text", "")), enc) for e in ordered]
+        _backup(path)
+        with atomic_writer(Path(path)) as dst:
+            with open(path, "rb") as src:
+                pos = 0
+                for e, text in zip(ordered, texts):
+                    start = int(e.get("offset", 0))
+                    remaining = start - pos
+                    while remaining > 0:
+                        chunk = src.read(min(COPY_CHUNK, remaining))
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        remaining -= len(chunk)
+                    dst.write(text)
+                    pos = start + int(e.get("delete", 0))
+                    src.seek(pos)
+                shutil.copyfileobj(src, dst, COPY_CHUNK)
+        return etag(path)
+
+
+def restore(path: str, version: str, if_match: str | None = None) -> str:
+    """Roll the file back to a saved version (the current one is backed up first)."""
+    backup = _history_dir(path) / f"{version}.bak"
+    if "/" in version or "\\" in version or not backup.is_file():
+        raise FileNotFoundError(f"No such version: {version}")
+    with _lock_for(path):
+        if os.path.isfile(path):
+            _check(path, if_match)
+            _backup(path)
+        with atomic_writer(Path(path)) as dst, open(backup, "rb") as src:
+            shutil.copyfileobj(src, dst, COPY_CHUNK)
+        return etag(path)
@@ -0,0 +1,104 @@
+"""
+Crash records for services that exited on their own.
+
+When a running service stops without being asked to, ProcessManager builds
+a compact record:
+{
+    "id": str (uuid),
+    "service_id": str, "service": str,
+    "exit_code": int|None, "signal": str|None,   # POSIX: killed by signal
+    "ts": float, "started_at": str, "ended_at": str, "runtime": float (seconds),
+    "restart_count": int,
+    "last_lines": [str],          # final CRASH_LOG_LINES log lines
+    "resources": [{ts, cpu_seconds, cpu_percent, rss_bytes}],  # last samples
+    "signature": str,             # exit code + normalized last lines
+    "occurrence": int,            # nth crash with this signature in a row
+    "mq_id": str|None,            # MQ event carrying this crash
+}
+and stores it in crashes.json (newest CRASH_HISTORY per service).
+
+One MQ event is published per distinct crash. A crash with the same
+signature as the service's previous one, within CRASH_DEDUP_WINDOW and
+while that event is still open (not "done"), reuses the event instead of
+adding another: a crash loop shows up once in the queue, with the count
+in the crash history.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+import mq_store
+from persist import atomic_write_text
+
+CRASH_FILE = Path(__file__).parent / "crashes.json"
+CRASH_HISTORY = 50  # records kept per service
+CRASH_DEDUP_WINDOW = 3600  # seconds an identical crash keeps reusing the open MQ event
+CRASH_SIGNATURE_LINES = 5  # trailing non-empty log lines that identify a crash
+
+_lock = threading.Lock()
+_records: dict[str, list[dict]] = None  # service id -> records, oldest first
+_NOISE = re.compile(r"0x[0-9a-f]+|\d+")
+_REPEAT = re.compile(r" \(×\d+\)$")  # LogBuffer's collapsed-repeat suffix
+
+
+def signature(exit_code, lines: list[str]) -> str:
+    """Stable id for "the same crash": exit code + last lines with numbers/addresses masked."""
+    tail = [l.strip() for l in lines if l.strip()][-CRASH_SIGNATURE_LINES:]
+    text = f"{exit_code}\n" + "\n".join(_NOISE.sub("#", _REPEAT.sub("", l).lower()) for l in tail)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _load() -> dict[str, list[dict]]:
+    global _records
+    if _records is None:
+        try:
+            _records = json.loads(CRASH_FILE.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            _records = {}
+    return _records
+
+
+def _save():
+    atomic_write_text(CRASH_FILE, json.dumps(_records, indent=2, ensure_ascii=False))
+
+
+def record(crash: dict, publish: Callable[[dict], Optional[str]],
+           lookup: Callable[[str], Optional[dict]] = mq_store.get) -> dict:
+    """Store a crash; `publish(crash)` posts its MQ event (returns the message id) unless deduplicated.
+
+    `lookup(id)` fetches an earlier event to see whether it is still open.
+    """
+    with _lock:
+        history = _load().setdefault(crash["service_id"], [])
+        previous = history[-1] if history else None
+        crash["occurrence"] = 1
+        crash["mq_id"] = None
+        if previous and previous["signature"] == crash["signature"] \
+                and crash["ts"] - previous["ts"] < CRASH_DEDUP_WINDOW:
+            crash["occurrence"] = previous.get("occurrence", 1) + 1
+            message = lookup(previous["mq_id"]) if previous.get("mq_id") else None
+            if message and message["status"] != "done":
+                crash["mq_id"] = message["id"]
+        if crash["mq_id"] is None:
+            crash["mq_id"] = publish(crash)
+        history.append(crash)
+        del history[:-CRASH_HISTORY]
+        _save()
+    return crash
+
+
+def query(service_id: str, limit: int = CRASH_HISTORY) -> list[dict]:
+    """Crash records for a service, newest first."""
+    with _lock:
+        history = _load().get(service_id, [])
+        return list(reversed(history[-limit:])) if limit > 0 else []
+
+
+def forget(service_id: str):
+    with _lock:
+        if _load().pop(service_id, None) is not None:
+            _save()
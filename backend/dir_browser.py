@@ -0,0 +1,111 @@
+"""
+Directory listing for the script picker (/api/browse).
+
+Listings come from os.scandir, whose dirent type info answers is_dir()
+without an extra stat per entry on both Windows and Linux. A directory's
+filtered, sorted listing is cached for DIR_CACHE_TTL seconds and dropped
+early if the directory's mtime changes. Pages are cut with a name cursor
+(the last name of the previous page), so they stay stable while entries
+are added or removed.
+"""
+
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator
+
+SCRIPT_EXTS = (".cmd", ".bat", ".ps1", ".sh")
+DIR_CACHE_TTL = 5.0  # seconds
+DIR_CACHE_SIZE = 64  # directories kept
+BROWSE_PAGE_SIZE = 500
+FIND_SKIP_DIRS = {".git", "node_modules", "__pycache__", ".venv", "venv", "$RECYCLE.BIN", "System Volume Information"}
+
+_cache: "OrderedDict[str, tuple[float, float, list[dict], list[str]]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _scan(path: str) -> list[dict]:
+    items = []
+    with os.scandir(path) as it:
+        for entry in it:
+            is_dir = _is_dir(entry)
+            if is_dir or os.path.splitext(entry.name)[1].lower() in SCRIPT_EXTS:
+                items.append({"name": entry.name, "path": entry.path, "type": "dir" if is_dir else "file"})
+    items.sort(key=lambda i: i["name"])
+    return items
+
+
+def list_dir(path: str) -> tuple[list[dict], list[str]]:
+    """Sorted dirs + scripts in `path` and their names (for cursor lookup), cached."""
+    mtime = os.stat(path).st_mtime
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(path)
+        if hit and hit[0] == mtime and now - hit[1] < DIR_CACHE_TTL:
+            _cache.move_to_end(path)
+            return hit[2], hit[3]
+    items = _scan(path)
+    names = [i["name"] for i in items]
+    with _lock:
+        _cache[path] = (mtime, now, items, names)
+        _cache.move_to_end(path)
+        while len(_cache) > DIR_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return items, names
+
+
+def browse(path: str, cursor: str = "", limit: int = BROWSE_PAGE_SIZE, q: str = "") -> dict:
+    """One page of `path`: entries after `cursor`, optionally filtered by name substring."""
+    items, names = list_dir(path)
+    start = bisect.bisect_right(names, cursor) if cursor else 0
+    q = q.lower()
+    page = []
+    i = start
+    while i < len(items) and len(page) < limit:
+        if not q or q in items[i]["name"].lower():
+            page.append(items[i])
+        i += 1
+    more = i < len(items) and (not q or any(q in it["name"].lower() for it in items[i:]))
+    # Counts what the filter matches, so the client's "N entries" agrees with the pages
+    total = sum(1 for it in items if q in it["name"].lower()) if q else len(items)
+    return {
+        "items": page,
+        "total": total,
+        "next_cursor": page[-1]["name"] if more and page else "",
+    }
+
+
+def find_scripts(root: str, q: str = "", max_results: int = 5000, max_depth: int = 12) -> Iterator[dict]:
+    """Walk `root` breadth-first and yield scripts as they are found."""
+    q = q.lower()
+    found = 0
+    queue = [(root, 0)]
+    while queue:
+        next_queue = []
+        for path, depth in queue:
+            try:
+                it = os.scandir(path)
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    if _is_dir(entry):
+                        if depth < max_depth and entry.name not in FIND_SKIP_DIRS and not entry.is_symlink():
+                            next_queue.append((entry.path, depth + 1))
+                    elif os.path.splitext(entry.name)[1].lower() in SCRIPT_EXTS:
+                        if q and q not in entry.name.lower():
+                            continue
+                        yield {"name": entry.name, "path": entry.path, "dir": path}
+                        found += 1
+                        if found >= max_results:
+                            return
+        queue = next_queue
@@ -1,9 +1,17 @@
+import copy
 import json
+import queue
 import re
 import subprocess
-from dataclasses import dataclass
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
+
+from persist import atomic_write_text
 
 DOMAINS_FILE = Path(__file__).parent / "domains.json"
 
@@ -12,6 +20,7 @@ DOMAINS_FILE = Path(__file__).parent / "domains.json"
 class ApplyResult:
     ok: bool
     message: str
+    changed: bool = True
 
 
 def _read_json(path: Path) -> Any:
@@ -28,16 +37,31 @@ def _migrate_candidates(candidates: list) -> list[dict[str, str]]:
     return [r for r in result if r["url"]]
 
 
+# (mtime_ns, size) of domains.json -> parsed content; one stat per load instead of a parse
+_domains_cache: tuple[tuple[int, int], dict[str, Any]] | None = None
+_domains_lock = threading.Lock()
+
+
 def load_domains() -> dict[str, Any]:
-    if not DOMAINS_FILE.exists():
+    """domains.json contents (a fresh copy callers may mutate), re-parsed only after edits."""
+    global _domains_cache
+    try:
+        st = DOMAINS_FILE.stat()
+    except FileNotFoundError:
         return {"active": "", "candidates": [], "targets": {}}
+    sig = (st.st_mtime_ns, st.st_size)
+    with _domains_lock:
+        if _domains_cache and _domains_cache[0] == sig:
+            return copy.deepcopy(_domains_cache[1])
     data = _read_json(DOMAINS_FILE)
     data["candidates"] = _migrate_candidates(data.get("candidates", []))
-    return data
+    with _domains_lock:
+        _domains_cache = (sig, data)
+    return copy.deepcopy(data)
 
 
 def save_domains(data: dict[str, Any]) -> None:
-    DOMAINS_FILE.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+    atomic_write_text(DOMAINS_FILE, json.dumps(data, indent=2, ensure_ascii=False))
 
 
 def _normalize_domain(domain: str) -> str:
@@ -47,45 +71,211 @@ def _normalize_domain(domain: str) -> str:
     return domain.rstrip("/")
 
 
-def _apply_js_config(target_file: Path, suffix: str, domain: str) -> ApplyResult:
+# ── Target rewriters ──────────────────────────────────────────
+# Each target `type` maps to a rewriter(path, target_cfg, new_value) that
+# patches only the value it owns. Unchanged files are never written, and
+# changed ones are replaced atomically with their line endings preserved.
+Rewriter = Callable[[Path, dict[str, Any], str], ApplyResult]
+REWRITERS: dict[str, Rewriter] = {}
+
+
+def rewriter(t_type: str):
+    """Register a rewriter for a target type."""
+    def register(fn: Rewriter) -> Rewriter:
+        REWRITERS[t_type] = fn
+        return fn
+    return register
+
+
+def _read_text(path: Path) -> str:
+    # Decode bytes directly so \r\n survives the round trip untouched
+    return path.read_bytes().decode("utf-8")
+
+
+def _write_if_changed(path: Path, old_text: str | None, new_text: str) -> ApplyResult:
+    if old_text is not None and old_text == new_text:
+        return ApplyResult(True, f"Unchanged {path}", changed=False)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_text(path, new_text)
+    return ApplyResult(True, f"Updated {path}")
+
+
+def _newline(text: str) -> str:
+    return "\r\n" if "\r\n" in text else "\n"
+
+
+@rewriter("js_config")
+def _apply_js_config(target_file: Path, t: dict[str, Any], value: str) -> ApplyResult:
     if not target_file.exists():
         return ApplyResult(False, f"Target file not found: {target_file}")
 
-    text = target_file.read_text(encoding="utf-8")
+    text = _read_text(target_file)
 
-    new_api_base = _normalize_domain(domain) + (suffix or "")
-
-    pattern = r"apiBase\s*:\s*\"[^\"]*\""
+    pattern = r'apiBase\s*:\s*"(?:[^"\\]|\\.)*"'
     if not re.search(pattern, text):
         return ApplyResult(False, f"apiBase not found in: {target_file}")
 
-    updated = re.sub(pattern, f'apiBase: "{new_api_base}"', text, count=1)
-    target_file.write_text(updated, encoding="utf-8")
-    return ApplyResult(True, f"Updated {target_file}")
-
-
-def _apply_json(target_file: Path, json_path: str, suffix: str, domain: str) -> ApplyResult:
-    data: Any = {}
-    if target_file.exists():
-        data = _read_json(target_file)
+    # json.dumps escapes quotes/backslashes and is a valid JS string literal
+    updated = re.sub(pattern, lambda _: f"apiBase: {json.dumps(value, ensure_ascii=False)}", text, count=1)
+    return _write_if_changed(target_file, text, updated)
+
+
+def _json_value_span(text: str, keys: list[str]) -> tuple[int, int] | None:
+    """Locate the raw text span of the value at `keys` without building the document.
+
+    Sibling values are skipped with raw_decode; nothing is re-serialized, so
+    patching a large file only rewrites the few bytes that changed.
+    """
+    decoder = json.JSONDecoder()
+    ws = re.compile(r"\s*")
+    pos = ws.match(text, 0).end()
+    for depth, key in enumerate(keys):
+        if text[pos:pos + 1] != "{":
+            return None
+        pos = ws.match(text, pos + 1).end()
+        while True:
+            if text[pos:pos + 1] != '"':
+                return None
+            name, pos = json.decoder.scanstring(text, pos + 1)
+            pos = ws.match(text, pos).end()
+            if text[pos:pos + 1] != ":":
+                return None
+            pos = ws.match(text, pos + 1).end()
+            if name == key:
+                break
+            _, pos = decoder.raw_decode(text, pos)
+            pos = ws.match(text, pos).end()
+            if text[pos:pos + 1] != ",":
+                return None
+            pos = ws.match(text, pos + 1).end()
+        if depth == len(keys) - 1:
+            _, end = decoder.raw_decode(text, pos)
+            return pos, end
+    return None
 
-    new_value = _normalize_domain(domain) + (suffix or "")
 
+@rewriter("json")
+def _apply_json(target_file: Path, t: dict[str, Any], value: str) -> ApplyResult:
+    json_path = t.get("jsonPath", "")
     if not json_path:
         return ApplyResult(False, "jsonPath missing")
-
     keys = json_path.split(".")
+
+    text = _read_text(target_file) if target_file.exists() else None
+    if text is not None:
+        try:
+            span = _json_value_span(text, keys)
+        except ValueError:
+            span = None
+        if span:
+            start, end = span
+            updated = text[:start] + json.dumps(value, ensure_ascii=False) + text[end:]
+            return _write_if_changed(target_file, text, updated)
+
+    # Path missing (or file absent): fall back to building the structure
+    data: Any = json.loads(text) if text else {}
     cur = data
     for k in keys[:-1]:
         if k not in cur or not isinstance(cur[k], dict):
             cur[k] = {}
         cur = cur[k]
-
-    cur[keys[-1]] = new_value
-
-    target_file.parent.mkdir(parents=True, exist_ok=True)
-    target_file.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
-    return ApplyResult(True, f"Updated {target_file}")
+    cur[keys[-1]] = value
+    return _write_if_changed(target_file, text, json.dumps(data, indent=2, ensure_ascii=False))
+
+
+def _quote_like(old: str, value: str) -> str:
+    """Render value with the same quoting style as the value it replaces, escaped for it."""
+    old = old.strip()
+    if old[:1] == '"' and old[-1:] == '"':
+        return json.dumps(value, ensure_ascii=False)
+    if old[:1] == "'" and old[-1:] == "'":
+        return "'" + value.replace("'", "''") + "'"
+    return value
+
+
+@rewriter("yaml")
+def _apply_yaml(target_file: Path, t: dict[str, Any], value: str) -> ApplyResult:
+    """Patch a scalar at a dotted `keyPath` in block-style YAML, keeping comments."""
+    key_path = t.get("keyPath", "")
+    if not key_path:
+        return ApplyResult(False, "keyPath missing")
+    if not target_file.exists():
+        return ApplyResult(False, f"Target file not found: {target_file}")
+    text = _read_text(target_file)
+    keys = key_path.split(".")
+    lines = text.splitlines(keepends=True)
+    line_re = re.compile(r"^(\s*)([^\s#:][^:#]*?)\s*:(\s*)([^#\r\n]*?)(\s*(?:#.*)?)(\r?\n)?$")
+    stack: list[tuple[int, str]] = []  # (indent, key) of enclosing mappings
+    for i, line in enumerate(lines):
+        m = line_re.match(line)
+        if not m or line.lstrip().startswith(("#", "-")):
+            continue
+        indent = len(m.group(1))
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        key = m.group(2).strip().strip("\"'")
+        path = [k for _, k in stack] + [key]
+        if path == keys and m.group(4):
+            new_val = _quote_like(m.group(4), value)
+            lines[i] = line[:m.start(4)] + new_val + line[m.end(4):]
+            return _write_if_changed(target_file, text, "".join(lines))
+        if not m.group(4):
+            stack.append((indent, key))
+    return ApplyResult(False, f"{key_path} not found in: {target_file}")
+
+
+@rewriter("env")
+def _apply_env(target_file: Path, t: dict[str, Any], value: str) -> ApplyResult:
+    """Set KEY=value in a .env file, appending the key if it is missing."""
+    key = t.get("key", "")
+    if not key:
+        return ApplyResult(False, "key missing")
+    text = _read_text(target_file) if target_file.exists() else ""
+    pattern = re.compile(rf"^(\s*(?:export\s+)?{re.escape(key)}\s*=)([^\r\n]*)", re.MULTILINE)
+    m = pattern.search(text)
+    if m:
+        updated = text[:m.start(2)] + _quote_like(m.group(2), value) + text[m.end(2):]
+    else:
+        nl = _newline(text)
+        updated = text + ("" if not text or text.endswith(("\n", "\r")) else nl) + f"{key}={value}{nl}"
+    return _write_if_changed(target_file, text if target_file.exists() else None, updated)
+
+
+@rewriter("ini")
+def _apply_ini(target_file: Path, t: dict[str, Any], value: str) -> ApplyResult:
+    """Set `key` in `[section]` of an INI file, keeping comments and ordering."""
+    section, key = t.get("section", ""), t.get("key", "")
+    if not section or not key:
+        return ApplyResult(False, "section/key missing")
+    text = _read_text(target_file) if target_file.exists() else ""
+    nl = _newline(text)
+    lines = text.splitlines(keepends=True)
+    key_re = re.compile(rf"^(\s*{re.escape(key)}\s*[=:]\s*)([^\r\n]*)", re.IGNORECASE)
+    in_section = False
+    insert_at = None
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            if in_section:
+                break
+            in_section = stripped[1:-1].strip() == section
+            if in_section:
+                insert_at = i + 1
+            continue
+        if in_section:
+            m = key_re.match(line)
+            if m:
+                lines[i] = line[:m.start(2)] + value + line[m.end(2):]
+                return _write_if_changed(target_file, text, "".join(lines))
+            if stripped:
+                insert_at = i + 1
+    if lines and not lines[-1].endswith(("\n", "\r")):
+        lines[-1] += nl
+    if insert_at is None:
+        lines.append(f"[{section}]{nl}")
+        insert_at = len(lines)
+    lines.insert(insert_at, f"{key} = {value}{nl}")
+    return _write_if_changed(target_file, text if target_file.exists() else None, "".join(lines))
 
 
 def _find_git_root(file_path: Path) -> Path | None:
@@ -97,13 +287,10 @@ def _find_git_root(file_path: Path) -> Path | None:
     return None
 
 
-def _git_commit_push(file_path: Path, commit_msg: str) -> str:
-    git_root = _find_git_root(file_path)
-    if not git_root:
-        return "git root not found"
+def _git_commit(git_root: Path, rel_paths: list[str], commit_msg: str) -> tuple[bool, str]:
+    """Stage and commit files in one repo. Returns (committed, message)."""
     try:
-        rel = file_path.relative_to(git_root).as_posix()
-        subprocess.run(["git", "add", rel], cwd=str(git_root), capture_output=True, timeout=10)
+        subprocess.run(["git", "add", "--", *rel_paths], cwd=str(git_root), capture_output=True, timeout=10)
         result = subprocess.run(
             ["git", "commit", "-m", commit_msg],
             cwd=str(git_root), capture_output=True, text=True, timeout=15
@@ -111,54 +298,230 @@ def _git_commit_push(file_path: Path, commit_msg: str) -> str:
         if result.returncode != 0:
             out = (result.stdout + result.stderr).strip()
             if "nothing to commit" in out:
-                return "no changes to commit"
-            return f"commit failed: {out}"
+                return False, "no changes to commit"
+            return False, f"commit failed: {out}"
+        return True, "committed"
+    except subprocess.TimeoutExpired:
+        return False, "git operation timed out"
+    except Exception as e:
+        return False, f"git error: {e}"
+
+
+def _git_push(git_root: Path) -> tuple[bool, str]:
+    try:
         push = subprocess.run(
             ["git", "push", "origin", "main"],
             cwd=str(git_root), capture_output=True, text=True, timeout=30
         )
         if push.returncode != 0:
-            return f"committed but push failed: {(push.stdout + push.stderr).strip()}"
-        return "committed & pushed"
+            return False, (push.stdout + push.stderr).strip()
+        return True, "pushed"
     except subprocess.TimeoutExpired:
-        return "git operation timed out"
+        return False, "git push timed out"
     except Exception as e:
-        return f"git error: {e}"
+        return False, f"git error: {e}"
 
 
-def apply_active_domain(active_domain: str) -> list[dict[str, Any]]:
-    cfg = load_domains()
-    targets = cfg.get("targets", {})
+# ── Apply jobs ────────────────────────────────────────────────
+APPLY_WORKERS = 8  # targets (grouped by file) rewritten in parallel
+PUSH_RETRIES = 3
+PUSH_BACKOFF = 2.0  # seconds, doubled per retry
+JOB_RETENTION = 50  # finished apply jobs kept for status queries
 
-    results: list[dict[str, Any]] = []
 
-    for name, t in targets.items():
-        t_type = t.get("type")
-        file_str = t.get("file")
-        suffix = t.get("suffix", "")
-
-        if not file_str:
-            results.append({"target": name, "ok": False, "message": "file missing"})
-            continue
-
-        path = Path(file_str)
-        if t_type == "js_config":
-            r = _apply_js_config(path, suffix=suffix, domain=active_domain)
-        elif t_type == "json":
-            r = _apply_json(path, json_path=t.get("jsonPath", ""), suffix=suffix, domain=active_domain)
+@dataclass
+class ApplyJob:
+    id: str
+    active: str
+    status: str = "running"  # running | done
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    finished_at: str | None = None
+    results: dict[str, dict[str, Any]] = field(default_factory=dict)
+    events: list[dict[str, Any]] = field(default_factory=list)
+    pending_pushes: int = 1  # queued pushes, plus 1 held by _run_apply until every commit is done
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def emit(self, target: str, stage: str, ok: bool, message: str):
+        """Record a progress event and fold it into the per-target result."""
+        with self._lock:
+            self.events.append({"seq": len(self.events), "target": target, "stage": stage,
+                                "ok": ok, "message": message})
+            r = self.results.setdefault(target, {"target": target, "ok": ok, "message": "", "git": ""})
+            if stage == "apply":
+                r["ok"], r["message"] = ok, message
+            else:
+                r["git"] = message
+
+    def finish_push(self):
+        with self._lock:
+            self.pending_pushes -= 1
+            last = self.pending_pushes <= 0
+        if last:
+            self._finish()
+
+    def _finish(self):
+        with self._lock:
+            if self.status == "done":
+                return
+            self.status = "done"
+            self.finished_at = datetime.now().isoformat()
+            self.events.append({"seq": len(self.events), "target": "", "stage": "done", "ok": True, "message": ""})
+        self._done.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def events_since(self, seq: int) -> list[dict[str, Any]]:
+        with self._lock:
+            return self.events[seq:]
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.id,
+                "active": self.active,
+                "status": self.status,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "results": list(self.results.values()),
+            }
+
+
+_jobs: dict[str, ApplyJob] = {}
+_jobs_lock = threading.Lock()
+_push_queue: "queue.Queue[tuple[ApplyJob, Path, list[str], int]]" = queue.Queue()
+_push_worker: threading.Thread | None = None
+_repo_locks: dict[str, threading.Lock] = {}  # git root -> lock; one commit at a time per repo
+
+
+def get_job(job_id: str) -> ApplyJob | None:
+    return _jobs.get(job_id)
+
+
+def _register_job(job: ApplyJob):
+    with _jobs_lock:
+        _jobs[job.id] = job
+        finished = [j for j in _jobs.values() if j.status == "done"]
+        for old in finished[:max(0, len(finished) - JOB_RETENTION)]:
+            _jobs.pop(old.id, None)
+
+
+def _push_loop():
+    while True:
+        job, git_root, names, attempt = _push_queue.get()
+        ok, msg = _git_push(git_root)
+        if ok:
+            for name in names:
+                job.emit(name, "push", True, "committed & pushed")
+            job.finish_push()
+        elif attempt < PUSH_RETRIES:
+            delay = PUSH_BACKOFF * 2 ** (attempt - 1)
+            for name in names:
+                job.emit(name, "push", False, f"push failed (attempt {attempt}), retrying in {delay:.0f}s")
+            threading.Timer(delay, _push_queue.put, args=((job, git_root, names, attempt + 1),)).start()
         else:
-            r = ApplyResult(False, f"Unknown target type: {t_type}")
+            for name in names:
+                job.emit(name, "push", False, f"committed but push failed: {msg}")
+            job.finish_push()
+
+
+def _repo_lock(git_root: Path) -> threading.Lock:
+    with _jobs_lock:
+        return _repo_locks.setdefault(str(git_root.resolve()), threading.Lock())
+
+
+def _enqueue_push(job: ApplyJob, git_root: Path, names: list[str]):
+    global _push_worker
+    with _jobs_lock:
+        if _push_worker is None or not _push_worker.is_alive():
+            _push_worker = threading.Thread(target=_push_loop, daemon=True)
+            _push_worker.start()
+    _push_queue.put((job, git_root, names, 1))
+
+
+def _apply_target(t: dict[str, Any], domain: str) -> ApplyResult:
+    t_type = t.get("type")
+    rewrite = REWRITERS.get(t_type)
+    if rewrite is None:
+        return ApplyResult(False, f"Unknown target type: {t_type}")
+    return rewrite(Path(t["file"]), t, _normalize_domain(domain) + (t.get("suffix") or ""))
+
+
+def _apply_file_group(job: ApplyJob, items: list[tuple[str, dict[str, Any]]]) -> list[str]:
+    """Apply all targets that share one file, in order. Returns names that changed it."""
+    ok_names = []
+    for name, t in items:
+        try:
+            r = _apply_target(t, job.active)
+        except Exception as e:
+            r = ApplyResult(False, f"error: {e}")
+        job.emit(name, "apply", r.ok, r.message)
+        if r.ok and r.changed:
+            ok_names.append(name)
+    return ok_names
+
+
+def _commit_repo(job: ApplyJob, git_root: Path, items: list[tuple[str, dict[str, Any]]]):
+    """One commit for every changed target in a repo, then queue a single push."""
+    rel_paths = sorted({Path(t["file"]).resolve().relative_to(git_root.resolve()).as_posix() for _, t in items})
+    msgs = list(dict.fromkeys((t.get("commit_msg") or "change domain") for _, t in items))
+    names = [name for name, _ in items]
+    with _repo_lock(git_root):  # overlapping apply jobs may commit to the same repo
+        committed, msg = _git_commit(git_root, rel_paths, "; ".join(msgs))
+    for name in names:
+        job.emit(name, "commit", committed, msg)
+    if committed:
+        with job._lock:
+            job.pending_pushes += 1
+        _enqueue_push(job, git_root, names)
+
+
+def _run_apply(job: ApplyJob, targets: dict[str, Any]):
+    try:
+        _apply_and_commit(job, targets)
+    finally:
+        job.finish_push()  # drop the sentinel: done once the queued pushes finish too
 
-        git_msg = ""
-        if r.ok and t.get("auto_commit"):
-            commit_msg = t.get("commit_msg") or "change domain"
-            git_msg = _git_commit_push(path, commit_msg)
 
-        results.append({
-            "target": name,
-            "ok": r.ok,
-            "message": r.message,
-            "git": git_msg
-        })
+def _apply_and_commit(job: ApplyJob, targets: dict[str, Any]):
+    by_file: dict[str, list[tuple[str, dict[str, Any]]]] = {}
+    for name, t in targets.items():
+        if not t.get("file"):
+            job.emit(name, "apply", False, "file missing")
+            continue
+        by_file.setdefault(str(Path(t["file"]).resolve()), []).append((name, t))
+
+    with ThreadPoolExecutor(max_workers=APPLY_WORKERS) as pool:
+        applied = [n for names in pool.map(lambda items: _apply_file_group(job, items), by_file.values())
+                   for n in names]
+
+        by_repo: dict[Path, list[tuple[str, dict[str, Any]]]] = {}
+        for name in applied:
+            t = targets[name]
+            if not t.get("auto_commit"):
+                continue
+            git_root = _find_git_root(Path(t["file"]))
+            if not git_root:
+                job.emit(name, "commit", False, "git root not found")
+                continue
+            by_repo.setdefault(git_root, []).append((name, t))
+        list(pool.map(lambda kv: _commit_repo(job, *kv), by_repo.items()))
+
+
+def start_apply_job(active_domain: str) -> ApplyJob:
+    """Apply the domain to every target in the background; returns the job immediately."""
+    job = ApplyJob(id=uuid.uuid4().hex[:12], active=active_domain)
+    targets = load_domains().get("targets", {})
+    for name in targets:
+        job.results[name] = {"target": name, "ok": False, "message": "pending", "git": ""}
+    _register_job(job)
+    threading.Thread(target=_run_apply, args=(job, targets), daemon=True).start()
+    return job
 
-    return results
+
+def apply_active_domain(active_domain: str) -> list[dict[str, Any]]:
+    """Blocking variant: apply, commit and push, then return per-target results."""
+    job = start_apply_job(active_domain)
+    job.wait()
+    return job.to_dict()["results"]
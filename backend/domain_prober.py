@@ -0,0 +1,207 @@
+"""
+Background health prober for domain candidates.
+
+Every `interval` seconds all candidates in domains.json are probed
+concurrently (one persistent HTTP connection per candidate, reused across
+rounds). Latency and availability history is kept in memory; candidates
+are ranked by recent success rate, then median latency. When failover is
+enabled and the active domain fails `fail_threshold` consecutive probes, the
+best healthy candidate becomes active and apply_active_domain runs for it.
+
+Settings live under "probe" in domains.json:
+{
+    "interval": 30,          # seconds between rounds
+    "timeout": 5,            # per-probe timeout
+    "path": "/",             # appended to each candidate URL
+    "failover": false,       # auto-switch the active domain
+    "fail_threshold": 3      # consecutive failures before failover
+}
+"""
+
+import http.client
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable
+from urllib.parse import urlsplit
+
+import domain_manager
+
+PROBE_DEFAULTS = {"interval": 30, "timeout": 5, "path": "/", "failover": False, "fail_threshold": 3}
+PROBE_HISTORY = 50  # samples kept per candidate
+PROBE_WORKERS = 16
+
+
+class CandidateStats:
+    def __init__(self, url: str):
+        self.url = url
+        self.history: deque = deque(maxlen=PROBE_HISTORY)
+        self.consecutive_failures = 0
+
+    def record(self, ok: bool, latency_ms: float | None, detail: str):
+        self.history.append({"t": datetime.now().isoformat(), "ok": ok,
+                             "latency_ms": latency_ms, "detail": detail})
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+
+    def success_rate(self) -> float:
+        if not self.history:
+            return 0.0
+        return sum(1 for h in self.history if h["ok"]) / len(self.history)
+
+    def median_latency(self) -> float | None:
+        lat = [h["latency_ms"] for h in self.history if h["ok"] and h["latency_ms"] is not None]
+        return round(statistics.median(lat), 1) if lat else None
+
+    def to_dict(self) -> dict[str, Any]:
+        last = self.history[-1] if self.history else None
+        return {
+            "url": self.url,
+            "available": bool(last and last["ok"]),
+            "success_rate": round(self.success_rate(), 3),
+            "median_latency_ms": self.median_latency(),
+            "consecutive_failures": self.consecutive_failures,
+            "last": last,
+            "samples": len(self.history),
+        }
+
+
+class DomainProber:
+    def __init__(self,
+                 load: Callable[[], dict[str, Any]] = domain_manager.load_domains,
+                 save: Callable[[dict[str, Any]], None] = domain_manager.save_domains,
+                 apply: Callable[[str], Any] = domain_manager.start_apply_job):
+        self._load = load
+        self._save = save
+        self._apply = apply
+        self._stats: dict[str, CandidateStats] = {}
+        self._conns: dict[str, http.client.HTTPConnection] = {}
+        self._lock = threading.Lock()
+        self._round_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pool = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="domain-probe")
+        self.last_round: str | None = None
+        self.last_failover: dict[str, Any] | None = None
+
+    # ── probing ──
+    def _settings(self, cfg: dict[str, Any]) -> dict[str, Any]:
+        return {**PROBE_DEFAULTS, **(cfg.get("probe") or {})}
+
+    def _connection(self, url: str, timeout: float) -> tuple[http.client.HTTPConnection, str]:
+        parts = urlsplit(url)
+        conn = self._conns.get(url)
+        if conn is None:
+            cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+            conn = cls(parts.netloc, timeout=timeout)
+            self._conns[url] = conn
+        conn.timeout = timeout
+        return conn, parts.path.rstrip("/")
+
+    def _probe(self, url: str, path: str, timeout: float) -> tuple[bool, float | None, str]:
+        for attempt in (1, 2):
+            conn, base_path = self._connection(url, timeout)
+            start = time.perf_counter()
+            try:
+                conn.request("GET", (base_path + "/" + path.lstrip("/")) or "/",
+                             headers={"User-Agent": "cmd-patrol-prober", "Connection": "keep-alive"})
+                resp = conn.getresponse()
+                resp.read()
+                latency = round((time.perf_counter() - start) * 1000, 1)
+                return resp.status < 400, latency, f"HTTP {resp.status}"
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                # Server closed our kept-alive connection: reconnect once
+                conn.close()
+                self._conns.pop(url, None)
+                if attempt == 2:
+                    return False, None, f"{type(e).__name__}: {e}"
+            except Exception as e:
+                conn.close()
+                self._conns.pop(url, None)
+                return False, None, f"{type(e).__name__}: {e}"
+        return False, None, "unreachable"
+
+    def probe_once(self) -> dict[str, Any]:
+        """Run one probe round synchronously and handle failover. Returns status()."""
+        with self._round_lock:
+            cfg = self._load()
+            settings = self._settings(cfg)
+            urls = [c["url"] for c in cfg.get("candidates", []) if c.get("url")]
+            results = list(self._pool.map(
+                lambda u: (u, self._probe(u, settings["path"], float(settings["timeout"]))), urls))
+            with self._lock:
+                for url, (ok, latency, detail) in results:
+                    self._stats.setdefault(url, CandidateStats(url)).record(ok, latency, detail)
+                for url in list(self._stats):
+                    if url not in urls:
+                        del self._stats[url]
+                        conn = self._conns.pop(url, None)
+                        if conn:
+                            conn.close()
+            self.last_round = datetime.now().isoformat()
+            if settings["failover"]:
+                self._maybe_failover(cfg, int(settings["fail_threshold"]))
+        return self.status()
+
+    # ── ranking / failover ──
+    def ranking(self) -> list[dict[str, Any]]:
+        with self._lock:
+            stats = [s.to_dict() for s in self._stats.values()]
+        return sorted(stats, key=lambda s: (not s["available"], -s["success_rate"],
+                                            s["median_latency_ms"] if s["median_latency_ms"] is not None else float("inf")))
+
+    def best(self, exclude: str = "") -> str:
+        for s in self.ranking():
+            if s["available"] and s["url"] != exclude:
+                return s["url"]
+        return ""
+
+    def _maybe_failover(self, cfg: dict[str, Any], threshold: int):
+        active = str(cfg.get("active") or "").strip()
+        with self._lock:
+            stats = self._stats.get(active)
+            failing = stats is not None and stats.consecutive_failures >= threshold
+        if not failing:
+            return
+        best = self.best(exclude=active)
+        if not best:
+            return
+        cfg["active"] = best
+        self._save(cfg)
+        job = self._apply(best)
+        self.last_failover = {"t": datetime.now().isoformat(), "from": active, "to": best,
+                              "job_id": getattr(job, "id", None)}
+        print(f"[prober] failover {active} -> {best}", flush=True)
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "last_round": self.last_round,
+            "best": self.best(),
+            "ranking": self.ranking(),
+            "last_failover": self.last_failover,
+        }
+
+    # ── background loop ──
+    def _loop(self):
+        while True:
+            try:
+                cfg = self._load()
+                interval = float(self._settings(cfg)["interval"])
+                if cfg.get("candidates"):
+                    self.probe_once()
+            except Exception as e:
+                print(f"[prober] round failed: {e}", flush=True)
+                interval = PROBE_DEFAULTS["interval"]
+            self._wake.wait(max(1.0, interval))
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="domain-prober")
+            self._thread.start()
+
+    def wake(self):
+        """Run the next round now (e.g. after candidates changed)."""
+        self._wake.set()
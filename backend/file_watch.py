@@ -0,0 +1,171 @@
+"""
+File watching for cmd-patrol's own JSON files (services.json, domains.json).
+
+Each FileWatcher watches one file through its parent directory, because
+atomic saves (ours and most editors') replace the file and change its inode:
+- Linux: inotify (via libc), blocking read in a daemon thread.
+- Windows: ReadDirectoryChangesW on the directory handle.
+- Anywhere else, or if the native API fails: stat polling.
+Events only hint that something happened. The callback fires when the file's
+(mtime_ns, size) signature actually changed, after a short quiet period, so
+a burst of writes from an editor is coalesced into one reload.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator
+
+WATCH_DEBOUNCE = 0.3  # seconds of quiet before the callback runs
+POLL_INTERVAL = 1.0  # seconds between stats in polling mode
+
+# inotify(7)
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_EVENT = struct.Struct("iIII")
+
+# ReadDirectoryChangesW
+_FILE_LIST_DIRECTORY = 0x0001
+_FILE_SHARE_ALL = 0x0007
+_OPEN_EXISTING = 3
+_FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+_NOTIFY_FILTER = 0x0001 | 0x0008 | 0x0010  # FILE_NAME | SIZE | LAST_WRITE
+
+
+def _signature(path: Path) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _inotify_events(directory: Path) -> Iterator[set[str]]:
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+    fd = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(str(directory)), mask) < 0:
+        os.close(fd)
+        raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def events():
+        with os.fdopen(fd, "rb", buffering=0) as f:
+            while True:
+                data = f.read(64 * 1024)
+                names, pos = set(), 0
+                while pos + _IN_EVENT.size <= len(data):
+                    _, _, _, length = _IN_EVENT.unpack_from(data, pos)
+                    pos += _IN_EVENT.size
+                    names.add(os.fsdecode(data[pos:pos + length].rstrip(b"\0")))
+                    pos += length
+                yield names
+    return events()
+
+
+def _win32_events(directory: Path) -> Iterator[set[str]]:
+    from ctypes import wintypes
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.CreateFileW.restype = wintypes.HANDLE
+    handle = kernel32.CreateFileW(str(directory), _FILE_LIST_DIRECTORY, _FILE_SHARE_ALL, None,
+                                  _OPEN_EXISTING, _FILE_FLAG_BACKUP_SEMANTICS, None)
+    if handle in (None, wintypes.HANDLE(-1).value):
+        raise OSError(ctypes.get_last_error(), "CreateFileW failed")
+
+    def events():
+        buf = ctypes.create_string_buffer(64 * 1024)
+        returned = wintypes.DWORD()
+        try:
+            while True:
+                ok = kernel32.ReadDirectoryChangesW(handle, buf, len(buf), False, _NOTIFY_FILTER,
+                                                    ctypes.byref(returned), None, None)
+                if not ok:
+                    raise OSError(ctypes.get_last_error(), "ReadDirectoryChangesW failed")
+                names, pos = set(), 0
+                while returned.value:
+                    next_offset, _, length = struct.unpack_from("III", buf.raw, pos)
+                    names.add(buf.raw[pos + 12:pos + 12 + length].decode("utf-16-le"))
+                    if not next_offset:
+                        break
+                    pos += next_offset
+                yield names
+        finally:
+            kernel32.CloseHandle(handle)
+    return events()
+
+
+class FileWatcher:
+    def __init__(self, path: Path, callback: Callable[[Path], None],
+                 debounce: float = WATCH_DEBOUNCE, poll_interval: float = POLL_INTERVAL):
+        self.path = Path(os.path.abspath(path))
+        self.backend = ""  # "inotify" | "win32" | "poll", set once running
+        self._callback = callback
+        self._debounce = debounce
+        self._poll_interval = poll_interval
+        self._sig = _signature(self.path)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "FileWatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name=f"watch-{self.path.name}")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop polling; native watchers exit at their next directory event."""
+        self._stop.set()
+
+    def _check(self):
+        sig = _signature(self.path)
+        if sig == self._sig:
+            return
+        self._sig = sig
+        try:
+            self._callback(self.path)
+        except Exception as e:
+            print(f"[watch] {self.path.name} callback failed: {e}", flush=True)
+
+    def _native_events(self) -> Iterator[set[str]] | None:
+        try:
+            if sys.platform.startswith("linux"):
+                self.backend = "inotify"
+                return _inotify_events(self.path.parent)
+            if os.name == "nt":
+                self.backend = "win32"
+                return _win32_events(self.path.parent)
+        except (OSError, AttributeError) as e:
+            print(f"[watch] native watcher unavailable ({e}), polling {self.path.name}", flush=True)
+        return None
+
+    def _run(self):
+        events = self._native_events()
+        if events is not None:
+            try:
+                for names in events:
+                    if self._stop.is_set():
+                        return
+                    if self.path.name in names or not names:
+                        time.sleep(self._debounce)
+                        self._check()
+                return
+            except OSError as e:
+                print(f"[watch] {self.backend} failed ({e}), polling {self.path.name}", flush=True)
+        self.backend = "poll"
+        while not self._stop.wait(self._poll_interval):
+            self._check()
+
+
+def watch(path: Path, callback: Callable[[Path], None]) -> FileWatcher:
+    """Start watching `path`; `callback(path)` runs on the watcher thread."""
+    return FileWatcher(path, callback).start()
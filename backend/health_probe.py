@@ -0,0 +1,315 @@
+"""
+Active health probes for services.
+
+A live PID only says the process exists; probes check that it still answers.
+Definitions live in each service's "probes" list in services.json:
+    {"type": "tcp",  "port": 8080}                          # connect succeeds
+    {"type": "http", "path": "/health", "expect": "2xx"}    # GET returns an expected status
+    {"type": "http", "url": "https://host/ping", "insecure": true}
+    {"type": "log",  "within": 60, "pattern": "heartbeat"}  # a (matching) line in the last N s
+Common keys: "interval" (seconds, default 15), "timeout" (3), "failures"
+(consecutive failures before the probe counts as down, 3). "port" defaults
+to the service's port, "host" to 127.0.0.1; "expect" is a status, "3xx",
+"200-299" or a list of those (default: anything below 400).
+
+Health of a running service with probes:
+    healthy    every probe passed last time
+    degraded   a probe is failing, but fewer than its `failures` times in a row
+    unhealthy  a probe has failed `failures` times in a row
+Failures in the first PROBE_START_GRACE seconds of a run are not counted.
+With "health_restart": true the service is restarted when it turns
+unhealthy, at most once per HEALTH_RESTART_COOLDOWN.
+
+All probes share one asyncio event loop in a "health-probes" thread. Each
+probe is a small task that sleeps its interval (±PROBE_JITTER, first run at
+a random offset so probes don't fire in lockstep) and does non-blocking
+I/O, so hundreds of probes cost one thread. Calls that can block on the
+service (proc.update, log scans, restarts) go to the default executor.
+Definitions are re-read every PROBE_SYNC_INTERVAL; changed probes get a
+fresh task and history.
+"""
+
+import asyncio
+import functools
+import json
+import random
+import re
+import ssl
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlsplit
+
+PROBE_TYPES = ("tcp", "http", "log")
+PROBE_DEFAULTS = {"interval": 15, "timeout": 3, "failures": 3}
+PROBE_HISTORY = 20  # results kept per probe
+PROBE_JITTER = 0.1  # +-10% on every interval
+PROBE_SYNC_INTERVAL = 1.0  # seconds between re-reads of the probe definitions
+PROBE_START_GRACE = 10  # seconds after start before failures count
+PROBE_LOG_SCAN = 20000  # max log lines searched for a heartbeat pattern
+HEALTH_RESTART_COOLDOWN = 300  # seconds between health-triggered restarts of one service
+
+
+def validate(probes) -> list[dict]:
+    """Check probe definitions; returns them with defaults filled in. Raises ValueError."""
+    if not isinstance(probes, list):
+        raise ValueError("probes must be a list")
+    out = []
+    for i, spec in enumerate(probes):
+        if not isinstance(spec, dict) or spec.get("type") not in PROBE_TYPES:
+            raise ValueError(f"probe {i}: type must be one of {', '.join(PROBE_TYPES)}")
+        spec = {**PROBE_DEFAULTS, **spec}
+        for key in ("interval", "timeout", "failures"):
+            if not isinstance(spec[key], (int, float)) or spec[key] <= 0:
+                raise ValueError(f"probe {i}: {key} must be a positive number")
+        if spec["type"] == "log":
+            if not isinstance(spec.get("within"), (int, float)) or spec["within"] <= 0:
+                raise ValueError(f"probe {i}: log probes need within (seconds)")
+            if spec.get("pattern"):
+                try:
+                    re.compile(spec["pattern"])
+                except re.error as e:
+                    raise ValueError(f"probe {i}: bad pattern: {e}")
+        if spec["type"] == "http" and spec.get("url") and urlsplit(spec["url"]).scheme not in ("http", "https"):
+            raise ValueError(f"probe {i}: url must be http(s)")
+        _status_ok(spec.get("expect"), 200)  # raises on a malformed expectation
+        out.append(spec)
+    return out
+
+
+def _status_ok(expect, status: int) -> bool:
+    if expect is None or expect == "":
+        return status < 400
+    if isinstance(expect, list):
+        return any(_status_ok(e, status) for e in expect)
+    text = str(expect).strip().lower()
+    if re.fullmatch(r"[1-5]xx", text):
+        return status // 100 == int(text[0])
+    m = re.fullmatch(r"(\d{3})\s*-\s*(\d{3})", text)
+    if m:
+        return int(m.group(1)) <= status <= int(m.group(2))
+    if re.fullmatch(r"\d{3}", text):
+        return status == int(text)
+    raise ValueError(f"Bad expect: {expect}")
+
+
+def _describe(spec: dict, port) -> str:
+    if spec["type"] == "log":
+        return f"log within {spec['within']}s" + (f" /{spec['pattern']}/" if spec.get("pattern") else "")
+    if spec["type"] == "http":
+        return "GET " + (spec.get("url") or f"{spec.get('host', '127.0.0.1')}:{port}{spec.get('path', '/')}")
+    return f"tcp {spec.get('host', '127.0.0.1')}:{port}"
+
+
+class ProbeState:
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self.history: deque = deque(maxlen=PROBE_HISTORY)
+        self.consecutive_failures = 0
+
+    def record(self, ok: bool, latency_ms: float | None, detail: str):
+        self.history.append({"t": datetime.now().isoformat(), "ok": ok,
+                             "latency_ms": latency_ms, "detail": detail})
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+
+    def to_dict(self) -> dict:
+        return {
+            "probe": self.spec,
+            "last": self.history[-1] if self.history else None,
+            "consecutive_failures": self.consecutive_failures,
+            "history": list(self.history),
+        }
+
+
+class HealthProber:
+    def __init__(self, manager):
+        self.manager = manager
+        self._states: dict[tuple, ProbeState] = {}  # (service id, probe key) -> state
+        self._tasks: dict[tuple, asyncio.Task] = {}
+        self._last_restart: dict[str, float] = {}
+        self._invalid: dict[str, str] = {}  # service id -> last reported definition error
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=lambda: asyncio.run(self._main()), daemon=True,
+                                            name="health-probes")
+            self._thread.start()
+
+    # ── scheduling ──
+    async def _main(self):
+        while True:
+            try:
+                await self._sync()
+            except Exception as e:
+                print(f"[health] sync failed: {e}", flush=True)
+            await asyncio.sleep(PROBE_SYNC_INTERVAL)
+
+    async def _sync(self):
+        """Start tasks for new/changed probe definitions, cancel removed ones."""
+        wanted = {}
+        for proc in self.manager.list_all():
+            try:
+                specs = validate(list(proc.probes))
+            except ValueError as e:
+                specs = []
+                if self._invalid.get(proc.id) != str(e):
+                    self._invalid[proc.id] = str(e)
+                    print(f"[health] {proc.alias or proc.name}: {e}", flush=True)
+            for spec in specs:
+                wanted[(proc.id, json.dumps(spec, sort_keys=True))] = spec
+            if not specs and proc.health is not None:
+                await self._update(proc, health=None)
+        with self._lock:
+            for key in [k for k in self._tasks if k not in wanted]:
+                self._tasks.pop(key).cancel()
+                self._states.pop(key, None)
+            for key, spec in wanted.items():
+                if key not in self._tasks:
+                    self._states[key] = ProbeState(spec)
+                    self._tasks[key] = asyncio.create_task(self._probe_loop(key, spec))
+
+    async def _probe_loop(self, key: tuple, spec: dict):
+        interval = float(spec["interval"])
+        await asyncio.sleep(random.uniform(0, interval))
+        while True:
+            proc = self.manager.get(key[0])
+            if proc is None:
+                return
+            try:
+                await self._run(key, proc, spec)
+            except Exception as e:
+                print(f"[health] probe failed: {e}", flush=True)
+            await asyncio.sleep(interval * random.uniform(1 - PROBE_JITTER, 1 + PROBE_JITTER))
+
+    async def _run(self, key: tuple, proc, spec: dict):
+        state = self._states.get(key)
+        if state is None:
+            return
+        if proc.status != "running":
+            state.history.clear()
+            state.consecutive_failures = 0
+            await self._evaluate(proc)
+            return
+        ok, latency, detail = await self._check(proc, spec)
+        started = datetime.fromisoformat(proc.started_at).timestamp() if proc.started_at else 0
+        if not ok and time.time() - started < PROBE_START_GRACE:
+            return  # still booting
+        state.record(ok, latency, detail)
+        await self._evaluate(proc)
+
+    # ── checks ──
+    async def _check(self, proc, spec: dict) -> tuple[bool, float | None, str]:
+        if spec["type"] == "log":
+            # Pages through up to PROBE_LOG_SCAN lines under the service's log lock
+            return await asyncio.get_running_loop().run_in_executor(None, self._check_log, proc, spec)
+        port = spec.get("port") or proc.port
+        if not port and not spec.get("url"):
+            return False, None, "no port"
+        start = time.perf_counter()
+        try:
+            if spec["type"] == "tcp":
+                coro = self._tcp(spec.get("host", "127.0.0.1"), int(port))
+            else:
+                coro = self._http(spec, port)
+            ok, detail = await asyncio.wait_for(coro, float(spec["timeout"]))
+        except asyncio.TimeoutError:
+            return False, None, f"timeout after {spec['timeout']}s"
+        except (OSError, ValueError) as e:
+            return False, None, f"{type(e).__name__}: {e}"
+        return ok, round((time.perf_counter() - start) * 1000, 1), detail
+
+    async def _tcp(self, host: str, port: int) -> tuple[bool, str]:
+        _, writer = await asyncio.open_connection(host, port)
+        writer.close()
+        return True, "connected"
+
+    async def _http(self, spec: dict, port) -> tuple[bool, str]:
+        url = spec.get("url") or f"http://{spec.get('host', '127.0.0.1')}:{port}{spec.get('path', '/')}"
+        parts = urlsplit(url)
+        context = None
+        if parts.scheme == "https":
+            context = ssl.create_default_context()
+            if spec.get("insecure"):
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, parts.port or (443 if context else 80), ssl=context)
+        try:
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                         f"User-Agent: cmd-patrol-probe\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+            line = await reader.readline()
+        finally:
+            writer.close()
+        fields = line.split()
+        if len(fields) < 2 or not fields[1].isdigit():
+            return False, f"bad response: {line[:80]!r}"
+        status = int(fields[1])
+        return _status_ok(spec.get("expect"), status), f"HTTP {status}"
+
+    def _check_log(self, proc, spec: dict) -> tuple[bool, float | None, str]:
+        within = float(spec["within"])
+        since = time.time() - within
+        pattern = re.compile(spec["pattern"]) if spec.get("pattern") else None
+        start, scanned = 0, 0
+        while scanned < PROBE_LOG_SCAN:
+            rows, start, done = proc.log_page(start, 1000, since)
+            if rows and pattern is None:
+                return True, None, f"{len(rows)}{'+' if not done else ''} lines in {within:g}s"
+            for _, _, line in rows:
+                if pattern.search(line):
+                    return True, None, "heartbeat seen"
+            scanned += len(rows)
+            if done or not rows:
+                break
+        return False, None, f"no {'matching ' if pattern else ''}log line in {within:g}s"
+
+    # ── health ──
+    @staticmethod
+    async def _update(proc, **fields):
+        """proc.update() off the event loop: it waits on the service lock, which stop() holds
+        while the process exits (and is IPC in supervisor mode)."""
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(proc.update, **fields))
+
+    async def _evaluate(self, proc):
+        with self._lock:
+            states = [s for (id, _), s in self._states.items() if id == proc.id]
+        health = None
+        if proc.status == "running" and states and any(s.history for s in states):
+            if any(s.consecutive_failures >= s.spec["failures"] for s in states):
+                health = "unhealthy"
+            elif any(s.consecutive_failures for s in states):
+                health = "degraded"
+            else:
+                health = "healthy"
+        if health != proc.health:
+            await self._update(proc, health=health)
+            if health in ("unhealthy", "degraded"):
+                failing = [_describe(s.spec, s.spec.get("port") or proc.port) + f": {s.history[-1]['detail']}"
+                           for s in states if s.consecutive_failures and s.history]
+                print(f"[health] {proc.alias or proc.name} {health}: {'; '.join(failing)}", flush=True)
+        if health == "unhealthy" and proc.health_restart:
+            now = time.time()
+            if now - self._last_restart.get(proc.id, 0) >= HEALTH_RESTART_COOLDOWN:
+                self._last_restart[proc.id] = now
+                for s in states:
+                    s.history.clear()
+                    s.consecutive_failures = 0
+                print(f"[health] restarting {proc.alias or proc.name}", flush=True)
+                # restart() blocks (stop waits for the process): keep it off the event loop
+                asyncio.get_running_loop().run_in_executor(None, self.manager.restart, proc.id)
+
+    def status(self, id: str) -> dict:
+        proc = self.manager.get(id)
+        with self._lock:
+            states = [s.to_dict() for (sid, _), s in self._states.items() if sid == id]
+        return {
+            "health": proc.health if proc else None,
+            "health_restart": proc.health_restart if proc else False,
+            "last_restart": self._last_restart.get(id),
+            "probes": states,
+        }
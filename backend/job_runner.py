@@ -0,0 +1,134 @@
+"""
+Ad-hoc command jobs for cmd-patrol.
+
+A job is a one-shot shell command (e.g. an ngrok config command) run in the
+background. Jobs reuse ManagedProcess for process launch, tree kill and log
+capture, so their output goes through the same reader / log buffer pipeline
+as services and can be tailed the same way.
+
+Job status: queued -> running -> succeeded | failed | cancelled | timeout
+At most MAX_CONCURRENT_JOBS run at once; the rest wait in "queued".
+The last JOB_HISTORY finished jobs (with their logs) are retained.
+"""
+
+import os
+import shlex
+import threading
+import uuid
+from datetime import datetime
+
+from process_manager import ManagedProcess
+
+MAX_CONCURRENT_JOBS = 4
+JOB_HISTORY = 100
+
+
+def _shell_command(cmd: str) -> str:
+    if os.name == "nt":
+        return f'cmd.exe /c "{cmd}"'
+    return f"sh -c {shlex.quote(cmd)}"
+
+
+class CommandJob(ManagedProcess):
+    def __init__(self, id: str, cmd: str, cwd: str = None, timeout: float = 0, kind: str = "command"):
+        super().__init__(id=id, name=cmd, script_path="", cwd=cwd, command=_shell_command(cmd))
+        self.cmd = cmd
+        self.kind = kind
+        self.timeout = timeout
+        self.job_status = "queued"
+        self.created_at = datetime.now().isoformat()
+        self.finished_at = None
+        self.cancel_requested = False
+        self.timed_out = False
+
+    @property
+    def finished(self) -> bool:
+        return self.job_status in ("succeeded", "failed", "cancelled", "timeout")
+
+    def to_dict(self):
+        status, pid, started_at, exit_code, _ = self._state
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "cmd": self.cmd,
+            "cwd": self.cwd,
+            "status": self.job_status,
+            "pid": pid,
+            "exit_code": exit_code,
+            "timeout": self.timeout,
+            "created_at": self.created_at,
+            "started_at": started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobRunner:
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_JOBS, history: int = JOB_HISTORY):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._history = history
+        self._jobs: dict[str, CommandJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, cmd: str, cwd: str = None, timeout: float = 0, kind: str = "command") -> CommandJob:
+        job = CommandJob(uuid.uuid4().hex[:12], cmd, cwd=cwd, timeout=timeout, kind=kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def _run(self, job: CommandJob):
+        with self._slots:
+            if job.cancel_requested:
+                self._finish(job, "cancelled")
+                return
+            job.job_status = "running"
+            if not job.start():
+                self._finish(job, "failed")
+                return
+            if job.cancel_requested:
+                job.stop()  # cancelled while we were launching it
+            timer = None
+            if job.timeout:
+                timer = threading.Timer(job.timeout, self._expire, args=(job,))
+                timer.daemon = True
+                timer.start()
+            job.process.wait()
+            if job._reader:
+                job._reader.join()  # drain remaining output before reporting
+            if timer:
+                timer.cancel()
+        if job.cancel_requested:
+            self._finish(job, "cancelled")
+        elif job.timed_out:
+            self._finish(job, "timeout")
+        else:
+            self._finish(job, "succeeded" if job.process.returncode == 0 else "failed")
+
+    def _finish(self, job: CommandJob, status: str):
+        job.job_status = status
+        job.finished_at = datetime.now().isoformat()
+
+    def _expire(self, job: CommandJob):
+        job.timed_out = True
+        job.stop()
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.finished]
+        for old in finished[:max(0, len(finished) - self._history)]:
+            del self._jobs[old.id]
+
+    def cancel(self, id: str) -> bool:
+        job = self.get(id)
+        if not job or job.finished:
+            return False
+        job.cancel_requested = True
+        job.stop()
+        return True
+
+    def get(self, id: str) -> CommandJob:
+        return self._jobs.get(id)
+
+    def list_all(self) -> list[CommandJob]:
+        with self._lock:
+            return list(self._jobs.values())
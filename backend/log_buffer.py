@@ -0,0 +1,183 @@
+"""
+In-memory log storage for one service.
+
+Lines are addressed by absolute line number: `pruned` lines have been dropped
+for good, then come compressed cold blocks, then the hot entries.
+
+- Run-length collapsing: a line identical to the previous one only bumps
+  that entry's repeat count and last-seen time; readers see it once,
+  suffixed " (×N)". Entries are stamped with when they were first logged,
+  but seek() goes by when they were last seen, so a heartbeat printed every
+  few seconds still counts as recent output.
+- Carriage returns: a frame ended by a bare "\\r" (progress bars, spinners)
+  is stored as an *open* last entry that the next frame overwrites, so a
+  progress bar occupies one line instead of thousands.
+- Cold storage: when the hot list exceeds `hot_lines`, its oldest `block`
+  entries are packed into one zlib-compressed block. Up to `cold_lines`
+  lines are kept that way before the oldest block is dropped; reads that
+  reach back into cold history decompress (and cache) one block at a time.
+  cold_lines=0 turns compression off and evicts straight from the hot list.
+
+Not thread-safe on its own: ManagedProcess guards it with its _log_lock.
+Because the last entry can still change (repeat count, open line), callers
+that want live updates re-read from the last line number they saw.
+"""
+
+import json
+import zlib
+from collections import deque
+from itertools import islice
+from typing import Iterator
+
+REPEAT_MARK = " (×{})"
+
+
+class LogBuffer:
+    def __init__(self, hot_lines: int = 5000, cold_lines: int = 50000, block: int = 1000):
+        self.hot_lines = hot_lines
+        self.cold_lines = cold_lines
+        self.block = max(1, min(block, hot_lines))
+        self.hot: deque = deque()  # [ts, line, repeat count, last seen ts]; only the last entry is mutated
+        self.cold: deque = deque()  # (first line number, count, first ts, last seen ts, zlib bytes)
+        self.pruned = 0  # lines dropped for good
+        self.cold_count = 0
+        self.cold_bytes = 0
+        self.open = False  # last entry is a carriage-return frame that may be redrawn
+        self._sealed = False  # last entry belongs to an earlier run: don't collapse into it
+        self._block_cache: tuple[int, list] | None = None
+
+    # ── Sizes ──
+    @property
+    def hot_base(self) -> int:
+        return self.pruned + self.cold_count
+
+    @property
+    def total(self) -> int:
+        return self.hot_base + len(self.hot)
+
+    def __len__(self) -> int:
+        """Lines still held (hot + cold)."""
+        return self.cold_count + len(self.hot)
+
+    # ── Writes ──
+    def append(self, ts: float, line: str) -> str:
+        """Add a completed line: "repeat" if it collapsed into the last entry, else "new"."""
+        if self.hot and not self.open and not self._sealed and self.hot[-1][1] == line:
+            self.hot[-1][2] += 1
+            self.hot[-1][3] = ts
+            return "repeat"
+        self.open = False
+        self._sealed = False
+        self.hot.append([ts, line, 1, ts])
+        self._spill()
+        return "new"
+
+    def redraw(self, ts: float, line: str, final: bool) -> str:
+        """Overwrite the open entry (or start one); `final` closes it. Returns "replace" or "new"."""
+        if self.open and self.hot:
+            self.hot[-1][1] = line
+            self.hot[-1][3] = ts
+            self.open = not final
+            return "replace"
+        self.hot.append([ts, line, 1, ts])
+        self.open = not final
+        self._sealed = False
+        self._spill()
+        return "new"
+
+    def seal(self):
+        """Make the last entry final: the next line never collapses into or redraws it."""
+        self.open = False
+        self._sealed = True
+
+    def _spill(self):
+        while len(self.hot) > self.hot_lines:
+            if self.cold_lines <= 0:
+                self.hot.popleft()
+                self.pruned += 1
+                continue
+            entries = [self.hot.popleft() for _ in range(min(self.block, len(self.hot) - 1))]
+            data = zlib.compress(json.dumps(entries, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            self.cold.append((self.hot_base, len(entries), entries[0][0], entries[-1][3], data))
+            self.cold_count += len(entries)
+            self.cold_bytes += len(data)
+            while self.cold_count > self.cold_lines:
+                self._drop_cold()
+
+    def _drop_cold(self):
+        _, count, _, _, data = self.cold.popleft()
+        self.cold_count -= count
+        self.cold_bytes -= len(data)
+        self.pruned += count
+        self._block_cache = None
+
+    def prune_age(self, cutoff: float) -> int:
+        """Drop lines last seen before `cutoff` (whole cold blocks, then hot entries). Returns how many."""
+        before = self.pruned
+        while self.cold and self.cold[0][3] < cutoff:
+            self._drop_cold()
+        if not self.cold:
+            while len(self.hot) > 1 and self.hot[0][3] < cutoff:
+                self.hot.popleft()
+                self.pruned += 1
+        return self.pruned - before
+
+    # ── Reads ──
+    @staticmethod
+    def text(entry) -> str:
+        return entry[1] if entry[2] == 1 else entry[1] + REPEAT_MARK.format(entry[2])
+
+    def _cold_entries(self, i: int) -> list:
+        first = self.cold[i][0]
+        if self._block_cache is None or self._block_cache[0] != first:
+            self._block_cache = (first, json.loads(zlib.decompress(self.cold[i][4])))
+        return self._block_cache[1]
+
+    def entries(self, start: int = 0) -> Iterator[tuple[int, list]]:
+        """(line number, [ts, line, count, last seen ts]) from `start` (clamped to the oldest held line)."""
+        n = max(start, self.pruned)
+        for i, (first, count, _, _, _) in enumerate(list(self.cold)):
+            if n >= first + count:
+                continue
+            block = self._cold_entries(i)
+            for entry in block[n - first:]:
+                yield n, entry
+                n += 1
+        n = max(n, self.hot_base)
+        for entry in islice(self.hot, n - self.hot_base, None):
+            yield n, entry
+            n += 1
+
+    def seek(self, ts: float) -> int:
+        """Line number of the first held line last seen at or after `ts` (total if none)."""
+        n = self.pruned
+        for i, (first, count, _, last_ts, _) in enumerate(self.cold):
+            if last_ts < ts:
+                n = first + count
+                continue
+            for j, entry in enumerate(self._cold_entries(i)):
+                if entry[3] >= ts:
+                    return first + j
+        n = max(n, self.hot_base)
+        for entry in self.hot:
+            if entry[3] >= ts:
+                return n
+            n += 1
+        return n
+
+    def read(self, start: int = 0, tail: int = 0) -> list[str]:
+        """Lines from `start`; with `tail`, only the last `tail` of them (older blocks stay packed)."""
+        if tail > 0:
+            start = max(start, self.total - tail)
+        if start >= self.hot_base:
+            return [self.text(e) for e in islice(self.hot, start - self.hot_base, None)]
+        return [self.text(entry) for _, entry in self.entries(start)]
+
+    def line_at(self, n: int) -> str | None:
+        if n >= self.hot_base:
+            i = n - self.hot_base
+            return self.text(self.hot[i]) if i < len(self.hot) else None
+        for i, (first, count, _, _, _) in enumerate(self.cold):
+            if first <= n < first + count:
+                return self.text(self._cold_entries(i)[n - first])
+        return None
@@ -0,0 +1,190 @@
+"""
+Streaming log export.
+
+Rows are pulled from the service log buffers (hot lines and compressed cold
+blocks) one page at a time through ProcessManager.log_page, so an export
+holds at most one page per service no matter how large it is, and works the
+same against a local manager or the supervisor. Each service's rows are
+already in timestamp order; several services are interleaved with a k-way
+heap merge. Output is encoded and compressed chunk by chunk as the response
+is written:
+    txt    "2024-01-01 12:00:00.123 [service] line"
+    jsonl  {"ts", "time", "service", "id", "n", "line"} per line
+compressed with gzip (default), zstd (when the zstandard package is
+installed) or not at all.
+
+An export stops at the last line that existed when it began, so a chatty
+service cannot keep a download open forever.
+
+The same merge backs the merged log view (/api/logs/merged). Its cursor is
+"id:next line number,..." per service, so a page picks up exactly where the
+previous one stopped even as buffers keep growing or get pruned.
+"""
+
+import heapq
+import json
+import unicodedata
+import zlib
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator
+from urllib.parse import quote
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXPORT_PAGE = 2000  # lines fetched per service per round trip
+EXPORT_CHUNK = 64 * 1024  # encoded bytes collected before compressing/sending
+FORMATS = {"txt": ("text/plain", "log"), "jsonl": ("application/x-ndjson", "jsonl")}
+COMPRESSIONS = {"gzip": ("application/gzip", ".gz"), "none": (None, "")}
+if zstandard is not None:
+    COMPRESSIONS["zstd"] = ("application/zstd", ".zst")
+
+
+def parse_time(text) -> float | None:
+    """Epoch seconds or an ISO date/time (local time) -> epoch seconds; None if empty."""
+    if text is None or str(text).strip() == "":
+        return None
+    text = str(text).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        raise ValueError(f"Bad time: {text} (use epoch seconds or ISO 8601)")
+
+
+def service_rows(manager, id: str, since: float = None, until: float = None,
+                 start: int = 0, stop: int = None, page: int = EXPORT_PAGE) -> Iterator[tuple]:
+    """(ts, n, line) for one service, paged; stops at the line count seen on the first page."""
+    if stop is None:
+        stop = log_total(manager, id)
+    while True:
+        rows, start, done = manager.log_page(id, start, page, since, until, stop)
+        for n, ts, line in rows:
+            yield ts, n, line
+        if done or not rows:
+            return
+
+
+def log_total(manager, id: str) -> int:
+    """Absolute number of the next line the service will log."""
+    _, total, _ = manager.get_logs(id, 1 << 62)  # past the end: no lines, just the counters
+    return total
+
+
+def merge(streams: dict[str, Iterable[tuple]]) -> Iterator[tuple]:
+    """K-way merge of per-service (ts, n, line) streams -> (ts, service id, n, line) by time."""
+    def tagged(id, rows):
+        for ts, n, line in rows:
+            yield ts, id, n, line
+    return heapq.merge(*(tagged(id, rows) for id, rows in streams.items()), key=lambda row: row[0])
+
+
+def encode(rows: Iterable[tuple], fmt: str, names: dict[str, str], tagged: bool) -> Iterator[bytes]:
+    """Render (ts, id, n, line) rows in `fmt`, yielding ~EXPORT_CHUNK-sized byte chunks."""
+    parts, size = [], 0
+    for ts, id, n, line in rows:
+        time_text = datetime.fromtimestamp(ts).isoformat(sep=" ", timespec="milliseconds")
+        if fmt == "jsonl":
+            text = json.dumps({"ts": ts, "time": time_text, "service": names.get(id, id), "id": id,
+                               "n": n, "line": line}, ensure_ascii=False) + "\n"
+        elif tagged:
+            text = f"{time_text} [{names.get(id, id)}] {line}\n"
+        else:
+            text = f"{time_text} {line}\n"
+        data = text.encode("utf-8")
+        parts.append(data)
+        size += len(data)
+        if size >= EXPORT_CHUNK:
+            yield b"".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b"".join(parts)
+
+
+def compress(chunks: Iterable[bytes], method: str) -> Iterator[bytes]:
+    """Compress a byte stream incrementally ("gzip", "zstd" or "none")."""
+    if method == "none":
+        yield from chunks
+        return
+    if method == "zstd":
+        compressor = zstandard.ZstdCompressor().compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(manager, ids: list[str], names: dict[str, str], fmt: str = "txt", method: str = "gzip",
+           since: float = None, until: float = None) -> Iterator[bytes]:
+    """The full export stream for one or more services."""
+    streams = {id: service_rows(manager, id, since, until) for id in ids}
+    if len(ids) == 1:
+        rows = ((ts, ids[0], n, line) for ts, n, line in streams[ids[0]])
+    else:
+        rows = merge(streams)
+    return compress(encode(rows, fmt, names, tagged=len(ids) > 1), method)
+
+
+def filename(label: str, fmt: str, method: str) -> str:
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in label) or "logs"
+    return f"{safe}-{stamp}.{FORMATS[fmt][1]}{COMPRESSIONS[method][1]}"
+
+
+def content_disposition(name: str) -> str:
+    """Attachment header for `name`; headers are latin-1, so non-ASCII names (Chinese aliases)
+    get an ASCII fallback plus an RFC 5987 filename*, as Flask's send_file does."""
+    if name.isascii():
+        return f'attachment; filename="{name}"'
+    fallback = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(name, safe='')}"
+
+
+# ── Merged view ──
+def parse_cursor(text: str) -> dict[str, int]:
+    """"id:n,id:n" -> {id: n}."""
+    positions = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        id, sep, n = part.strip().rpartition(":")
+        if not sep or not n.isdigit():
+            raise ValueError(f"Bad cursor: {part}")
+        positions[id] = int(n)
+    return positions
+
+
+def format_cursor(positions: dict[str, int]) -> str:
+    return ",".join(f"{id}:{n}" for id, n in positions.items())
+
+
+def merged_page(manager, ids: list[str], positions: dict[str, int], since: float = None,
+                limit: int = 500) -> tuple[list[tuple], dict[str, int]]:
+    """Next `limit` rows in time order from each service's position -> (rows, new positions)."""
+    page = max(1, min(limit, EXPORT_PAGE))
+    if since is not None:
+        # Pin every service (even one with nothing to return yet) to its first line at or
+        # after `since`: later cursor pages carry no `since` and would start from line 0
+        positions = {id: manager.log_page(id, positions.get(id, 0), 0, since)[1] for id in ids}
+    streams = {id: service_rows(manager, id, since, start=positions.get(id, 0), page=page) for id in ids}
+    rows = list(islice(merge(streams), limit))
+    positions = {id: positions.get(id, 0) for id in ids}
+    for _, id, n, _ in rows:
+        positions[id] = n + 1
+    return rows, positions
+
+
+def merged_tail(manager, ids: list[str], count: int) -> tuple[list[tuple], dict[str, int]]:
+    """The newest `count` rows across services in time order, and the cursor after them."""
+    ends = {id: log_total(manager, id) for id in ids}
+    streams = {id: service_rows(manager, id, start=max(0, end - count), stop=end) for id, end in ends.items()}
+    return list(merge(streams))[-count:] if count > 0 else [], ends
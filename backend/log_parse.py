@@ -0,0 +1,215 @@
+"""
+Structured log parsing for service output.
+
+A service can opt into a parser with `log_format`:
+    ""               raw text only (default, no parsing cost)
+    "json"           JSON-lines: level/time/fields read from the object
+    "level"          "[WARN] ..." / "2024-01-01 12:00:00 ERROR ..." style prefixes
+    "regex:<expr>"   custom pattern with named groups (level, ts, any field)
+and `log_fields`, the field names to index.
+
+Parsed values live in a LogIndex next to the raw log buffer, addressed by
+absolute line number (log_pruned_count + position), so nothing has to be
+re-scanned to answer a query:
+- levels: one small int per line (deque, trimmed as the buffer evicts)
+- times: the line's own timestamp, if it had one
+- fields: field -> value -> ascending line numbers (inverted index)
+- level_counts: running totals per level since the index was created
+"""
+
+import heapq
+import json
+import re
+from collections import deque
+
+LEVELS = ("trace", "debug", "info", "warn", "error", "fatal")
+LEVEL_ALIASES = {
+    "trace": 0, "debug": 1, "dbg": 1, "info": 2, "information": 2, "notice": 2,
+    "warn": 3, "warning": 3, "error": 4, "err": 4, "fatal": 5, "critical": 5, "crit": 5, "panic": 5,
+}
+MAX_FIELD_VALUES = 1000  # distinct values indexed per field; beyond that new values are not indexed
+MAX_FIELD_LENGTH = 200  # longer values are not indexed
+
+_JSON_LEVEL_KEYS = ("level", "lvl", "severity", "levelname", "log.level")
+_JSON_TIME_KEYS = ("time", "ts", "timestamp", "@timestamp", "asctime")
+_LEVEL_PREFIX = re.compile(
+    r"^\s*(?P<ts>\d{4}-\d{2}-\d{2}[T ][\d:.,]+(?:Z|[+-]\d{2}:?\d{2})?)?\s*[-|]?\s*"
+    r"[\[<(]?(?P<level>trace|debug|dbg|info|notice|warn(?:ing)?|error|err|fatal|critical|crit|panic)[\]>):]?(?=\s|$)",
+    re.IGNORECASE)
+_FILTER = re.compile(r"^\s*([\w.@-]+)\s*(>=|<=|!=|=|>|<)\s*(.*?)\s*$")
+
+
+def level_code(name) -> int:
+    """LEVELS index for a level name or number (syslog/python numbers), -1 if unknown."""
+    if isinstance(name, (int, float)):
+        n = int(name)
+        if n >= 10:  # python logging: 10 debug .. 50 critical
+            return min(5, max(1, n // 10))
+        return {0: 5, 1: 5, 2: 5, 3: 4, 4: 3, 5: 2, 6: 2, 7: 1}.get(n, -1)  # syslog severities
+    return LEVEL_ALIASES.get(str(name).strip().lower(), -1)
+
+
+class LogParser:
+    def __init__(self, spec: str, fields: list[str] = ()):
+        self.spec = spec
+        self.fields = [f for f in fields if f]
+        self._regex = None
+        if spec.startswith("regex:"):
+            self._regex = re.compile(spec[len("regex:"):])
+        elif spec not in ("json", "level"):
+            raise ValueError(f"Unknown log format: {spec}")
+
+    def parse(self, line: str) -> tuple[int, str | None, dict[str, str]]:
+        """(level code, timestamp text, indexed fields) for one line."""
+        if self.spec == "json":
+            return self._parse_json(line)
+        m = (self._regex or _LEVEL_PREFIX).search(line)
+        if not m:
+            return -1, None, {}
+        groups = m.groupdict()
+        level = level_code(groups["level"]) if groups.get("level") else -1
+        fields = {f: groups[f] for f in self.fields if groups.get(f) is not None}
+        return level, groups.get("ts"), fields
+
+    def _parse_json(self, line: str) -> tuple[int, str | None, dict[str, str]]:
+        text = line.strip()
+        if not text.startswith("{"):
+            return -1, None, {}
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            return -1, None, {}
+        if not isinstance(obj, dict):
+            return -1, None, {}
+        level = next((level_code(obj[k]) for k in _JSON_LEVEL_KEYS if k in obj), -1)
+        ts = next((str(obj[k]) for k in _JSON_TIME_KEYS if k in obj), None)
+        fields = {}
+        for f in self.fields:
+            value = obj
+            for part in f.split("."):
+                value = value.get(part) if isinstance(value, dict) else None
+            if value is not None and not isinstance(value, (dict, list)):
+                fields[f] = str(value)
+        return level, ts, fields
+
+
+class LogIndex:
+    """Columnar side-structure for one service's log buffer (caller holds its log lock)."""
+
+    def __init__(self, parser: LogParser, base: int):
+        self.parser = parser
+        self.base = base  # absolute line number of levels[0]
+        self.levels: deque = deque()
+        self.times: deque = deque()
+        self.fields: dict[str, dict[str, deque]] = {f: {} for f in parser.fields}
+        self.level_counts = [0] * len(LEVELS)
+        self.unparsed = 0
+
+    def add(self, n: int, parsed: tuple[int, str | None, dict[str, str]]):
+        """Record line number `n` (must be the next line after the last one added)."""
+        level, ts, fields = parsed
+        if n != self.base + len(self.levels):  # a gap (shouldn't happen): restart alignment
+            self.levels.clear()
+            self.times.clear()
+            self.base = n
+        self.levels.append(level)
+        self.times.append(ts)
+        if level >= 0:
+            self.level_counts[level] += 1
+        else:
+            self.unparsed += 1
+        for name, value in fields.items():
+            if len(value) > MAX_FIELD_LENGTH:
+                continue
+            values = self.fields[name]
+            rows = values.get(value)
+            if rows is None:
+                if len(values) >= MAX_FIELD_VALUES:
+                    continue
+                rows = values[value] = deque()
+            rows.append(n)
+
+    def repeat(self):
+        """The last line was printed again (collapsed by the log buffer): count it."""
+        level = self.levels[-1] if self.levels else -1
+        if level >= 0:
+            self.level_counts[level] += 1
+        else:
+            self.unparsed += 1
+
+    def update_last(self, parsed: tuple[int, str | None, dict[str, str]]):
+        """The last line was redrawn in place (carriage return): re-point its level/time."""
+        if self.levels:
+            self.levels[-1] = parsed[0]
+            self.times[-1] = parsed[1]
+
+    def trim(self, floor: int, fields: bool = False):
+        """Forget lines below absolute number `floor` (evicted from the buffer)."""
+        while self.levels and self.base < floor:
+            self.levels.popleft()
+            self.times.popleft()
+            self.base += 1
+        if self.base < floor:
+            self.base = floor
+        if fields:
+            for values in self.fields.values():
+                for value in list(values):
+                    rows = values[value]
+                    while rows and rows[0] < floor:
+                        rows.popleft()
+                    if not rows:
+                        del values[value]
+
+    def level_at(self, n: int) -> int:
+        return self.levels[n - self.base]
+
+    def counts(self) -> dict[str, int]:
+        return {**dict(zip(LEVELS, self.level_counts)), "unparsed": self.unparsed}
+
+    def query(self, filters: list[tuple[str, str, str]], start: int) -> list[int]:
+        """Absolute line numbers >= start matching every filter, ascending."""
+        self.trim(self.base, fields=True)
+        start = max(start, self.base)
+        candidates = None  # from field indexes: exact matches are cheapest
+        level_tests = []
+        for name, op, value in filters:
+            if name == "level":
+                code = level_code(value)
+                if code < 0:
+                    raise ValueError(f"Unknown level: {value}")
+                level_tests.append((op, code))
+                continue
+            if name not in self.fields:
+                raise ValueError(f"Field not indexed: {name} (indexed: {', '.join(self.fields) or 'none'})")
+            if op == "=":
+                rows = [n for n in self.fields[name].get(value, ()) if n >= start]
+            elif op == "!=":
+                rows = list(heapq.merge(*(r for v, r in self.fields[name].items() if v != value)))
+                rows = [n for n in rows if n >= start]
+            else:
+                raise ValueError(f"Operator {op} not supported for field {name}")
+            candidates = rows if candidates is None else sorted(set(candidates).intersection(rows))
+        if candidates is None:
+            candidates = range(start, self.base + len(self.levels))
+        if not level_tests:
+            return list(candidates)
+        ops = {"=": int.__eq__, "!=": int.__ne__, ">=": int.__ge__, "<=": int.__le__, ">": int.__gt__, "<": int.__lt__}
+        out = []
+        for n in candidates:
+            level = self.levels[n - self.base]
+            if all(level >= 0 and ops[op](level, code) for op, code in level_tests):
+                out.append(n)
+        return out
+
+
+def parse_filters(text: str) -> list[tuple[str, str, str]]:
+    """'level>=warn, user=alice' -> [("level", ">=", "warn"), ("user", "=", "alice")]."""
+    filters = []
+    for part in re.split(r",|\s+and\s+", text or ""):
+        if not part.strip():
+            continue
+        m = _FILTER.match(part)
+        if not m:
+            raise ValueError(f"Bad filter: {part.strip()}")
+        filters.append((m.group(1), m.group(2), m.group(3).strip("\"'")))
+    return filters
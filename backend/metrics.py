@@ -0,0 +1,122 @@
+"""
+In-process metrics for cmd-patrol, served as Prometheus text format on /metrics.
+
+Counters and histograms are kept in plain dicts and updated in place on the
+hot paths (request hooks, MQ writes). Everything else comes from collectors:
+callables run at scrape time that read state the backend already holds in
+memory (service snapshots, log counters, MQ depth). A scrape never parses
+files or touches child processes.
+"""
+
+import bisect
+import threading
+from typing import Callable, Iterable
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (labels, value) rows for one metric family
+Samples = Iterable[tuple[dict[str, str], float]]
+# (name, type, help, samples) produced by a collector at scrape time
+Family = tuple[str, str, str, Samples]
+
+_lock = threading.Lock()
+_families: list["Counter | Histogram"] = []
+_collectors: list[Callable[[], Iterable[Family]]] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        _families.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        with _lock:
+            items = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        _families.append(self)
+
+    def observe(self, value: float, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            row = self._values.get(label_values)
+            if row is None:
+                row = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> list[str]:
+        with _lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for k, row in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, k, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labels, k, le)} {row[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, k)} {_number(row[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, k)} {row[-1]}")
+        return lines
+
+
+def collector(fn: Callable[[], Iterable[Family]]):
+    """Register a scrape-time collector returning (name, type, help, samples) families."""
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    lines = []
+    for family in list(_families):
+        lines += family.render()
+    for fn in list(_collectors):
+        try:
+            families = [(name, kind, help, list(rows)) for name, kind, help, rows in fn()]
+        except Exception as e:
+            lines.append(f"# collector {fn.__name__} failed: {_escape(e)}")
+            continue
+        for name, kind, help, rows in families:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in rows:
+                lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return "\n".join(lines) + "\n"
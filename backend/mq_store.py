@@ -26,24 +26,76 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any, Optional
 
+from persist import atomic_write_text
+from profiling import span
+
 MQ_FILE = Path(__file__).parent / "mq.json"
 _lock = threading.Lock()
+_version = 0  # bumped on every write, lets streams detect changes cheaply
+_published = 0  # messages published through this process (metrics)
+# (status, source) -> count, recomputed whenever the file is read or written;
+# valid while the file's (mtime_ns, size) still matches _depth_sig
+_depth: dict[tuple[str, str], int] = {}
+_depth_sig = None
 
 
-def _load() -> list[dict]:
-    if not MQ_FILE.exists():
-        return []
+def _signature():
     try:
-        return json.loads(MQ_FILE.read_text(encoding="utf-8"))
-    except:
-        return []
+        st = MQ_FILE.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _count(messages: list[dict]):
+    global _depth, _depth_sig
+    depth: dict[tuple[str, str], int] = {}
+    for m in messages:
+        key = (m.get("status", ""), m.get("source", ""))
+        depth[key] = depth.get(key, 0) + 1
+    _depth = depth
+    _depth_sig = _signature()
 
 
+@span("mq.load")
+def _load() -> list[dict]:
+    messages = []
+    if MQ_FILE.exists():
+        try:
+            messages = json.loads(MQ_FILE.read_text(encoding="utf-8"))
+        except:
+            messages = []
+    _count(messages)
+    return messages
+
+
+@span("mq.save")
 def _save(messages: list[dict]):
-    MQ_FILE.write_text(json.dumps(messages, indent=2, ensure_ascii=False), encoding="utf-8")
+    global _version
+    atomic_write_text(MQ_FILE, json.dumps(messages, indent=2, ensure_ascii=False))
+    _version += 1
+    _count(messages)
+
+
+def depth() -> dict[tuple[str, str], int]:
+    """Message counts by (status, source); re-reads the file only if it changed."""
+    with _lock:
+        if _depth_sig is None or _depth_sig != _signature():
+            _load()
+        return dict(_depth)
+
+
+def published_total() -> int:
+    return _published
+
+
+def version() -> int:
+    """Change counter for the queue (in-process writes only)."""
+    return _version
 
 
 def publish(source: str, type: str, title: str, detail: str = "", meta: dict = None) -> dict:
+    global _published
     msg = {
         "id": str(uuid.uuid4()),
         "source": source,
@@ -60,6 +112,7 @@ def publish(source: str, type: str, title: str, detail: str = "", meta: dict = N
         messages = _load()
         messages.append(msg)
         _save(messages)
+        _published += 1
     return msg
 
 
@@ -166,11 +219,12 @@ def batch_ack_new() -> int:
 
 
 def stats() -> dict:
-    with _lock:
-        messages = _load()
+    counts = {"new": 0, "ack": 0, "done": 0}
+    for (status, _), n in depth().items():
+        counts[status] = counts.get(status, 0) + n
     return {
-        "total": len(messages),
-        "new": sum(1 for m in messages if m["status"] == "new"),
-        "ack": sum(1 for m in messages if m["status"] == "ack"),
-        "done": sum(1 for m in messages if m["status"] == "done"),
+        "total": sum(counts.values()),
+        "new": counts["new"],
+        "ack": counts["ack"],
+        "done": counts["done"],
     }
@@ -0,0 +1,119 @@
+"""
+File persistence helpers for cmd-patrol.
+
+- atomic_write_text / atomic_writer: temp file + fsync + rename, so a crash
+  mid-write never leaves a truncated file behind.
+- DebouncedWriter: coalesces many mark_dirty() calls into a single background
+  flush, and skips the write entirely if the serialized content is unchanged.
+  A background flush that fails (sharing violation, disk full) stays pending
+  and is retried with backoff up to RETRY_MAX_DELAY.
+  It also remembers what it last wrote, so an edit made by someone else can be
+  told apart from our own save (external_change / adopt).
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+
+from profiling import span
+
+RETRY_MAX_DELAY = 30.0  # seconds, cap for the backoff between failed background flushes
+
+
+@contextmanager
+def atomic_writer(path: Path) -> Iterator[BinaryIO]:
+    """Binary file that replaces `path` atomically when the block exits cleanly."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            # mkstemp creates 0600; keep the replaced file's permissions
+            shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_text(path: Path, text: str, encoding: str = "utf-8"):
+    """Write text to path atomically (same-directory temp file + os.replace)."""
+    with atomic_writer(path) as f:
+        f.write(text.encode(encoding))
+
+
+class DebouncedWriter:
+    def __init__(self, path: Path, serialize: Callable[[], str], delay: float = 0.5):
+        self.path = Path(path)
+        self.delay = delay
+        self._serialize = serialize
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer: threading.Timer = None
+        self._retry_delay = 0.0  # backoff after a failed background flush, 0 when healthy
+        try:
+            self._last = self.path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            self._last = None
+
+    def mark_dirty(self):
+        """Schedule a flush in `delay` seconds; repeated calls coalesce."""
+        self._arm(self.delay)
+
+    def _arm(self, delay: float):
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(delay, self._background_flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _background_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            # Still dirty: retry rather than wait for the next unrelated change
+            self._retry_delay = min(max(self.delay, self._retry_delay * 2), RETRY_MAX_DELAY)
+            print(f"[persist] writing {self.path.name} failed: {e}; retrying in {self._retry_delay:g}s", flush=True)
+            self._arm(self._retry_delay)
+        else:
+            self._retry_delay = 0.0
+
+    def flush(self) -> bool:
+        """Write now if the serialized state differs from disk. Returns True if written."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        with self._write_lock, span(f"persist.{self.path.stem}"):
+            text = self._serialize()
+            if text == self._last:
+                return False
+            atomic_write_text(self.path, text)
+            self._last = text
+            return True
+
+    def external_change(self) -> tuple[str | None, str] | None:
+        """(last text we wrote, current text) if another writer changed the file, else None."""
+        with self._write_lock:
+            try:
+                text = self.path.read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError):
+                return None
+            if text == self._last:
+                return None
+            return self._last, text
+
+    def adopt(self, text: str):
+        """Accept externally written text as the new baseline for change detection."""
+        with self._write_lock:
+            self._last = text
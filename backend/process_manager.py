@@ -2,36 +2,92 @@ import subprocess
 import threading
 import time
 import uuid
+import atexit
 import json
 import os
 import re
+import shlex
+import signal
 import ctypes
 import ctypes.wintypes
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+import crash_store
+import dir_browser
+import file_watch
+import health_probe
+import log_parse
+import mq_store
+from log_buffer import LogBuffer
+import scheduler
+import script_meta
+from persist import DebouncedWriter
+import profiling
+from profiling import span
+
 ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*[a-zA-Z]|\x1b\[\?[0-9;]*[a-zA-Z]')
 
 SERVICES_FILE = Path(__file__).parent / "services.json"
-MAX_LOG_LINES = 5000
+SAVE_DEBOUNCE = 0.5  # seconds, coalesce registry writes
+MAX_LOG_LINES = 5000  # hot (uncompressed) lines per service
+LOG_COLD_LINES = 50000  # older lines kept zlib-compressed per service; 0 disables
 LOG_MAX_AGE = 3600  # seconds, prune logs older than 1 hour
+HEALTH_CHECK_INTERVAL = 2.0  # seconds, min gap between list-triggered sweeps
+MAX_TOMBSTONES = 1000  # removed-service ids remembered for delta queries
+RESOURCE_SAMPLE_INTERVAL = 5.0  # seconds between CPU/memory samples of running services
+RESOURCE_SAMPLES = 12  # samples kept per service (attached to crash records)
+CRASH_LOG_LINES = 50  # final log lines kept in a crash record
+CRASH_LOG_WAIT = 2.0  # seconds to let the reader drain the pipe before snapshotting
+CRASH_ON_CLEAN_EXIT = False  # also record services that exit with code 0 on their own
+RUN_HISTORY = 50  # runs remembered per scheduled service (persisted)
+MAX_RUN_LOG_LINES = 100000  # cap for reading the log of a run still in progress
+DISCOVER_WORKERS = 8  # parallel root scans / metadata extraction
+DISCOVER_MAX = 5000  # scripts returned per root
+# User-editable fields (and their defaults) picked up from external services.json edits
+RELOAD_FIELDS = {"name": "", "alias": "", "group": "", "script_path": "", "cwd": "",
+                 "command": "", "port": "", "config_file": "", "pinned": False,
+                 "log_format": "", "log_fields": [], "probes": [], "health_restart": False,
+                 "schedule": "", "max_runtime": 0}
+# Fields a running service was launched with: editing one restarts it so it runs what the UI shows
+LAUNCH_FIELDS = ("script_path", "cwd", "command")
+
+_IS_WINDOWS = os.name == "nt"
 
-_kernel32 = ctypes.windll.kernel32
-# Ensure 64-bit HANDLE return types on x64 Windows
-_kernel32.OpenProcess.restype = ctypes.wintypes.HANDLE
-_kernel32.CreateJobObjectW.restype = ctypes.wintypes.HANDLE
-_kernel32.AssignProcessToJobObject.argtypes = [ctypes.wintypes.HANDLE, ctypes.wintypes.HANDLE]
-_kernel32.AssignProcessToJobObject.restype = ctypes.wintypes.BOOL
-_kernel32.TerminateJobObject.argtypes = [ctypes.wintypes.HANDLE, ctypes.wintypes.UINT]
-_kernel32.TerminateJobObject.restype = ctypes.wintypes.BOOL
-_kernel32.CloseHandle.argtypes = [ctypes.wintypes.HANDLE]
-_kernel32.SetInformationJobObject.argtypes = [ctypes.wintypes.HANDLE, ctypes.c_int, ctypes.c_void_p, ctypes.wintypes.DWORD]
+if _IS_WINDOWS:
+    _kernel32 = ctypes.windll.kernel32
+    # Ensure 64-bit HANDLE return types on x64 Windows
+    _kernel32.OpenProcess.restype = ctypes.wintypes.HANDLE
+    _kernel32.CreateJobObjectW.restype = ctypes.wintypes.HANDLE
+    _kernel32.AssignProcessToJobObject.argtypes = [ctypes.wintypes.HANDLE, ctypes.wintypes.HANDLE]
+    _kernel32.AssignProcessToJobObject.restype = ctypes.wintypes.BOOL
+    _kernel32.TerminateJobObject.argtypes = [ctypes.wintypes.HANDLE, ctypes.wintypes.UINT]
+    _kernel32.TerminateJobObject.restype = ctypes.wintypes.BOOL
+    _kernel32.CloseHandle.argtypes = [ctypes.wintypes.HANDLE]
+    _kernel32.SetInformationJobObject.argtypes = [ctypes.wintypes.HANDLE, ctypes.c_int, ctypes.c_void_p, ctypes.wintypes.DWORD]
+else:
+    _kernel32 = None
 
 
 def _pid_alive(pid) -> bool:
-    """Check if a PID is still alive at the OS level (Windows)."""
+    """Check if a PID is still alive at the OS level."""
     if pid is None:
         return False
+    if not _IS_WINDOWS:
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, OSError, ValueError):
+            return isinstance(pid, int) or str(pid).isdigit()
+        try:
+            # Unreaped zombies still accept signal 0
+            with open(f"/proc/{int(pid)}/stat") as f:
+                return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+        except OSError:
+            return True
     try:
         PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
         STILL_ACTIVE = 259
@@ -75,8 +131,16 @@ class _JOBOBJECT_EXTENDED_LIMIT_INFORMATION(ctypes.Structure):
         ('PeakJobMemoryUsed', ctypes.c_size_t),
     ]
 
+class _PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+    _fields_ = [('cb', ctypes.c_uint32), ('PageFaultCount', ctypes.c_uint32)] + [
+        (n, ctypes.c_size_t) for n in (
+            'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+            'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
 def _create_job_for_process(proc_handle):
     """Create a Job Object with KILL_ON_JOB_CLOSE and assign the process to it."""
+    if not _IS_WINDOWS:
+        return None
     try:
         job = _kernel32.CreateJobObjectW(None, None)
         if not job:
@@ -92,10 +156,58 @@ def _create_job_for_process(proc_handle):
         return None
 
 
+def _resource_usage(pids) -> tuple[float, int] | None:
+    """Total (CPU seconds, resident bytes) of the given PIDs, None if none could be read."""
+    cpu, rss, seen = 0.0, 0, False
+    for pid in pids:
+        if not _IS_WINDOWS:
+            try:
+                with open(f"/proc/{int(pid)}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except (OSError, IndexError, ValueError):
+                continue
+            # utime/stime (fields 14/15) in clock ticks, rss (field 24) in pages
+            cpu += (int(fields[11]) + int(fields[12])) / _CLK_TCK
+            rss += int(fields[21]) * _PAGE_SIZE
+            seen = True
+            continue
+        try:
+            handle = _kernel32.OpenProcess(0x1000, False, int(pid))  # PROCESS_QUERY_LIMITED_INFORMATION
+            if not handle:
+                continue
+            try:
+                times = [ctypes.c_ulonglong() for _ in range(4)]  # creation, exit, kernel, user
+                if _kernel32.GetProcessTimes(handle, *(ctypes.byref(t) for t in times)):
+                    cpu += (times[2].value + times[3].value) / 1e7  # 100 ns units
+                    seen = True
+                counters = _PROCESS_MEMORY_COUNTERS()
+                counters.cb = ctypes.sizeof(counters)
+                if _kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                    rss += counters.WorkingSetSize
+            finally:
+                _kernel32.CloseHandle(handle)
+        except Exception:
+            continue
+    return (cpu, rss) if seen else None
+
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
 def _kill_pid_tree(pid):
     """Kill a PID and all its descendants using taskkill /T."""
     if pid is None:
         return
+    if not _IS_WINDOWS:
+        # Services run in their own session, so the process group id == pid
+        for kill in (os.killpg, os.kill):
+            try:
+                kill(int(pid), signal.SIGKILL)
+                return
+            except OSError:
+                continue
+        return
     try:
         subprocess.run(["taskkill", "/PID", str(int(pid)), "/F", "/T"],
                        capture_output=True, timeout=10)
@@ -107,17 +219,51 @@ def _kill_pids(pids):
     """Kill a list of individual PIDs."""
     for pid in (pids or []):
         try:
-            if _pid_alive(pid):
+            if not _pid_alive(pid):
+                continue
+            if not _IS_WINDOWS:
+                os.kill(int(pid), signal.SIGKILL)
+            else:
                 subprocess.run(["taskkill", "/PID", str(int(pid)), "/F"],
                                capture_output=True, timeout=5)
         except Exception:
             pass
 
 
+def _parent_map() -> dict[int, list[int]]:
+    """POSIX: parent PID -> child PIDs, from one pass over /proc."""
+    tree: dict[int, list[int]] = {}
+    try:
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            tree.setdefault(ppid, []).append(int(entry.name))
+    except OSError:
+        pass
+    return tree
+
+
+def _descendants(pid: int, tree: dict[int, list[int]]) -> list[int]:
+    """`pid` and everything below it in a _parent_map() snapshot."""
+    found, stack = [], [int(pid)]
+    while stack:
+        p = stack.pop()
+        found.append(p)
+        stack.extend(tree.get(p, ()))
+    return found
+
+
 def _find_children_by_parent(parent_pid):
     """Fast child PID lookup using CreateToolhelp32Snapshot (instant, no subprocess)."""
     if parent_pid is None:
         return []
+    if not _IS_WINDOWS:
+        return _parent_map().get(int(parent_pid), [])
     TH32CS_SNAPPROCESS = 0x2
     class PROCESSENTRY32(ctypes.Structure):
         _fields_ = [
@@ -153,6 +299,12 @@ def _find_children_by_parent(parent_pid):
 
 def _terminate_pid(pid):
     """Instantly terminate a process by PID via kernel32 (no subprocess)."""
+    if not _IS_WINDOWS:
+        try:
+            os.kill(int(pid), signal.SIGKILL)
+        except (OSError, ValueError):
+            pass
+        return
     try:
         PROCESS_TERMINATE = 0x0001
         h = _kernel32.OpenProcess(PROCESS_TERMINATE, False, int(pid))
@@ -165,36 +317,33 @@ def _terminate_pid(pid):
 
 def _kill_child_conhosts(pid):
     """Kill conhost.exe child processes of the given PID (instant, pure ctypes)."""
+    if not _IS_WINDOWS:
+        return
     for child_pid in _find_children_by_parent(pid):
         _terminate_pid(child_pid)
 
 
 def _extract_port(script_path: str) -> str:
-    try:
-        for enc in ('utf-8', 'gbk', 'latin-1'):
-            try:
-                text = Path(script_path).read_text(encoding=enc)
-                break
-            except (UnicodeDecodeError, LookupError):
-                continue
-        else:
-            return ""
-        m = re.search(r'(?:localhost|127\.0\.0\.1|0\.0\.0\.0)[:/](\d{2,5})', text)
-        if m:
-            return m.group(1)
-        m = re.search(r'[Pp][Oo][Rr][Tt][=\s:]+?(\d{2,5})', text)
-        if m:
-            return m.group(1)
-        m = re.search(r'http\.server\s+(\d{2,5})', text)
-        if m:
-            return m.group(1)
-    except:
-        pass
-    return ""
+    """Detected port for a script, served from the mtime-keyed metadata cache."""
+    return script_meta.get_meta(script_path).get("port", "")
+
+
+# Allowed status transitions. Every change to status/pid/process happens under
+# the service's own lock via _transition(); anything not listed is rejected.
+TRANSITIONS = {
+    "stopped": {"starting"},
+    "error": {"starting", "stopped"},
+    "starting": {"running", "error"},
+    "running": {"stopping", "stopped"},
+    "stopping": {"stopped"},
+    "orphan": {"stopping", "stopped"},
+}
 
 
 class ManagedProcess:
-    def __init__(self, id: str, name: str, script_path: str, cwd: str, command: str, port: str = "", config_file: str = "", pinned: bool = False, alias: str = "", group: str = ""):
+    def __init__(self, id: str, name: str, script_path: str, cwd: str, command: str, port: str = "", config_file: str = "", pinned: bool = False, alias: str = "", group: str = "", log_format: str = "", log_fields: list = None,
+                 probes: list = None, health_restart: bool = False, schedule: str = "",
+                 max_runtime: float = 0, runs: list = None):
         self.id = id
         self.name = name
         self.alias = alias
@@ -205,53 +354,326 @@ class ManagedProcess:
         self.port = port
         self.config_file = config_file
         self.pinned = pinned
+        self.log_format = log_format  # "" | "json" | "level" | "regex:<expr>", see log_parse
+        self.log_fields = list(log_fields or [])  # parsed fields to index for filtered queries
+        self.probes = list(probes or [])  # active health probe definitions, see health_probe
+        self.health_restart = health_restart  # restart when the probes report unhealthy
+        self.health: str = None  # "healthy" | "degraded" | "unhealthy" | None (no probes / not running)
+        self.schedule = schedule  # cron / "every 10m": run as a scheduled one-shot, see scheduler
+        self.max_runtime = max_runtime  # seconds before a run is stopped, 0 = no limit
+        self.next_run_at: float = None  # set by the scheduler
+        self.runs: deque = deque(runs or [], maxlen=RUN_HISTORY)  # finished/skipped runs, oldest first
+        self._run: dict = None  # the run in progress
+        self.log_session = uuid.uuid4().hex[:8]  # log line numbers are only valid within one session
         self.process: subprocess.Popen = None
         self.job_handle = None
         self.child_pids: list = []  # snapshot of descendant PIDs for orphan cleanup
-        self.log_buffer: list = []  # list of (float_timestamp, str_line)
-        self.log_pruned_count: int = 0  # total lines pruned, for offset tracking
-        self.subscribers: list = []
+        self.log_buffer = LogBuffer(MAX_LOG_LINES, LOG_COLD_LINES)
+        self.log_lines_total = 0  # lines ingested since registration (metrics)
+        self.log_bytes_total = 0  # raw bytes ingested since registration (metrics)
+        self.subscribers: list = []  # copy-on-write, replaced under _lock
         self.status = "stopped"
         self.pid = None
         self.started_at = None
         self.exit_code = None
         self.restart_count = 0
+        self._reader: threading.Thread = None  # stdout reader of the current run
+        self._lock = threading.RLock()  # guards lifecycle state transitions
+        self._log_lock = threading.Lock()  # guards log_buffer / _log_index
+        self._cr_pending: bytes = None  # current frame of a "\r"-redrawn line (progress bars)
+        self.resource_samples: deque = deque(maxlen=RESOURCE_SAMPLES)  # current run only
+        self._run_first_line = 0  # absolute log line number where the current run began
+        self._log_index: log_parse.LogIndex = None
+        self._configure_log_parser()
+        self._state = ()
+        self.version = 0  # manager state version of this service's last change
+        self._on_change = None  # set by ProcessManager, returns a new version
+        self._on_crash = None  # set by ProcessManager, receives (proc, crash record)
+        self._on_run_end = None  # set by ProcessManager, persists the run history
+        self._publish()
 
-    def start(self):
-        if self.process and self.process.poll() is None:
-            return False
-        
-        try:
-            env = os.environ.copy()
-            env["PYTHONIOENCODING"] = "utf-8"
-            self.process = subprocess.Popen(
-                self.command,
-                cwd=self.cwd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                shell=False,
-                text=False,
-                bufsize=0,
-                env=env,
-                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW,
-            )
-            # Assign to Job Object so all descendants are tracked and killable
-            self.job_handle = _create_job_for_process(self.process._handle)
-            self.status = "running"
-            self.pid = self.process.pid
-            self.child_pids = []
-            self.started_at = datetime.now().isoformat()
-            self.exit_code = None
-            threading.Thread(target=self._read_output, daemon=True).start()
-            return True
-        except Exception as e:
-            self.status = "error"
-            self.log_buffer.append(f"[cmd-patrol] Failed to start: {e}\n")
+    @property
+    def log_pruned_count(self) -> int:
+        """Lines dropped from memory for good (offsets below this are gone)."""
+        return self.log_buffer.pruned
+
+    def _publish(self):
+        """Publish an immutable snapshot of the runtime state for lock-free readers."""
+        state = (self.status, self.pid, self.started_at, self.exit_code, self.restart_count)
+        if state == self._state:
+            return
+        self._state = state
+        if self._on_change:
+            self.version = self._on_change()
+
+    def update(self, **fields):
+        """Change user-editable fields (port, alias, group...) and bump the version."""
+        with self._lock:
+            for k, v in fields.items():
+                setattr(self, k, v)
+            if "log_format" in fields or "log_fields" in fields:
+                self._configure_log_parser()
+            if self._on_change:
+                self.version = self._on_change()
+
+    def _configure_log_parser(self):
+        """(Re)build the structured log index for log_format, backfilled from the buffer."""
+        parser = None
+        if self.log_format:
+            try:
+                parser = log_parse.LogParser(self.log_format, self.log_fields)
+            except (ValueError, re.error) as e:
+                print(f"[logs] {self.name}: bad log_format {self.log_format!r}: {e}", flush=True)
+        with self._log_lock:
+            if parser is None:
+                self._log_index = None
+                return
+            index = log_parse.LogIndex(parser, self.log_pruned_count)
+            for n, entry in self.log_buffer.entries():
+                index.add(n, parser.parse(entry[1]))
+            self._log_index = index
+
+    def _transition(self, status: str, **fields) -> bool:
+        """Move to `status` if allowed, updating `fields` atomically. Caller holds _lock."""
+        if status != self.status and status not in TRANSITIONS.get(self.status, ()):
             return False
+        previous = self.status
+        for k, v in fields.items():
+            setattr(self, k, v)
+        self.status = status
+        self._publish()
+        if previous == "running" and status == "stopped":
+            # Not via stop() (that goes through "stopping"): the service exited by itself
+            self._exited()
+        if status in ("stopped", "error") and self._run is not None:
+            self._end_run()
+        return True
+
+    # ── Runs (scheduled services) ──
+    def _next_run_number(self) -> int:
+        return max([r["run"] for r in self.runs] + [self._run["run"] if self._run else 0]) + 1
+
+    def _begin_run(self, trigger: str):
+        """Open a run record for this start. Caller holds _lock."""
+        self._run = {
+            "run": self._next_run_number(),
+            "trigger": trigger,
+            "started_at": datetime.now().isoformat(),
+            "log_session": self.log_session,
+            "first_line": self._run_first_line,
+        }
+
+    def _end_run(self):
+        run, self._run = self._run, None
+        ended = datetime.now()
+        run.update(
+            ended_at=ended.isoformat(),
+            duration=round((ended - datetime.fromisoformat(run["started_at"])).total_seconds(), 3),
+            exit_code=self.exit_code if self.status == "stopped" else None,
+        )
+        self.runs.append(run)
+        if self._on_run_end:
+            self._on_run_end()
+
+    def skip_run(self, trigger: str):
+        """Record a firing skipped because the previous run is still going."""
+        with self._lock:
+            self.runs.append({"run": self._next_run_number(), "trigger": trigger,
+                              "started_at": datetime.now().isoformat(), "skipped": True})
+            self.note(f"{trigger} run skipped: previous run still going")
+        if self._on_run_end:
+            self._on_run_end()
+
+    def time_out(self):
+        """Mark the current run as over max_runtime (the scheduler then stops it)."""
+        with self._lock:
+            if self._run is not None:
+                self._run["timed_out"] = True
+        self.note(f"max runtime ({self.max_runtime:g}s) exceeded, stopping")
+
+    def note(self, text: str):
+        """Add a "[cmd-patrol] ..." line to the service log."""
+        with self._log_lock:
+            self.log_buffer.seal()
+        self._emit_line(f"[cmd-patrol] {text}".encode("utf-8"))
+
+    def run_history(self) -> list[dict]:
+        """Runs newest first, the one in progress (if any) marked running."""
+        with self._lock:
+            runs = list(self.runs)
+            if self._run is not None:
+                runs.append({**self._run, "running": True})
+        return sorted(runs, key=lambda r: r["run"], reverse=True)
+
+    def run_logs(self, number: int) -> tuple[list[str], bool] | None:
+        """Log lines of one run and whether they are complete; None for an unknown run."""
+        with self._lock:
+            runs = [r for r in [*self.runs, self._run] if r and not r.get("skipped")]
+        run = next((r for r in runs if r["run"] == number), None)
+        if run is None:
+            return None
+        if run.get("log_session") != self.log_session:
+            return [], False  # logged before the backend restarted
+        later = [r for r in runs if r["run"] > number and r.get("log_session") == self.log_session]
+        end = min(later, key=lambda r: r["run"])["first_line"] if later else None
+        first = run["first_line"]
+        rows, _, _ = self.log_page(first, (end - first) if end is not None else MAX_RUN_LOG_LINES, stop=end)
+        return [line for _, _, line in rows], first >= self.log_pruned_count
+
+    def _exited(self):
+        """Snapshot what is known at exit and record a crash once the log is drained. Caller holds _lock."""
+        if self.exit_code == 0 and not CRASH_ON_CLEAN_EXIT:
+            return
+        context = {
+            "exit_code": self.exit_code,
+            "started_at": self.started_at,
+            "restart_count": self.restart_count,
+            "resources": list(self.resource_samples),
+            "ts": time.time(),
+            # This run's log span, fixed now: a start within CRASH_LOG_WAIT moves _run_first_line
+            "process": self.process,
+            "first_line": self._run_first_line,
+        }
+        with self._log_lock:
+            context["end_line"] = self.log_buffer.total
+        threading.Thread(target=self._record_crash, args=(context, self._reader), daemon=True,
+                         name=f"crash-{self.alias or self.name}").start()
+
+    def _record_crash(self, context: dict, reader: threading.Thread):
+        if reader is not None and reader is not threading.current_thread():
+            reader.join(CRASH_LOG_WAIT)  # the last lines may still be in the pipe
+        with self._lock, self._log_lock:
+            buf = self.log_buffer
+            # Lines drained since the exit belong to this run unless a new one has started
+            end = buf.total if self.process is context["process"] else context["end_line"]
+            start = max(context["first_line"], end - CRASH_LOG_LINES, buf.pruned)
+            lines = buf.read(start)[:max(0, end - start)]
+        rc = context["exit_code"]
+        sig = None
+        if not _IS_WINDOWS and isinstance(rc, int) and rc < 0:
+            try:
+                sig = signal.Signals(-rc).name
+            except ValueError:
+                sig = f"signal {-rc}"
+        runtime = None
+        if context["started_at"]:
+            runtime = round(context["ts"] - datetime.fromisoformat(context["started_at"]).timestamp(), 3)
+        crash = {
+            "id": str(uuid.uuid4()),
+            "service_id": self.id,
+            "service": self.alias or self.name,
+            "exit_code": rc,
+            "signal": sig,
+            "ts": context["ts"],
+            "started_at": context["started_at"],
+            "ended_at": datetime.fromtimestamp(context["ts"]).isoformat(),
+            "runtime": runtime,
+            "restart_count": context["restart_count"],
+            "last_lines": lines,
+            "resources": context["resources"],
+            "signature": crash_store.signature(rc, lines),
+        }
+        callback = self._on_crash
+        if callback:
+            callback(self, crash)
+
+    def sample_resources(self, tree: dict = None):
+        """Append a CPU/memory sample for the running process tree (called by the sampler).
+
+        `tree` is a _parent_map() snapshot; without one the last child PID snapshot is used.
+        """
+        status, pid, _, _, _ = self._state
+        if status != "running" or not pid:
+            return
+        usage = _resource_usage(_descendants(pid, tree) if tree is not None else [pid, *self.child_pids])
+        if usage is None:
+            return
+        cpu, rss = usage
+        now = time.time()
+        prev = self.resource_samples[-1] if self.resource_samples else None
+        percent = None
+        if prev and now > prev["ts"] and cpu >= prev["cpu_seconds"]:
+            percent = round((cpu - prev["cpu_seconds"]) / (now - prev["ts"]) * 100, 1)
+        self.resource_samples.append({"ts": round(now, 3), "cpu_seconds": round(cpu, 3),
+                                      "cpu_percent": percent, "rss_bytes": rss})
 
-    def _read_output(self):
+    def _reconcile(self):
+        """Sync status with the OS view of our child process. Caller holds _lock."""
+        if self.process is None:
+            return
+        rc = self.process.poll()
+        if rc is None:
+            if self.status == "running" and self.pid and not _pid_alive(self.pid):
+                self._force_cleanup()
+        elif self.status == "running":
+            self._transition("stopped", exit_code=rc, pid=None)
+
+    def add_subscriber(self, callback):
+        with self._lock:
+            self.subscribers = self.subscribers + [callback]
+
+    def remove_subscriber(self, callback):
+        with self._lock:
+            self.subscribers = [cb for cb in self.subscribers if cb is not callback]
+
+    def start(self, trigger: str = "manual"):
+        with self._lock:
+            self._reconcile()
+            if self.process and self.process.poll() is None:
+                return False
+            if not self._transition("starting"):
+                return False
+            self._cr_pending = None
+            self.resource_samples.clear()
+            with self._log_lock:
+                self.log_buffer.seal()  # the previous run's last line is final
+                self._run_first_line = self.log_buffer.total
+            if self.schedule:
+                self._begin_run(trigger)
+            try:
+                env = os.environ.copy()
+                env["PYTHONIOENCODING"] = "utf-8"
+                if _IS_WINDOWS:
+                    platform_kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW}
+                    args = self.command
+                else:
+                    platform_kwargs = {"start_new_session": True}
+                    args = shlex.split(self.command)
+                process = subprocess.Popen(
+                    args,
+                    cwd=self.cwd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    shell=False,
+                    text=False,
+                    bufsize=0,
+                    env=env,
+                    **platform_kwargs,
+                )
+                # Assign to Job Object so all descendants are tracked and killable
+                self.job_handle = _create_job_for_process(process._handle) if _IS_WINDOWS else None
+                self._transition(
+                    "running",
+                    process=process,
+                    pid=process.pid,
+                    child_pids=[],
+                    started_at=datetime.now().isoformat(),
+                    exit_code=None,
+                )
+                self._reader = threading.Thread(target=self._read_output, args=(process,), daemon=True,
+                                                name=f"reader-{self.alias or self.name}")
+                self._reader.start()
+                return True
+            except Exception as e:
+                if self._run is not None:
+                    self._run["error"] = str(e)
+                self._transition("error")
+                self.note(f"Failed to start: {e}")
+                return False
+
+    def _read_output(self, process: subprocess.Popen):
         try:
-            fd = self.process.stdout.fileno()
+            fd = process.stdout.fileno()
             buf = b''
             while True:
                 try:
@@ -259,36 +681,64 @@ class ManagedProcess:
                 except OSError:
                     break
                 if not chunk:
-                    if buf:
-                        self._emit_line(buf)
+                    if buf or self._cr_pending is not None:
+                        self._emit_line(self._overlay(buf))
                     break
                 buf += chunk
-                while True:
-                    idx_n = buf.find(b'\n')
-                    idx_r = buf.find(b'\r')
-                    if idx_n == -1 and idx_r == -1:
-                        break
-                    if idx_n == -1:
-                        idx = idx_r
-                    elif idx_r == -1:
-                        idx = idx_n
-                    else:
-                        idx = min(idx_n, idx_r)
-                    line = buf[:idx]
-                    if idx == idx_r and idx + 1 < len(buf) and buf[idx + 1:idx + 2] == b'\n':
-                        buf = buf[idx + 2:]
-                    else:
-                        buf = buf[idx + 1:]
-                    if line:
-                        self._emit_line(line)
+                with span("log.emit_batch"):
+                    buf = self._emit_lines(buf)
         except:
             pass
         finally:
-            self.exit_code = self.process.poll()
-            self.status = "stopped"
-            self.pid = None
+            try:
+                rc = process.wait(timeout=1)
+            except Exception:
+                rc = process.poll()
+            with self._lock:
+                # A stale reader from a previous run must not clobber a newer process
+                if self.process is process:
+                    if not self._transition("stopped", exit_code=rc, pid=None):
+                        self.exit_code = rc
+                        self._publish()
 
-    def _emit_line(self, raw: bytes):
+    def _overlay(self, data: bytes) -> bytes:
+        """Apply "\r"-separated frames over the pending redrawn line, terminal style."""
+        result = self._cr_pending or b''
+        for frame in data.split(b'\r'):
+            result = frame + result[len(frame):]
+        self._cr_pending = None
+        return result
+
+    def _emit_lines(self, buf: bytes) -> bytes:
+        """Emit every complete line in buf; returns the unterminated remainder.
+
+        "\r\n" ends a line like "\n". A bare "\r" returns to column 0: the
+        frame before it is shown as an open line that later frames redraw,
+        until a "\n" settles it.
+        """
+        while True:
+            idx = buf.find(b'\n')
+            if idx == -1:
+                break
+            line = buf[:idx]
+            buf = buf[idx + 1:]
+            if line.endswith(b'\r'):
+                line = line[:-1]
+            redrawn = self._cr_pending is not None
+            if redrawn or b'\r' in line:
+                line = self._overlay(line)
+            if line or redrawn:
+                self._emit_line(line)
+        # A trailing "\r" may be the first half of "\r\n": wait for the next chunk
+        cut = buf.rfind(b'\r', 0, len(buf) - 1)
+        if cut != -1:
+            frame = self._overlay(buf[:cut])
+            buf = buf[cut + 1:]
+            self._cr_pending = frame
+            self._emit_line(frame, redraw=True)
+        return buf
+
+    def _emit_line(self, raw: bytes, redraw: bool = False):
         for enc in ('utf-8', 'gbk', 'cp936', 'latin-1'):
             try:
                 line = raw.decode(enc)
@@ -298,28 +748,96 @@ class ManagedProcess:
         else:
             line = raw.decode('latin-1')
         line = ANSI_ESCAPE.sub('', line)
+        index = self._log_index
+        parsed = index.parser.parse(line) if index is not None else None
         now = time.time()
-        self.log_buffer.append((now, line))
-        if len(self.log_buffer) > MAX_LOG_LINES:
-            self.log_buffer.pop(0)
-            self.log_pruned_count += 1
-        if len(self.log_buffer) % 200 == 0:
-            self._prune_logs(now)
-        for callback in list(self.subscribers):
+        with self._log_lock:
+            buf = self.log_buffer
+            if redraw or buf.open:
+                # Redrawn frame, or the line that settles an open frame
+                kind = buf.redraw(now, line, final=not redraw)
+            else:
+                kind = buf.append(now, line)
+            if not redraw:
+                self.log_lines_total += 1
+            self.log_bytes_total += len(raw)
+            if index is not None and index is self._log_index:
+                if kind == "new":
+                    index.add(buf.total - 1, parsed)
+                elif kind == "repeat":
+                    index.repeat()
+                else:
+                    index.update_last(parsed)
+                index.trim(buf.pruned)
+            if not redraw and self.log_lines_total % 200 == 0:
+                self._prune_logs_locked(now)
+        if redraw:
+            return  # subscribers get the settled line, not every progress frame
+        for callback in self.subscribers:
             try:
                 callback(self.id, line)
             except:
                 pass
 
+    def _prune_logs_locked(self, now):
+        self.log_buffer.prune_age(now - LOG_MAX_AGE)
+        if self._log_index is not None:
+            self._log_index.trim(self.log_buffer.pruned, fields=True)
+
     def _prune_logs(self, now=None):
         if now is None:
             now = time.time()
-        cutoff = now - LOG_MAX_AGE
-        count = 0
-        while self.log_buffer and self.log_buffer[0][0] < cutoff:
-            self.log_buffer.pop(0)
-            count += 1
-        self.log_pruned_count += count
+        with self._log_lock:
+            self._prune_logs_locked(now)
+
+    def read_logs(self, offset: int = 0, tail: int = 0):
+        """Return (lines since offset, at most the last `tail` if set, total, pruned) as one consistent view."""
+        with self._log_lock:
+            self._prune_logs_locked(time.time())
+            buf = self.log_buffer
+            return buf.read(offset, tail), buf.total, buf.pruned
+
+    def log_page(self, start: int = 0, limit: int = 1000, since: float = None, until: float = None,
+                 stop: int = None):
+        """Up to `limit` (line number, timestamp, text) rows from `start`, for exports.
+
+        `since` keeps lines last seen at or after it (a collapsed repeat counts
+        as recent), `until` lines first logged by then, `stop` bounds the line numbers.
+        Returns (rows, next start, done).
+        """
+        with self._log_lock:
+            buf = self.log_buffer
+            if since is not None:
+                start = max(start, buf.seek(since))
+            start = max(start, buf.pruned)
+            rows = []
+            for n, entry in buf.entries(start):
+                if (stop is not None and n >= stop) or (until is not None and entry[0] > until):
+                    return rows, n, True
+                if len(rows) >= limit:
+                    return rows, n, False
+                rows.append((n, entry[0], buf.text(entry)))
+            return rows, start + len(rows), True
+
+    def query_logs(self, filters: list, offset: int = 0, limit: int = 1000):
+        """Lines at or after `offset` matching structured filters, via the log index.
+
+        Returns (line numbers, lines, total, level counts); only the newest
+        `limit` matches are returned. Raises ValueError without a log_format.
+        """
+        with self._log_lock:
+            self._prune_logs_locked(time.time())
+            index = self._log_index
+            if index is None:
+                raise ValueError("Structured parsing is off for this service (set log_format)")
+            numbers = index.query(filters, offset)[-limit:] if limit > 0 else []
+            buf = self.log_buffer
+            lines = [buf.line_at(n) for n in numbers]
+            return numbers, lines, buf.total, index.counts()
+
+    def log_level_counts(self) -> dict:
+        index = self._log_index
+        return index.counts() if index is not None else {}
 
     def _collect_child_pids(self):
         """Snapshot all descendant PIDs using fast ctypes API."""
@@ -338,7 +856,7 @@ class ManagedProcess:
             self.job_handle = None
 
     def _force_cleanup(self):
-        """Force-clean a ghost process: kill job/tree, close pipe, reset state."""
+        """Force-clean a ghost process: kill job/tree, close pipe, reset state. Caller holds _lock."""
         saved_pid = self.pid
         self._terminate_job()
         _kill_pid_tree(self.pid)
@@ -349,64 +867,79 @@ class ManagedProcess:
                 self.process.stdout.close()
         except Exception:
             pass
-        self.exit_code = self.process.poll() if self.process else None
-        self.status = "stopped"
-        self.pid = None
-        self.child_pids = []
+        self._transition(
+            "stopped",
+            exit_code=self.process.poll() if self.process else None,
+            pid=None,
+            child_pids=[],
+        )
 
     def stop(self):
-        if self.status == "orphan" and self.pid:
-            saved_pid = self.pid
-            _kill_pid_tree(self.pid)
-            _kill_pids(self.child_pids)
-            _kill_child_conhosts(saved_pid)
-            self.status = "stopped"
-            self.pid = None
-            self.child_pids = []
-            self.process = None
-            return True
-        if self.process and self.process.poll() is None:
-            if not _pid_alive(self.pid):
-                self._force_cleanup()
+        with self._lock:
+            if self.status == "orphan" and self.pid:
+                self._transition("stopping")
+                saved_pid = self.pid
+                _kill_pid_tree(self.pid)
+                _kill_pids(self.child_pids)
+                _kill_child_conhosts(saved_pid)
+                self._transition("stopped", pid=None, child_pids=[], process=None)
                 return True
-            saved_pid = self.pid
-            # Terminate via Job Object (kills entire tree atomically)
-            self._terminate_job()
-            # Fallback: also taskkill tree in case job didn't cover everything
-            _kill_pid_tree(self.pid)
-            _kill_child_conhosts(saved_pid)
-            try:
-                self.process.wait(timeout=5)
-            except Exception:
-                pass
-            try:
-                if self.process.stdout:
-                    self.process.stdout.close()
-            except Exception:
-                pass
-            self.status = "stopped"
-            self.pid = None
-            self.child_pids = []
-            return True
-        return False
+            if self.process and self.process.poll() is None:
+                if not _pid_alive(self.pid):
+                    self._force_cleanup()
+                    return True
+                self._transition("stopping")
+                saved_pid = self.pid
+                # Terminate via Job Object (kills entire tree atomically)
+                self._terminate_job()
+                # Fallback: also taskkill tree in case job didn't cover everything
+                _kill_pid_tree(self.pid)
+                _kill_child_conhosts(saved_pid)
+                try:
+                    self.process.wait(timeout=5)
+                except Exception:
+                    pass
+                try:
+                    if self.process.stdout:
+                        self.process.stdout.close()
+                except Exception:
+                    pass
+                self._transition("stopped", exit_code=self.process.poll(), pid=None, child_pids=[])
+                return True
+            return False
 
     def restart(self):
-        self.stop()
-        self.restart_count += 1
-        return self.start()
+        with self._lock:
+            self.stop()
+            self.restart_count += 1
+            self._publish()
+            return self.start()
 
-    def to_dict(self):
-        if self.process is not None:
-            rc = self.process.poll()
-            if rc is None:
-                if self.pid and not _pid_alive(self.pid):
-                    self._force_cleanup()
-                else:
-                    self.status = "running"
+    def check_health(self) -> bool:
+        """Reap a ghost or refresh the child PID snapshot. Returns True if state changed."""
+        # Never wait on a service that is mid start/stop; the next sweep catches it
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self.status != "running" or not self.pid:
+                return False
+            if not _pid_alive(self.pid):
+                self._force_cleanup()
             else:
-                self.status = "stopped"
-                self.exit_code = rc
-                self.pid = None
+                # Periodically snapshot child PIDs for orphan recovery
+                self._collect_child_pids()
+            return True
+        finally:
+            self._lock.release()
+
+    def to_dict(self):
+        # Opportunistic reconcile; readers never block behind start/stop
+        if self._lock.acquire(blocking=False):
+            try:
+                self._reconcile()
+            finally:
+                self._lock.release()
+        status, pid, started_at, exit_code, restart_count = self._state
         return {
             "id": self.id,
             "name": self.name,
@@ -418,14 +951,46 @@ class ManagedProcess:
             "port": self.port,
             "config_file": self.config_file,
             "pinned": self.pinned,
-            "status": self.status,
-            "pid": self.pid,
-            "started_at": self.started_at,
-            "exit_code": self.exit_code,
-            "restart_count": self.restart_count,
+            "log_format": self.log_format,
+            "log_fields": list(self.log_fields),
+            "probes": list(self.probes),
+            "health_restart": self.health_restart,
+            "health": self.health if status == "running" else None,
+            "schedule": self.schedule,
+            "max_runtime": self.max_runtime,
+            "next_run": datetime.fromtimestamp(self.next_run_at).isoformat() if self.next_run_at else None,
+            "last_run": next((r for r in reversed(self.runs) if not r.get("skipped")), None),
+            "status": status,
+            "pid": pid,
+            "started_at": started_at,
+            "exit_code": exit_code,
+            "restart_count": restart_count,
+        }
+
+    def metrics(self) -> dict:
+        """Counters for /metrics, read from the state snapshot without locking."""
+        status, _, started_at, _, restart_count = self._state
+        uptime = 0.0
+        if status == "running" and started_at:
+            uptime = max(0.0, time.time() - datetime.fromisoformat(started_at).timestamp())
+        return {
+            "id": self.id,
+            "name": self.alias or self.name,
+            "group": self.group,
+            "status": status,
+            "health": self.health if status == "running" else None,
+            "uptime": round(uptime, 3),
+            "restarts": restart_count,
+            "log_lines": self.log_lines_total,
+            "log_bytes": self.log_bytes_total,
+            "log_dropped": self.log_pruned_count,
+            "log_buffered": len(self.log_buffer),
+            "log_compressed_bytes": self.log_buffer.cold_bytes,
+            "log_levels": self.log_level_counts(),
         }
 
     def to_persist(self):
+        status, pid, _, _, _ = self._state
         return {
             "id": self.id,
             "name": self.name,
@@ -437,36 +1002,74 @@ class ManagedProcess:
             "port": self.port,
             "config_file": self.config_file,
             "pinned": self.pinned,
-            "last_pid": self.pid,
-            "last_status": self.status,
-            "child_pids": self.child_pids,
+            "log_format": self.log_format,
+            "log_fields": list(self.log_fields),
+            "probes": list(self.probes),
+            "health_restart": self.health_restart,
+            "schedule": self.schedule,
+            "max_runtime": self.max_runtime,
+            "runs": list(self.runs),
+            "last_pid": pid,
+            "last_status": "running" if status in ("starting", "stopping") else status,
+            "child_pids": list(self.child_pids),
         }
 
 
 class ProcessManager:
     def __init__(self):
+        # Copy-on-write registry: writers swap in a new dict under _lock,
+        # readers iterate whatever dict they grabbed without locking.
         self.processes: dict[str, ManagedProcess] = {}
+        self._lock = threading.Lock()
+        # Monotonic state version; every visible change to any service bumps it.
+        # epoch changes per backend run so clients can detect a reset counter.
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self._version_lock = threading.Lock()
+        self._removed: dict[str, int] = {}  # id -> version it was removed at
+        self._removed_floor = 0  # deltas older than this need a full resync
+        self._last_health = 0.0
+        self._writer = DebouncedWriter(SERVICES_FILE, self._serialize, SAVE_DEBOUNCE)
+        self._watcher = None
+        self._sampler: threading.Thread = None
+        self._prober: health_probe.HealthProber = None
+        self._scheduler: scheduler.Scheduler = None
+        self.mq = mq_store  # where crash events go; supervisor.serve() points this at the web process
+        atexit.register(self.flush)
         self._load()
 
+    @staticmethod
+    def _from_item(item: dict) -> ManagedProcess:
+        proc = ManagedProcess(
+            id=item["id"],
+            name=item["name"],
+            script_path=item["script_path"],
+            cwd=item["cwd"],
+            command=item["command"],
+            port=item.get("port", ""),
+            config_file=item.get("config_file", ""),
+            pinned=item.get("pinned", False),
+            alias=item.get("alias", ""),
+            group=item.get("group", ""),
+            log_format=item.get("log_format", ""),
+            log_fields=item.get("log_fields", []),
+            probes=item.get("probes", []),
+            health_restart=item.get("health_restart", False),
+            schedule=item.get("schedule", ""),
+            max_runtime=item.get("max_runtime", 0),
+            runs=item.get("runs", []),
+        )
+        if not proc.port:
+            proc.port = _extract_port(proc.script_path)
+        return proc
+
     def _load(self):
         if SERVICES_FILE.exists():
             try:
                 data = json.loads(SERVICES_FILE.read_text(encoding="utf-8"))
+                processes = {}
                 for item in data:
-                    proc = ManagedProcess(
-                        id=item["id"],
-                        name=item["name"],
-                        script_path=item["script_path"],
-                        cwd=item["cwd"],
-                        command=item["command"],
-                        port=item.get("port", ""),
-                        config_file=item.get("config_file", ""),
-                        pinned=item.get("pinned", False),
-                        alias=item.get("alias", ""),
-                        group=item.get("group", ""),
-                    )
-                    if not proc.port:
-                        proc.port = _extract_port(proc.script_path)
+                    proc = self._from_item(item)
                     last_pid = item.get("last_pid")
                     last_status = item.get("last_status", "stopped")
                     saved_child_pids = item.get("child_pids", [])
@@ -475,29 +1078,238 @@ class ProcessManager:
                             proc.status = "orphan"
                             proc.pid = last_pid
                             proc.child_pids = saved_child_pids
+                            proc._publish()
                         else:
                             # Parent dead, but children may still be alive
                             _kill_pids(saved_child_pids)
-                            proc.status = "stopped"
-                            proc.pid = None
-                            proc.child_pids = []
-                    self.processes[proc.id] = proc
+                    self._attach(proc)
+                    processes[proc.id] = proc
+                with self._lock:
+                    self.processes = processes
             except:
                 pass
+        script_meta.flush()
         self._save()
 
+    def reload(self) -> dict:
+        """Apply an external edit of services.json to the running registry.
+
+        Three-way diff: the file is compared with what we last wrote, so only
+        fields someone else changed are applied and unsaved in-memory edits
+        survive. Added ids are registered, missing ids unregistered, changed
+        fields updated in place; a running service whose LAUNCH_FIELDS changed
+        is restarted in the background. Services that didn't change (running
+        or not) are left alone.
+        """
+        result = {"added": [], "removed": [], "updated": [], "restarted": []}
+        change = self._writer.external_change()
+        if change is None:
+            return result
+        base_text, text = change
+        try:
+            items = {item["id"]: item for item in json.loads(text)}
+            base = ({item["id"]: item for item in json.loads(base_text)} if base_text
+                    else {p.id: p.to_persist() for p in self.list_all()})
+        except (ValueError, KeyError, TypeError) as e:
+            # Probably a half-saved file; the next write event retries
+            print(f"[reload] services.json ignored: {e}", flush=True)
+            return result
+        self._writer.adopt(text)
+
+        added = []
+        for id, item in items.items():
+            if id in base or id in self.processes:
+                continue
+            try:
+                added.append(self._from_item(item))
+            except KeyError as e:
+                print(f"[reload] service {id} missing {e}", flush=True)
+        for proc in added:
+            self._attach(proc)
+        if added:
+            with self._lock:
+                self.processes = {**self.processes, **{p.id: p for p in added}}
+            result["added"] = [p.id for p in added]
+
+        for id in base:
+            if id not in items and self.unregister(id):
+                result["removed"].append(id)
+
+        for id, item in items.items():
+            proc = self.processes.get(id)
+            if proc is None or id not in base:
+                continue
+            fields = {k: item.get(k, RELOAD_FIELDS[k]) for k in RELOAD_FIELDS
+                      if item.get(k, RELOAD_FIELDS[k]) != base[id].get(k, RELOAD_FIELDS[k])}
+            if fields:
+                proc.update(**fields)
+                result["updated"].append(id)
+                if proc.status == "running" and any(k in fields for k in LAUNCH_FIELDS):
+                    # restart() waits for the old process to exit; don't hold up the reload
+                    threading.Thread(target=proc.restart, daemon=True,
+                                     name=f"reload-restart-{proc.alias or proc.name}").start()
+                    result["restarted"].append(id)
+
+        if any(result.values()):
+            print(f"[reload] services.json: {len(result['added'])} added, "
+                  f"{len(result['removed'])} removed, {len(result['updated'])} updated "
+                  f"({len(result['restarted'])} restarted)", flush=True)
+            script_meta.flush()
+        self._save()
+        return result
+
+    def start_watching(self):
+        """Hot-reload services.json when it is edited outside cmd-patrol."""
+        if self._watcher is None:
+            self._watcher = file_watch.watch(SERVICES_FILE, lambda _: self.reload())
+
+    def start_sampling(self):
+        """Sample CPU/memory of running services every RESOURCE_SAMPLE_INTERVAL (for crash records)."""
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True, name="resource-sampler")
+            self._sampler.start()
+
+    def start_probing(self):
+        """Run the services' active health probes (see health_probe)."""
+        if self._prober is None:
+            self._prober = health_probe.HealthProber(self)
+            self._prober.start()
+
+    def start_scheduling(self):
+        """Start scheduled services at their fire times (see scheduler)."""
+        if self._scheduler is None:
+            self._scheduler = scheduler.Scheduler(self)
+            self._scheduler.start()
+
+    def schedule_changed(self):
+        if self._scheduler is not None:
+            self._scheduler.wake()
+
+    def runs(self, id: str) -> list[dict]:
+        proc = self.get(id)
+        return proc.run_history() if proc else []
+
+    def run_logs(self, id: str, number: int):
+        proc = self.get(id)
+        return proc.run_logs(number) if proc else None
+
+    def health(self, id: str) -> dict:
+        """Probe results and health for one service."""
+        if self._prober is None:
+            proc = self.get(id)
+            return {"health": None, "health_restart": bool(proc and proc.health_restart),
+                    "last_restart": None, "probes": []}
+        return self._prober.status(id)
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(RESOURCE_SAMPLE_INTERVAL)
+            with span("resource_sample"):
+                # One process table scan per pass, shared by every service
+                tree = None if _IS_WINDOWS else _parent_map()
+                for proc in self.list_all():
+                    try:
+                        proc.sample_resources(tree)
+                    except Exception:
+                        pass
+
+    def _crashed(self, proc: ManagedProcess, crash: dict):
+        """Store a crash record and raise an MQ event for it (deduplicated by signature)."""
+        def publish(c: dict) -> str | None:
+            reason = c["signal"] or f"exit code {c['exit_code']}"
+            msg = self.mq.publish(
+                "cmd-patrol", "service_crash", f"{c['service']} exited unexpectedly ({reason})",
+                detail="\n".join(c["last_lines"][-20:]),
+                meta={k: c[k] for k in ("service_id", "exit_code", "signal", "runtime",
+                                        "restart_count", "signature")} | {"crash_id": c["id"]},
+            )
+            return msg["id"] if msg else None
+        try:
+            crash_store.record(crash, publish, self.mq.get)
+        except Exception as e:
+            print(f"[cmd-patrol] failed to record crash of {crash['service']}: {e}", flush=True)
+
+    def crashes(self, id: str, limit: int = crash_store.CRASH_HISTORY) -> list[dict]:
+        return crash_store.query(id, limit)
+
+    # ── Profiling (runs in the supervisor when reached through RemoteManager) ──
+    def profile(self, seconds: float, interval: float = profiling.PROFILE_INTERVAL) -> dict:
+        return profiling.sample(seconds, interval)
+
+    def span_stats(self) -> list[dict]:
+        return profiling.span_stats()
+
+    def _bump(self) -> int:
+        with self._version_lock:
+            self.version += 1
+            return self.version
+
+    def _attach(self, proc: ManagedProcess):
+        proc._on_change = self._bump
+        proc._on_crash = self._crashed
+        proc._on_run_end = self._save
+        proc.version = self._bump()
+
+    def changes(self, since: int = 0, epoch: str = "") -> dict:
+        """Services changed after version `since`, plus ids removed since then."""
+        version = self.version  # read first: anything racing us shows up next time
+        full = since <= 0 or since > version or since < self._removed_floor or (epoch and epoch != self.epoch)
+        procs = self.list_all()
+        if not full:
+            procs = [p for p in procs if p.version > since]
+        with self._version_lock:
+            removed = [] if full else [id for id, v in self._removed.items() if v > since]
+        return {
+            "epoch": self.epoch,
+            "version": version,
+            "full": bool(full),
+            "changed": [p.to_dict() for p in procs],
+            "removed": removed,
+        }
+
+    def listing(self) -> tuple[str, list[dict]]:
+        """(ETag, service dicts) for the full list, in one call (one round trip via the supervisor).
+
+        to_dict() may reconcile a dead child and bump the version, so the tag
+        is taken after the body is built; if anything changed meanwhile the
+        body is rebuilt, and after a few tries the older tag is used (a
+        stale tag only costs the client one more full fetch).
+        """
+        for _ in range(3):
+            version = self.version
+            body = [p.to_dict() for p in self.list_all()]
+            if self.version == version:
+                break
+        return f"{self.epoch}-{version}", body
+
+    def _serialize(self) -> str:
+        data = [p.to_persist() for p in self.list_all()]
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
     def _save(self):
-        data = [p.to_persist() for p in self.processes.values()]
-        SERVICES_FILE.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+        """Mark the registry dirty; a debounced background flush writes it."""
+        self._writer.mark_dirty()
 
-    def register(self, script_path: str, name: str = None) -> ManagedProcess:
+    def flush(self):
+        """Write services.json now (atomically, and only if it changed)."""
+        try:
+            self._writer.flush()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _default_name(script_path: str) -> str:
+        name = Path(script_path).stem
+        if name.startswith("start_"):
+            name = name[6:]
+        return name
+
+    def _build(self, script_path: str, name: str = None, group: str = "") -> ManagedProcess:
         script_path = os.path.abspath(script_path)
         cwd = os.path.dirname(script_path)
         
         if name is None:
-            name = Path(script_path).stem
-            if name.startswith("start_"):
-                name = name[6:]
+            name = self._default_name(script_path)
         
         ext = Path(script_path).suffix.lower()
         if ext in (".cmd", ".bat"):
@@ -516,18 +1328,101 @@ class ProcessManager:
             cwd=cwd,
             command=command,
             port=_extract_port(script_path),
+            group=group,
         )
-        self.processes[proc.id] = proc
+        self._attach(proc)
+        return proc
+
+    def register(self, script_path: str, name: str = None) -> ManagedProcess:
+        proc = self._build(script_path, name)
+        with self._lock:
+            self.processes = {**self.processes, proc.id: proc}
+        script_meta.flush()
         self._save()
         return proc
 
-    def unregister(self, id: str) -> bool:
-        if id in self.processes:
-            self.processes[id].stop()
-            del self.processes[id]
+    def _registered_paths(self) -> set[str]:
+        return {os.path.normcase(os.path.abspath(p.script_path)) for p in self.list_all()}
+
+    def discover(self, roots: list[str], q: str = "", max_results: int = DISCOVER_MAX) -> list[dict]:
+        """Scan roots in parallel for scripts and pre-extract what register would.
+
+        Each candidate carries the default name (start_ stripped), a group
+        taken from its folder name, the detected port, and whether it is
+        already registered.
+        """
+        roots = [os.path.abspath(r) for r in roots if r and os.path.isdir(r)]
+        with ThreadPoolExecutor(max_workers=DISCOVER_WORKERS) as pool:
+            found = [item for items in pool.map(
+                lambda r: list(dir_browser.find_scripts(r, q=q, max_results=max_results)), roots)
+                for item in items]
+            seen, unique = set(), []
+            for item in found:
+                key = os.path.normcase(item["path"])
+                if key not in seen:
+                    seen.add(key)
+                    unique.append(item)
+            metas = list(pool.map(lambda item: script_meta.get_meta(item["path"]), unique))
+        script_meta.flush()
+        registered = self._registered_paths()
+        return [{
+            "script_path": item["path"],
+            "name": self._default_name(item["path"]),
+            "group": os.path.basename(item["dir"]),
+            "port": meta.get("port", ""),
+            "interpreter": meta.get("interpreter", ""),
+            "registered": os.path.normcase(item["path"]) in registered,
+        } for item, meta in zip(unique, metas)]
+
+    def register_many(self, items: list[dict]) -> tuple[list[ManagedProcess], list[dict]]:
+        """Register a batch in one transaction: one registry swap, one save.
+
+        Items are {"script_path", "name"?, "group"?}. Returns (registered,
+        skipped) where skipped entries carry a "reason".
+        """
+        added, skipped = [], []
+        with self._lock:
+            # Duplicate check, build and insert under one lock: concurrent batches can't both
+            # add a script, and a skipped entry is never built (no attach, no version bump)
+            registered_paths = self._registered_paths()
+            for item in items:
+                path = item.get("script_path") or ""
+                if not path or not os.path.isfile(path):
+                    skipped.append({**item, "reason": "not found"})
+                    continue
+                key = os.path.normcase(os.path.abspath(path))
+                if key in registered_paths:
+                    skipped.append({**item, "reason": "already registered"})
+                    continue
+                registered_paths.add(key)
+                added.append(self._build(path, item.get("name") or None, (item.get("group") or "").strip()))
+            if added:
+                self.processes = {**self.processes, **{p.id: p for p in added}}
+        if added:
+            script_meta.flush()
             self._save()
-            return True
-        return False
+        return added, skipped
+
+    def unregister(self, id: str) -> bool:
+        with self._lock:
+            proc = self.processes.get(id)
+            if proc is None:
+                return False
+            self.processes = {k: v for k, v in self.processes.items() if k != id}
+        version = self._bump()
+        with self._version_lock:
+            self._removed[id] = version
+            if len(self._removed) > MAX_TOMBSTONES:
+                oldest = min(self._removed, key=self._removed.get)
+                self._removed_floor = self._removed.pop(oldest)
+        proc._on_change = None
+        proc._on_crash = None
+        proc._on_run_end = None
+        proc.stop()
+        script_meta.forget(proc.script_path)
+        crash_store.forget(id)
+        self._save()
+        return True
 
     def get(self, id: str) -> ManagedProcess:
         return self.processes.get(id)
@@ -535,33 +1430,36 @@ class ProcessManager:
     def list_all(self) -> list[ManagedProcess]:
         return list(self.processes.values())
 
-    def health_check(self):
+    def metrics(self) -> list[dict]:
+        """Per-service metric counters in one call (one round trip via the supervisor)."""
+        return [p.metrics() for p in self.list_all()]
+
+    def health_check(self, min_interval: float = 0):
         """Sweep all services: snapshot child PIDs and clean up ghost processes."""
+        now = time.time()
+        if min_interval and now - self._last_health < min_interval:
+            return
+        self._last_health = now
         dirty = False
-        for proc in self.processes.values():
-            if proc.status == "running" and proc.pid:
-                if not _pid_alive(proc.pid):
-                    proc._force_cleanup()
-                    dirty = True
-                else:
-                    # Periodically snapshot child PIDs for orphan recovery
-                    proc._collect_child_pids()
+        with span("health_check"):
+            for proc in self.list_all():
+                if proc.check_health():
                     dirty = True
         if dirty:
             self._save()
 
     def cleanup_and_start_all(self):
         """Clean up all orphan/zombie processes, then start all services."""
-        for proc in self.processes.values():
+        for proc in self.list_all():
             if proc.status == "orphan" and proc.pid:
                 proc.stop()
-            elif proc.status == "running" and proc.pid:
-                if not _pid_alive(proc.pid):
-                    proc._force_cleanup()
+            else:
+                proc.check_health()
         self._save()
         started = 0
-        for proc in self.processes.values():
-            if proc.status != "running":
+        for proc in self.list_all():
+            # Scheduled services only run when the scheduler fires them
+            if proc.status != "running" and not proc.schedule:
                 if proc.start():
                     started += 1
         self._save()
@@ -582,20 +1480,29 @@ class ProcessManager:
     def subscribe_logs(self, id: str, callback):
         proc = self.get(id)
         if proc:
-            proc.subscribers.append(callback)
+            proc.add_subscriber(callback)
 
     def unsubscribe_logs(self, id: str, callback):
         proc = self.get(id)
-        if proc and callback in proc.subscribers:
-            proc.subscribers.remove(callback)
+        if proc:
+            proc.remove_subscriber(callback)
 
-    def get_logs(self, id: str, offset: int = 0):
+    def get_logs(self, id: str, offset: int = 0, tail: int = 0):
         proc = self.get(id)
         if not proc:
             return [], 0, 0
-        proc._prune_logs()
-        buf = proc.log_buffer
-        total = proc.log_pruned_count + len(buf)
-        idx = max(0, offset - proc.log_pruned_count)
-        lines = [entry[1] for entry in buf[idx:]]
-        return lines, total, proc.log_pruned_count
+        return proc.read_logs(offset, tail)
+
+    def log_page(self, id: str, start: int = 0, limit: int = 1000, since: float = None,
+                 until: float = None, stop: int = None):
+        proc = self.get(id)
+        if not proc:
+            return [], start, True
+        return proc.log_page(start, limit, since, until, stop)
+
+    def query_logs(self, id: str, filter_text: str, offset: int = 0, limit: int = 1000):
+        """Structured query ("level>=warn, user=alice") over one service's log index."""
+        proc = self.get(id)
+        if not proc:
+            return [], [], 0, {}
+        return proc.query_logs(log_parse.parse_filters(filter_text), offset, limit)
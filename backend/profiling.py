@@ -0,0 +1,238 @@
+"""
+Hot-path instrumentation and an on-demand sampling profiler.
+
+- span(name): times a block (or, as a decorator, a function). Durations go to
+  the cmd_patrol_span_duration_seconds histogram on /metrics and to running
+  count/total/max stats served by /debug/spans. Cost per span is two
+  perf_counter() calls and one short lock.
+- sample(seconds): samples the stacks of every Python thread via
+  sys._current_frames() and measures each thread's CPU time over the window
+  (/proc on Linux, GetThreadTimes on Windows). Log reader threads are named
+  "reader-<service>", so a busy service shows up by name. Stacks can be
+  rendered in the collapsed "frame;frame;frame count" format that
+  flamegraph.pl, inferno and speedscope read.
+- merge(): in supervisor mode the services' threads (log readers, sampler,
+  probes, scheduler) live in supervisor.py, so /debug/profile samples both
+  processes at once and merges them, prefixing thread names "app:" /
+  "supervisor:".
+
+Under eventlet only real OS threads are visible; greenlet stacks are not.
+"""
+
+import ctypes
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+import metrics
+
+PROFILE_MAX_SECONDS = 60
+PROFILE_INTERVAL = 0.005  # seconds between stack samples
+PROFILE_MAX_DEPTH = 128
+
+span_duration = metrics.Histogram("cmd_patrol_span_duration_seconds",
+                                  "Duration of instrumented hot-path operations", ("span",))
+
+_stats: dict[str, list] = {}  # name -> [count, total_seconds, max_seconds]
+_stats_lock = threading.Lock()
+_profile_lock = threading.Lock()
+
+
+# ── Spans ──
+def _record(name: str, elapsed: float):
+    span_duration.observe(elapsed, name)
+    with _stats_lock:
+        row = _stats.get(name)
+        if row is None:
+            _stats[name] = [1, elapsed, elapsed]
+        else:
+            row[0] += 1
+            row[1] += elapsed
+            if elapsed > row[2]:
+                row[2] = elapsed
+
+
+class span:
+    """Time a block (`with span("x"):`) or every call of a function (`@span("x")`)."""
+
+    __slots__ = ("name", "_t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self._t0)
+        return False
+
+    def __call__(self, fn):
+        name = self.name
+
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - t0)
+        return timed
+
+
+def span_stats() -> list[dict]:
+    """Running stats per span, most total time first."""
+    with _stats_lock:
+        rows = [(name, *row) for name, row in _stats.items()]
+    return sorted(({
+        "span": name,
+        "count": count,
+        "total_ms": round(total * 1000, 3),
+        "mean_us": round(total / count * 1e6, 1),
+        "max_ms": round(peak * 1000, 3),
+    } for name, count, total, peak in rows), key=lambda r: -r["total_ms"])
+
+
+# ── Per-thread CPU ──
+if os.name == "nt":
+    from ctypes import wintypes
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _kernel32.OpenThread.restype = wintypes.HANDLE
+    _THREAD_QUERY_LIMITED_INFORMATION = 0x0800
+
+    def _thread_cpu(native_id: int) -> float | None:
+        handle = _kernel32.OpenThread(_THREAD_QUERY_LIMITED_INFORMATION, False, native_id)
+        if not handle:
+            return None
+        try:
+            times = [ctypes.c_ulonglong() for _ in range(4)]  # creation, exit, kernel, user
+            if not _kernel32.GetThreadTimes(handle, *(ctypes.byref(t) for t in times)):
+                return None
+            return (times[2].value + times[3].value) / 1e7  # 100 ns units
+        finally:
+            _kernel32.CloseHandle(handle)
+else:
+    _CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _thread_cpu(native_id: int) -> float | None:
+        try:
+            with open(f"/proc/self/task/{native_id}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            return None
+        # Fields after the ")" closing the thread name; utime/stime are 14/15
+        fields = stat[stat.rindex(b")") + 2:].split()
+        return (int(fields[11]) + int(fields[12])) / _CLK_TCK
+
+
+def _threads() -> dict[int, threading.Thread]:
+    return {t.ident: t for t in threading.enumerate() if t.ident is not None}
+
+
+# ── Sampler ──
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})".replace(";", ",")
+
+
+def _stack(frame) -> tuple[str, ...]:
+    labels = []
+    while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+
+def sample(seconds: float, interval: float = PROFILE_INTERVAL) -> dict:
+    """Sample all thread stacks for `seconds`. Raises RuntimeError if one is already running."""
+    seconds = max(0.1, min(float(seconds), PROFILE_MAX_SECONDS))
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        me = threading.get_ident()
+        threads = _threads()
+        cpu_start = {ident: _thread_cpu(t.native_id) for ident, t in threads.items() if t.native_id}
+        stacks: Counter = Counter()
+        per_thread: Counter = Counter()
+        names: dict[int, str] = {ident: t.name for ident, t in threads.items()}
+        samples = 0
+        t0 = time.perf_counter()
+        deadline = t0 + seconds
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    # Started after the profile began
+                    names.update((i, t.name) for i, t in _threads().items())
+                    names.setdefault(ident, f"thread-{ident}")
+                stacks[(names[ident], _stack(frame))] += 1
+                per_thread[ident] += 1
+            samples += 1
+            time.sleep(interval)
+        wall = time.perf_counter() - t0
+
+        thread_rows = []
+        for ident, t in _threads().items():
+            if ident == me:
+                continue
+            before = cpu_start.get(ident)
+            after = _thread_cpu(t.native_id) if t.native_id else None
+            cpu = round(after - before, 3) if before is not None and after is not None else None
+            thread_rows.append({
+                "thread": t.name,
+                "native_id": t.native_id,
+                "cpu_seconds": cpu,
+                "cpu_percent": round(cpu / wall * 100, 1) if cpu is not None else None,
+                "samples": per_thread.get(ident, 0),
+            })
+        thread_rows.sort(key=lambda r: -(r["cpu_seconds"] or 0))
+        return {
+            "pid": os.getpid(),
+            "seconds": round(wall, 3),
+            "interval": interval,
+            "rounds": samples,
+            "threads": thread_rows,
+            "stacks": stacks,
+        }
+    finally:
+        _profile_lock.release()
+
+
+def merge(profiles: dict[str, dict]) -> dict:
+    """One profile from simultaneous ones keyed by process name; threads become "process:thread"."""
+    stacks: Counter = Counter()
+    threads = []
+    for process, profile in profiles.items():
+        for (thread, stack), count in profile["stacks"].items():
+            stacks[(f"{process}:{thread}", stack)] += count
+        threads += [{**row, "process": process, "thread": f"{process}:{row['thread']}"}
+                    for row in profile["threads"]]
+    threads.sort(key=lambda r: -(r["cpu_seconds"] or 0))
+    return {
+        "processes": [{"name": process, "pid": p["pid"], "seconds": p["seconds"], "rounds": p["rounds"]}
+                      for process, p in profiles.items()],
+        "seconds": max(p["seconds"] for p in profiles.values()),
+        "interval": next(iter(profiles.values()))["interval"],
+        "threads": threads,
+        "stacks": stacks,
+    }
+
+
+def collapsed(profile: dict) -> str:
+    """Folded stacks ("thread;outer;...;inner count"), one per line."""
+    return "".join(f"{thread.replace(';', ',')};{';'.join(stack)} {count}\n"
+                   for (thread, stack), count in profile["stacks"].most_common())
+
+
+def summary(profile: dict, top: int = 50) -> dict:
+    """JSON-friendly view: per-thread CPU plus the hottest stacks (leaf frame last)."""
+    return {
+        **{k: v for k, v in profile.items() if k != "stacks"},
+        "top_stacks": [{"thread": thread, "count": count, "stack": list(stack)}
+                       for (thread, stack), count in profile["stacks"].most_common(top)],
+    }
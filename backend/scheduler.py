@@ -0,0 +1,220 @@
+"""
+Scheduled one-shot services.
+
+A service with a "schedule" is not kept running: it is started at each fire
+time through the normal start/log capture path and left to exit. Syntax:
+    "*/15 * * * *"              cron: minute hour day-of-month month day-of-week
+                                (lists, ranges, steps, jan-dec / sun-sat names)
+    "@hourly" "@daily" "@weekly" "@monthly" "@yearly"
+    "every 30s" / "@every 10m"  fixed interval (s, m, h, d)
+Times are local. As in Vixie cron, when both day fields are restricted a
+day matching either one fires.
+
+- Overlap: if the previous run is still going at the next fire time, that
+  firing is skipped (recorded in the run history as skipped).
+- "max_runtime" (seconds): a run still going after that is stopped and
+  marked timed_out. It applies to manual runs of the service as well.
+- Every run (scheduled or manual) is recorded on the service with its
+  trigger, times, exit code and first log line, so each run's log segment
+  can be read back (ManagedProcess.run_logs).
+
+One "scheduler" thread keeps a heap of (fire time, service id, schedule)
+and sleeps until the earliest entry, waking at least every
+SCHEDULE_SYNC_INTERVAL to pick up edits and enforce max runtimes. Entries
+for schedules that changed are simply dropped when they come up.
+"""
+
+import heapq
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+SCHEDULE_SYNC_INTERVAL = 1.0  # seconds, max sleep between heap/edit/max-runtime checks
+MACROS = {"@hourly": "0 * * * *", "@daily": "0 0 * * *", "@midnight": "0 0 * * *",
+          "@weekly": "0 0 * * 0", "@monthly": "0 0 1 * *", "@yearly": "0 0 1 1 *", "@annually": "0 0 1 1 *"}
+_NAMES = {
+    3: {m: i for i, m in enumerate(("jan", "feb", "mar", "apr", "may", "jun",
+                                     "jul", "aug", "sep", "oct", "nov", "dec"), 1)},
+    4: {d: i for i, d in enumerate(("sun", "mon", "tue", "wed", "thu", "fri", "sat"))},
+}
+_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))  # minute hour dom month dow (7 = sunday)
+_INTERVAL = re.compile(r"^(?:@?every\s+)?(\d+(?:\.\d+)?)\s*([smhd])$", re.IGNORECASE)
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class Schedule:
+    """A parsed schedule; next_after(t) gives the first fire time after epoch t."""
+
+    def __init__(self, text: str):
+        self.text = text.strip()
+        self.interval = None
+        expr = MACROS.get(self.text.lower(), self.text)
+        m = _INTERVAL.match(expr)
+        if m:
+            self.interval = float(m.group(1)) * _UNITS[m.group(2).lower()]
+            if self.interval < 1:
+                raise ValueError("Interval must be at least 1s")
+            return
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"Bad schedule: {text!r} (cron needs 5 fields, or use 'every 10m')")
+        self.fields = [self._field(p, i) for i, p in enumerate(parts)]
+        self.fields[4] = {d % 7 for d in self.fields[4]}
+        self.dom_any = parts[2] == "*"
+        self.dow_any = parts[4] == "*"
+
+    @staticmethod
+    def _field(text: str, i: int) -> set[int]:
+        lo, hi = _RANGES[i]
+        names = _NAMES.get(i, {})
+
+        def value(v: str) -> int:
+            n = names.get(v.lower()) if not v.isdigit() else int(v)
+            if n is None or not lo <= n <= hi:
+                raise ValueError(f"Bad value {v!r} in schedule field {i + 1}")
+            return n
+
+        out = set()
+        for part in text.split(","):
+            base, _, step = part.partition("/")
+            if base == "*":
+                start, end = lo, hi
+            elif "-" in base:
+                a, b = base.split("-", 1)
+                start, end = value(a), value(b)
+            else:
+                start = end = value(base)
+                if step:
+                    end = hi
+            step_n = int(step) if step else 1
+            if step_n < 1 or start > end:
+                raise ValueError(f"Bad schedule field {part!r}")
+            out.update(range(start, end + 1, step_n))
+        return out
+
+    def _day_ok(self, d: datetime) -> bool:
+        dom = d.day in self.fields[2]
+        dow = (d.isoweekday() % 7) in self.fields[4]
+        if self.dom_any or self.dow_any:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, t: float) -> float:
+        if self.interval:
+            return t + self.interval
+        minutes, hours, _, months, _ = self.fields
+        d = datetime.fromtimestamp(t).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(100000):  # bounded: impossible dates like "0 0 31 2 *" never match
+            if d.month not in months:
+                d = (d.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_ok(d):
+                d = d.replace(hour=0, minute=0) + timedelta(days=1)
+            elif d.hour not in hours:
+                d = d.replace(minute=0) + timedelta(hours=1)
+            elif d.minute not in minutes:
+                d += timedelta(minutes=1)
+            else:
+                return d.timestamp()
+        raise ValueError(f"Schedule never fires: {self.text!r}")
+
+
+def parse(text: str) -> Schedule:
+    """Schedule for `text`; raises ValueError with a readable message."""
+    return Schedule(text)
+
+
+class Scheduler:
+    def __init__(self, manager):
+        self.manager = manager
+        self._heap: list[tuple[float, str, str]] = []
+        self._next: dict[str, tuple[str, float]] = {}  # service id -> (schedule, fire time) in force
+        self._timing_out: set[str] = set()  # services being stopped for exceeding max_runtime
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="scheduler")
+            self._thread.start()
+
+    def wake(self):
+        """Re-read schedules now (e.g. after an edit)."""
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            try:
+                now = time.time()
+                self._sync(now)
+                self._fire_due(now)
+                self._enforce_max_runtime(now)
+            except Exception as e:
+                print(f"[scheduler] tick failed: {e}", flush=True)
+            delay = SCHEDULE_SYNC_INTERVAL
+            if self._heap:
+                delay = min(delay, max(0.0, self._heap[0][0] - time.time()))
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _sync(self, now: float):
+        """Schedule new or edited services; forget removed/unscheduled ones."""
+        current = {}
+        for proc in self.manager.list_all():
+            if proc.schedule:
+                current[proc.id] = proc
+        for id in [id for id in self._next if id not in current]:
+            del self._next[id]
+            proc = self.manager.get(id)
+            if proc is not None:
+                proc.update(next_run_at=None)
+        for id, proc in current.items():
+            entry = self._next.get(id)
+            if entry is not None and entry[0] == proc.schedule:
+                continue
+            try:
+                fire = parse(proc.schedule).next_after(now)
+            except ValueError as e:
+                print(f"[scheduler] {proc.alias or proc.name}: {e}", flush=True)
+                self._next[id] = (proc.schedule, float("inf"))
+                proc.update(next_run_at=None)
+                continue
+            self._push(proc, fire)
+
+    def _push(self, proc, fire: float):
+        self._next[proc.id] = (proc.schedule, fire)
+        heapq.heappush(self._heap, (fire, proc.id, proc.schedule))
+        proc.update(next_run_at=fire)
+
+    def _fire_due(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            fire, id, schedule = heapq.heappop(self._heap)
+            if self._next.get(id) != (schedule, fire):
+                continue  # edited or removed since it was queued
+            proc = self.manager.get(id)
+            if proc is None:
+                continue
+            if proc.status in ("starting", "running", "stopping"):
+                proc.skip_run("schedule")
+            else:
+                # start() only spawns the process and its reader; it doesn't wait for the run
+                proc.start(trigger="schedule")
+            sched = parse(schedule)
+            nxt = sched.next_after(fire)
+            if nxt <= now:  # fell behind (suspend, clock jump): don't replay missed runs
+                nxt = sched.next_after(now)
+            self._push(proc, nxt)
+
+    def _enforce_max_runtime(self, now: float):
+        for proc in self.manager.list_all():
+            if not proc.max_runtime or proc.status != "running" or not proc.started_at:
+                self._timing_out.discard(proc.id)
+                continue
+            if proc.id in self._timing_out:
+                continue
+            runtime = now - datetime.fromisoformat(proc.started_at).timestamp()
+            if runtime > proc.max_runtime:
+                self._timing_out.add(proc.id)
+                proc.time_out()
+                # stop() waits for the process to exit; don't hold up other services
+                threading.Thread(target=proc.stop, daemon=True, name=f"timeout-{proc.alias or proc.name}").start()
@@ -0,0 +1,136 @@
+"""
+Script metadata cache for cmd-patrol.
+
+Introspecting a watchdog script (decoding it, scanning for ports, env vars,
+config files...) costs a full file read per script. Results are cached in
+script_meta.json next to services.json, keyed by absolute path and validated
+against the file's mtime + size, so a script is only re-read after it changes.
+
+Cached entry schema:
+{
+    "mtime": float,
+    "size": int,
+    "encoding": str,        # "utf-8" | "gbk" | "latin-1" | ""
+    "interpreter": str,     # "cmd" | "powershell" | "bash" | "python" | ""
+    "port": str,
+    "env_vars": list[str],  # names assigned via set/$env:/export
+    "config_files": list[str],
+}
+"""
+
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+from persist import atomic_write_text
+
+META_FILE = Path(__file__).parent / "script_meta.json"
+
+_PORT_PATTERNS = [
+    re.compile(r'(?:localhost|127\.0\.0\.1|0\.0\.0\.0)[:/](\d{2,5})'),
+    re.compile(r'[Pp][Oo][Rr][Tt][=\s:]+?(\d{2,5})'),
+    re.compile(r'http\.server\s+(\d{2,5})'),
+]
+_ENV_PATTERNS = [
+    re.compile(r'^\s*set\s+"?([A-Za-z_][A-Za-z0-9_]*)=', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'\$env:([A-Za-z_][A-Za-z0-9_]*)\s*=', re.IGNORECASE),
+    re.compile(r'^\s*export\s+([A-Za-z_][A-Za-z0-9_]*)=', re.MULTILINE),
+]
+_CONFIG_PATTERN = re.compile(
+    r'["\']?([^\s"\'<>|=]+\.(?:json|ya?ml|toml|ini|cfg|conf|env))["\']?', re.IGNORECASE)
+_INTERPRETERS = {".cmd": "cmd", ".bat": "cmd", ".ps1": "powershell", ".sh": "bash", ".py": "python"}
+
+_lock = threading.Lock()
+_cache: dict[str, dict] | None = None
+_dirty = False
+
+
+def _load_cache() -> dict[str, dict]:
+    global _cache
+    if _cache is None:
+        try:
+            _cache = json.loads(META_FILE.read_text(encoding="utf-8"))
+        except Exception:
+            _cache = {}
+    return _cache
+
+
+def _decode(raw: bytes) -> tuple[str, str]:
+    for enc in ('utf-8', 'gbk', 'latin-1'):
+        try:
+            return raw.decode(enc), enc
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return "", ""
+
+
+def _unique(items) -> list[str]:
+    return list(dict.fromkeys(items))
+
+
+def _extract(script_path: str, st: os.stat_result) -> dict:
+    meta = {
+        "mtime": st.st_mtime,
+        "size": st.st_size,
+        "encoding": "",
+        "interpreter": _INTERPRETERS.get(Path(script_path).suffix.lower(), ""),
+        "port": "",
+        "env_vars": [],
+        "config_files": [],
+    }
+    try:
+        text, enc = _decode(Path(script_path).read_bytes())
+    except OSError:
+        return meta
+    meta["encoding"] = enc
+    for pattern in _PORT_PATTERNS:
+        m = pattern.search(text)
+        if m:
+            meta["port"] = m.group(1)
+            break
+    meta["env_vars"] = _unique(m.group(1) for p in _ENV_PATTERNS for m in p.finditer(text))
+    meta["config_files"] = _unique(m.group(1) for m in _CONFIG_PATTERN.finditer(text))
+    return meta
+
+
+def get_meta(script_path: str) -> dict:
+    """Return cached metadata for a script, re-extracting only if it changed."""
+    global _dirty
+    key = os.path.abspath(script_path)
+    try:
+        st = os.stat(key)
+    except OSError:
+        return {}
+    with _lock:
+        entry = _load_cache().get(key)
+        if entry and entry.get("mtime") == st.st_mtime and entry.get("size") == st.st_size:
+            return entry
+    entry = _extract(key, st)
+    with _lock:
+        _load_cache()[key] = entry
+        _dirty = True
+    return entry
+
+
+def forget(script_path: str):
+    """Drop a script from the cache (e.g. after unregistering it)."""
+    global _dirty
+    with _lock:
+        if _load_cache().pop(os.path.abspath(script_path), None) is not None:
+            _dirty = True
+
+
+def flush():
+    """Persist the cache if anything changed since the last flush."""
+    global _dirty
+    with _lock:
+        if not _dirty:
+            return
+        data = json.dumps(_load_cache(), indent=2, ensure_ascii=False)
+        _dirty = False
+    try:
+        atomic_write_text(META_FILE, data)
+    except OSError:
+        pass
@@ -0,0 +1,72 @@
+"""
+Serving modes for the cmd-patrol backend.
+
+- threaded: Werkzeug dev server, one OS thread per connection (default).
+- eventlet: green-thread WSGI server. Thousands of idle streaming clients
+  (SSE log tails, MQ streams, long-polls) cost a greenlet each instead of an
+  OS thread. Blocking work (killing process trees, waiting on children,
+  subprocess calls) must go through offload() so it runs in eventlet's real
+  OS thread pool and never stalls the event loop.
+
+Select with `python app.py --server eventlet` or CMD_PATROL_SERVER=eventlet.
+"""
+
+import json
+import os
+import time
+
+SERVER_MODES = ("threaded", "eventlet")
+EVENTLET_MAX_CLIENTS = 10000  # concurrent greenlets the WSGI server may spawn
+
+_mode = "threaded"
+
+
+def mode() -> str:
+    return _mode
+
+
+def offload(fn, *args, **kwargs):
+    """Run a blocking call off the event loop (no-op wrapper in threaded mode)."""
+    if _mode == "eventlet":
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def sleep(seconds: float):
+    """Cooperative sleep: yields to other greenlets under eventlet."""
+    if _mode == "eventlet":
+        import eventlet
+        eventlet.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def sse_event(data, event: str = "") -> str:
+    """Format one Server-Sent Events frame."""
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    head = f"event: {event}\n" if event else ""
+    return head + "".join(f"data: {line}\n" for line in payload.split("\n")) + "\n"
+
+
+def sse_headers() -> dict:
+    return {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def serve(app, host: str, port: int, server: str = ""):
+    """Run the WSGI app with the requested server mode."""
+    global _mode
+    server = server or os.environ.get("CMD_PATROL_SERVER", "threaded")
+    if server not in SERVER_MODES:
+        raise ValueError(f"Unknown server mode: {server} (expected one of {SERVER_MODES})")
+    _mode = server
+    if server == "eventlet":
+        import eventlet
+        import eventlet.wsgi
+        # Only sockets are patched: reader threads and Timer-based flushes stay
+        # real OS threads so blocking pipe reads never touch the hub.
+        eventlet.monkey_patch(socket=True, select=True, os=False, thread=False, time=False)
+        sock = eventlet.listen((host, port))
+        eventlet.wsgi.server(sock, app, log_output=False, max_size=EVENTLET_MAX_CLIENTS)
+    else:
+        app.run(host=host, port=port, debug=False, threaded=True)
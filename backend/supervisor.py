@@ -0,0 +1,268 @@
+"""
+cmd-patrol supervisor daemon.
+
+Owns the ProcessManager: child processes, stdout pipes, log buffers and
+services.json. The web/API process (app.py) talks to it over a local IPC
+channel (a Unix socket on POSIX, a named pipe on Windows, both via
+multiprocessing.connection with a shared auth key), so the UI can be
+restarted or upgraded without interrupting services or losing logs.
+
+Protocol: the client sends (target, name, args, kwargs) tuples.
+  target None     -> call REMOTE_METHODS / read REMOTE_ATTRS on the ProcessManager
+  target <id>     -> call REMOTE_PROCESS_METHODS on that service's ManagedProcess
+The reply is ("ok", value) or ("err", (type name, message, args)).
+ValueError, KeyError, FileNotFoundError and PermissionError are re-raised
+as themselves on the client, since endpoints catch those; anything else
+becomes SupervisorError. ManagedProcess values are replaced by their
+to_dict() snapshot and rebuilt as RemoteProcess proxies.
+
+Usage:
+    python supervisor.py                     # run the daemon
+    CMD_PATROL_SUPERVISOR=1 python app.py    # web front end in client mode
+"""
+
+import json
+import os
+import secrets
+import sys
+import threading
+import urllib.error
+import urllib.request
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+KEY_FILE = Path(__file__).parent / "supervisor.key"
+if os.name == "nt":
+    ADDRESS = r"\\.\pipe\cmd-patrol-supervisor"
+    FAMILY = "AF_PIPE"
+else:
+    ADDRESS = str(Path(__file__).parent / "supervisor.sock")
+    FAMILY = "AF_UNIX"
+
+# Plain (non-callable) ProcessManager attributes readable through RemoteManager
+REMOTE_ATTRS = ("version", "epoch")
+# The only methods the supervisor runs for a client; anything else is refused
+REMOTE_METHODS = frozenset((
+    "get", "list_all", "listing", "changes", "health_check", "health", "metrics", "crashes",
+    "register", "register_many", "discover", "unregister", "start", "stop", "restart",
+    "cleanup_and_start_all", "get_logs", "log_page", "query_logs", "runs", "run_logs",
+    "schedule_changed", "profile", "span_stats", "flush", "_save",
+))
+REMOTE_PROCESS_METHODS = frozenset(("start", "stop", "restart", "update", "read_logs", "to_dict"))
+# Exceptions the client re-raises as their own type (endpoints handle them)
+REMOTE_EXCEPTIONS = {e.__name__: e for e in (ValueError, KeyError, FileNotFoundError, PermissionError)}
+WEB_URL = os.environ.get("CMD_PATROL_URL", "http://127.0.0.1:51314")  # web front end, owner of mq.json
+WEB_TIMEOUT = 5  # seconds per MQ request to the web front end
+
+
+def _authkey(create: bool = False) -> bytes:
+    if create and not KEY_FILE.exists():
+        KEY_FILE.write_text(secrets.token_hex(32), encoding="utf-8")
+    return KEY_FILE.read_text(encoding="utf-8").strip().encode()
+
+
+# ── Server side ───────────────────────────────────────────────
+def _encode(value):
+    from process_manager import ManagedProcess
+    if isinstance(value, ManagedProcess):
+        return {"__proc__": value.to_dict()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_encode(v) for v in value)
+    return value
+
+
+def _dispatch(manager, request):
+    target, name, args, kwargs = request
+    allowed = REMOTE_METHODS.union(REMOTE_ATTRS) if target is None else REMOTE_PROCESS_METHODS
+    if name not in allowed:
+        raise AttributeError(f"{name} is not available remotely")
+    obj = manager if target is None else manager.get(target)
+    if obj is None:
+        return None
+    attr = getattr(obj, name)
+    return _encode(attr(*args, **kwargs) if callable(attr) else attr)
+
+
+def _error(e: Exception) -> tuple:
+    """(type name, message, args) for an "err" reply."""
+    message = f"{type(e).__name__}: {e}"
+    for name, cls in REMOTE_EXCEPTIONS.items():
+        if type(e) is cls:
+            if isinstance(e, OSError) and e.filename is not None:
+                return name, message, (e.errno, e.strerror, e.filename)
+            return name, message, e.args
+        if isinstance(e, cls):  # subclass (JSONDecodeError, ...): keep the text, not its signature
+            return name, message, (str(e),)
+    return type(e).__name__, message, ()
+
+
+def _serve_connection(manager, conn):
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                reply = ("ok", _dispatch(manager, request))
+            except Exception as e:
+                reply = ("err", _error(e))
+            try:
+                conn.send(reply)
+            except OSError:
+                return
+
+
+class WebMQ:
+    """mq_store stand-in for the supervisor.
+
+    mq.json has one writer, the web process; crash events raised here go
+    through its HTTP API like any other publisher's (see patrol_mq.py).
+    Both calls return None when the web process is unreachable.
+    """
+
+    def __init__(self, url: str = WEB_URL):
+        self.url = url.rstrip("/")
+
+    def _request(self, path: str, payload: dict = None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(self.url + path, data=data, method="POST" if data else "GET",
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=WEB_TIMEOUT) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                print(f"[supervisor] MQ request {path} failed: {e}", file=sys.stderr, flush=True)
+            return None
+        except Exception as e:
+            print(f"[supervisor] MQ request {path} failed: {e}", file=sys.stderr, flush=True)
+            return None
+
+    def publish(self, source: str, type: str, title: str, detail: str = "", meta: dict = None):
+        return self._request("/api/mq/publish", {"source": source, "type": type, "title": title,
+                                                 "detail": detail, "meta": meta or {}})
+
+    def get(self, msg_id: str):
+        return self._request(f"/api/mq/messages/{msg_id}")
+
+
+def serve():
+    from process_manager import ProcessManager
+    manager = ProcessManager()
+    manager.mq = WebMQ()
+    manager.cleanup_and_start_all()
+    manager.start_watching()
+    manager.start_sampling()
+    manager.start_probing()
+    manager.start_scheduling()
+    if FAMILY == "AF_UNIX" and os.path.exists(ADDRESS):
+        os.unlink(ADDRESS)
+    with Listener(ADDRESS, family=FAMILY, authkey=_authkey(create=True)) as listener:
+        print(f"[supervisor] listening on {ADDRESS}", flush=True)
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # Failed handshakes (bad auth key etc.) must not kill the daemon
+                print(f"[supervisor] accept failed: {e}", file=sys.stderr, flush=True)
+                continue
+            threading.Thread(target=_serve_connection, args=(manager, conn), daemon=True).start()
+
+
+# ── Client side ───────────────────────────────────────────────
+class SupervisorError(RuntimeError):
+    pass
+
+
+class RemoteProcess:
+    """Proxy for a ManagedProcess living in the supervisor.
+
+    Plain fields come from the to_dict() snapshot the proxy was built from;
+    REMOTE_PROCESS_METHODS are forwarded and refresh that snapshot afterwards.
+    Any other name raises AttributeError.
+    """
+
+    def __init__(self, client: "RemoteManager", snapshot: dict):
+        self._client = client
+        self._snapshot = snapshot
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self._snapshot:
+            return self._snapshot[name]
+        if name not in REMOTE_PROCESS_METHODS:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            result = self._client._call(self._snapshot["id"], name, args, kwargs)
+            if name != "read_logs":
+                fresh = self._client._call(self._snapshot["id"], "to_dict", (), {})
+                if fresh:
+                    self._snapshot = fresh
+            return result
+        return call
+
+    def to_dict(self):
+        return dict(self._snapshot)
+
+
+class RemoteManager:
+    """Drop-in stand-in for ProcessManager that forwards to the supervisor."""
+
+    def __init__(self, address: str = ADDRESS, family: str = FAMILY):
+        self._address = address
+        self._family = family
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self._address, family=self._family, authkey=_authkey())
+            self._local.conn = conn
+        return conn
+
+    def _call(self, target, name, args, kwargs):
+        for attempt in (1, 2):
+            try:
+                conn = self._conn()
+                conn.send((target, name, args, kwargs))
+                break
+            except (EOFError, OSError) as e:
+                # Supervisor restarted: the request never left, so reconnect and send it once more
+                self._local.conn = None
+                if attempt == 2:
+                    raise SupervisorError(f"supervisor unreachable: {e}") from e
+        try:
+            status, value = conn.recv()
+        except (EOFError, OSError) as e:
+            # The request went out and may have run (start, stop, ...): never send it twice
+            self._local.conn = None
+            raise SupervisorError(f"supervisor connection lost during {name}: {e}") from e
+        if status == "err":
+            name, message, args = value
+            if name in REMOTE_EXCEPTIONS:
+                raise REMOTE_EXCEPTIONS[name](*args)
+            raise SupervisorError(message)
+        return self._decode(value)
+
+    def _decode(self, value):
+        if isinstance(value, dict) and "__proc__" in value:
+            return RemoteProcess(self, value["__proc__"])
+        if isinstance(value, (list, tuple)):
+            return type(value)(self._decode(v) for v in value)
+        return value
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name in REMOTE_ATTRS:
+            return self._call(None, name, (), {})
+        if name not in REMOTE_METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(None, name, args, kwargs)
+
+
+if __name__ == "__main__":
+    serve()
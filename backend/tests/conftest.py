@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modules are flat (import process_manager), as when app.py runs from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import crash_store  # noqa: E402
+import mq_store  # noqa: E402
+import process_manager as pm  # noqa: E402
+import script_meta  # noqa: E402
+
+
+@pytest.fixture
+def sandbox(tmp_path, monkeypatch):
+    """Point every persistent file at a temp dir, like bench_suite._sandbox."""
+    monkeypatch.setattr(pm, "SERVICES_FILE", tmp_path / "services.json")
+    monkeypatch.setattr(script_meta, "META_FILE", tmp_path / "script_meta.json")
+    monkeypatch.setattr(script_meta, "_cache", None)
+    monkeypatch.setattr(mq_store, "MQ_FILE", tmp_path / "mq.json")
+    monkeypatch.setattr(crash_store, "CRASH_FILE", tmp_path / "crashes.json")
+    monkeypatch.setattr(crash_store, "_records", None)
+    return tmp_path
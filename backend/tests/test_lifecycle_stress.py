@@ -0,0 +1,138 @@
+"""
+Lifecycle stress test: many threads race start/stop/restart and listing
+against real child processes (sleep / python -c), then check that every
+applied transition was legal, every published snapshot was consistent,
+and no child outlived the test.
+"""
+
+import random
+import shlex
+import sys
+import threading
+import time
+
+import pytest
+
+import process_manager as pm
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="uses /proc and POSIX children")
+
+WORKERS = 8
+DURATION = 4.0  # seconds of hammering
+COMMANDS = [
+    "sleep 30",
+    f"{shlex.quote(sys.executable)} -u -c \"import time; print('up', flush=True); time.sleep(30)\"",
+    # Exits on its own, so running -> stopped races the explicit stops
+    f"{shlex.quote(sys.executable)} -u -c \"import time; print('short'); time.sleep(0.05)\"",
+    f"{shlex.quote(sys.executable)} -u -c \"import sys; sys.exit(3)\"",
+]
+
+
+def _alive(pid: int) -> bool:
+    """Running and not a zombie."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    """Record every status change seen across a _transition call, and every pid handed out.
+
+    The (before, after) pair is checked against TRANSITIONS whatever the
+    call returned, so a guard that lets a bad move through (or changes the
+    status while reporting failure) is caught.
+    """
+    applied, illegal, pids = [], [], set()
+    lock = threading.Lock()
+    original = pm.ManagedProcess._transition
+
+    def transition(self, status, **fields):
+        previous = self.status
+        ok = original(self, status, **fields)
+        after = self.status
+        with lock:
+            if ok:
+                applied.append((previous, after))
+            if after != previous and after not in pm.TRANSITIONS.get(previous, ()):
+                illegal.append((self.id, previous, after, ok))
+            if not ok and after != previous:
+                illegal.append((self.id, previous, after, "changed on a refused transition"))
+            if ok and fields.get("pid"):
+                pids.add(fields["pid"])
+        return ok
+
+    monkeypatch.setattr(pm.ManagedProcess, "_transition", transition)
+    return applied, illegal, pids
+
+
+def _check_snapshot(d: dict, problems: list):
+    status, pid = d["status"], d["pid"]
+    if status not in pm.TRANSITIONS:
+        problems.append(f"unknown status {status!r}")
+    elif status == "running" and not pid:
+        problems.append(f"{d['id']} running without a pid")
+    elif status in ("stopped", "error") and pid:
+        problems.append(f"{d['id']} {status} with pid {pid}")
+
+
+def test_concurrent_start_stop_list(sandbox, recorder):
+    applied, illegal, pids = recorder
+    manager = pm.ProcessManager()
+    ids = []
+    for i, command in enumerate(COMMANDS * 2):
+        script = sandbox / f"svc{i}.sh"
+        script.write_text("true\n")
+        proc = manager.register(str(script))
+        proc.command = command
+        proc.cwd = str(sandbox)
+        ids.append(proc.id)
+
+    problems, errors = [], []
+    deadline = time.monotonic() + DURATION
+
+    def hammer(seed: int):
+        rnd = random.Random(seed)
+        try:
+            while time.monotonic() < deadline:
+                op = rnd.choice(("start", "stop", "restart", "list", "list", "health"))
+                id = rnd.choice(ids)
+                if op == "start":
+                    manager.start(id)
+                elif op == "stop":
+                    manager.stop(id)
+                elif op == "restart":
+                    manager.restart(id)
+                elif op == "health":
+                    manager.health_check()
+                else:
+                    for proc in manager.list_all():
+                        _check_snapshot(proc.to_dict(), problems)
+        except Exception as e:
+            errors.append(repr(e))
+
+    threads = [threading.Thread(target=hammer, args=(seed,)) for seed in range(WORKERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for id in ids:
+        manager.stop(id)
+    # Self-exiting children are reaped by their reader threads
+    end = time.monotonic() + 5
+    while time.monotonic() < end and any(_alive(pid) for pid in pids):
+        time.sleep(0.05)
+    manager.flush()
+
+    assert not errors
+    assert not illegal
+    assert not problems[:10]
+    assert len(applied) > 50, "the workers barely did anything"
+    assert pids, "no child was ever started"
+    assert [pid for pid in pids if _alive(pid)] == []
+    for proc in manager.list_all():
+        assert proc.status in ("stopped", "error"), (proc.id, proc.status)
+        assert proc.pid is None
@@ -0,0 +1,52 @@
+"""Merged log paging (log_export.merged_page) across services with unequal timestamps."""
+
+import log_export
+import process_manager as pm
+
+
+class _Manager:
+    """The two ProcessManager calls log_export uses, over hand-stamped buffers."""
+
+    def __init__(self, procs: dict):
+        self.procs = procs
+
+    def log_page(self, id, start=0, limit=1000, since=None, until=None, stop=None):
+        return self.procs[id].log_page(start, limit, since, until, stop)
+
+    def get_logs(self, id, offset=0):
+        return self.procs[id].read_logs(offset)
+
+
+def _service(id: str, stamps: list[float]) -> pm.ManagedProcess:
+    proc = pm.ManagedProcess(id=id, name=id, script_path=f"/tmp/{id}.sh", cwd="/tmp", command="true")
+    for ts in stamps:
+        proc.log_buffer.append(ts, f"{id}@{ts:g}")
+    return proc
+
+
+def _page_all(manager, ids, since, limit):
+    rows, positions = log_export.merged_page(manager, ids, {}, since, limit)
+    pages = [rows]
+    while rows:
+        rows, positions = log_export.merged_page(manager, ids, positions, None, limit)
+        pages.append(rows)
+    return [row for page in pages for row in page]
+
+
+def test_since_pins_services_without_rows_on_the_first_page(monkeypatch):
+    monkeypatch.setattr(pm.ManagedProcess, "_prune_logs_locked", lambda self, now: None)
+    # A logs late, B mostly early: the first page after `since` only has A's lines
+    manager = _Manager({"a": _service("a", [100, 101, 102, 103]),
+                        "b": _service("b", [0, 1, 2, 104, 105])})
+    rows = _page_all(manager, ["a", "b"], since=100, limit=3)
+    assert [line for _, _, _, line in rows] == ["a@100", "a@101", "a@102", "a@103", "b@104", "b@105"]
+    stamps = [ts for ts, _, _, _ in rows]
+    assert stamps == sorted(stamps)
+
+
+def test_cursor_after_since_page_skips_older_lines(monkeypatch):
+    monkeypatch.setattr(pm.ManagedProcess, "_prune_logs_locked", lambda self, now: None)
+    manager = _Manager({"a": _service("a", [100, 101]), "b": _service("b", [0, 1, 2])})
+    rows, positions = log_export.merged_page(manager, ["a", "b"], {}, 50, 10)
+    assert [line for _, _, _, line in rows] == ["a@100", "a@101"]
+    assert positions == {"a": 2, "b": 3}
@@ -0,0 +1,81 @@
+"""RemoteManager <-> supervisor IPC: no duplicate sends, only allowlisted calls."""
+
+import sys
+import threading
+from multiprocessing.connection import Listener
+
+import pytest
+
+import supervisor
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="uses a Unix socket")
+
+
+class _Manager:
+    def __init__(self):
+        self.started = []
+
+    def start(self, id):
+        self.started.append(id)
+        return True
+
+    def reload(self):
+        raise AssertionError("not reachable remotely")
+
+    def get(self, id):
+        return None
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """A supervisor listener over a temp socket; `drop` makes it hang up instead of replying once."""
+    monkeypatch.setattr(supervisor, "KEY_FILE", tmp_path / "supervisor.key")
+    address = str(tmp_path / "supervisor.sock")
+    listener = Listener(address, family="AF_UNIX", authkey=supervisor._authkey(create=True))
+    manager, state = _Manager(), {"drop": 0}
+
+    def serve():
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return
+            with conn:
+                while True:
+                    try:
+                        request = conn.recv()
+                    except (EOFError, OSError):
+                        break
+                    try:
+                        reply = ("ok", supervisor._dispatch(manager, request))
+                    except Exception as e:
+                        reply = ("err", supervisor._error(e))
+                    if state["drop"]:
+                        state["drop"] -= 1
+                        break  # ran the request, lost the connection before answering
+                    conn.send(reply)
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield supervisor.RemoteManager(address, "AF_UNIX"), manager, state
+    listener.close()
+
+
+def test_lost_reply_is_not_resent(server):
+    client, manager, state = server
+    state["drop"] = 1
+    with pytest.raises(supervisor.SupervisorError):
+        client.start("svc")
+    assert manager.started == ["svc"]
+    # The next call reconnects
+    assert client.start("svc") is True
+    assert manager.started == ["svc", "svc"]
+
+
+def test_only_allowlisted_methods_dispatch(server):
+    client, manager, _ = server
+    with pytest.raises(AttributeError):
+        client.reload
+    with pytest.raises(supervisor.SupervisorError, match="not available remotely"):
+        client._call(None, "reload", (), {})
+    with pytest.raises(supervisor.SupervisorError, match="not available remotely"):
+        client._call("svc", "_force_cleanup", (), {})
@@ -1,6 +1,8 @@
 """
 cmd-patrol system tray wrapper.
-Launches the Flask backend as a subprocess, monitors it, and auto-restarts on crash.
+Launches the supervisor daemon (owns services + logs) and the Flask backend
+(web/API front end) as subprocesses, monitors both, and auto-restarts on crash.
+Restarting the backend never touches running services.
 Provides a tray icon with quick actions.
 """
 import os
@@ -10,24 +12,40 @@ import subprocess
 import threading
 import webbrowser
 import urllib.request
+from collections import deque
+from functools import lru_cache
 
 from PIL import Image, ImageDraw, ImageFont
 import pystray
 
 URL = "http://127.0.0.1:51314"
 BACKEND_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+SUPERVISOR_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "supervisor.py")
 BACKEND_CWD = os.path.dirname(os.path.abspath(__file__))
 
+HEALTH_URL = URL + "/healthz"
+READY_TIMEOUT = 30  # seconds to wait for /healthz after a (re)start
+RESTART_BACKOFF_MIN = 1.0  # seconds before the first crash restart
+RESTART_BACKOFF_MAX = 60.0
+CRASH_LOOP_WINDOW = 120  # seconds
+CRASH_LOOP_LIMIT = 5  # crashes within the window => stop auto-restarting
+STABLE_UPTIME = 300  # seconds up before a crash no longer counts toward the backoff
+
 # ── State ─────────────────────────────────────────────────────
 backend_proc: subprocess.Popen = None
+supervisor_proc: subprocess.Popen = None
 lock = threading.Lock()
 should_quit = False
+quit_event = threading.Event()
 tray_icon: pystray.Icon = None
+tray_state = None  # last state pushed to the tray icon
+crash_times = {"backend": deque(), "supervisor": deque()}
 
 
 # ── Icon generation ───────────────────────────────────────────
+@lru_cache(maxsize=None)
 def create_icon_image(color="#3b82f6"):
-    """Create a simple 64x64 icon with 'CP' text."""
+    """Create a simple 64x64 icon with 'CP' text (rendered once per color)."""
     img = Image.new("RGBA", (64, 64), (0, 0, 0, 0))
     draw = ImageDraw.Draw(img)
     # rounded-ish background
@@ -53,79 +71,169 @@ def icon_blue():
     return create_icon_image("#3b82f6")
 
 
+def icon_amber():
+    return create_icon_image("#f59e0b")
+
+
+TRAY_STATES = {
+    "starting": (icon_blue, "启动中..."),
+    "running": (icon_green, "运行中"),
+    "stopped": (icon_red, "已停止"),
+    "backoff": (icon_amber, "崩溃，等待重启..."),
+    "crashloop": (icon_red, "反复崩溃，已暂停自动重启"),
+}
+
+
+def set_tray_state(state: str):
+    """Push a state to the tray icon; no-op if it hasn't changed."""
+    global tray_state
+    if state == tray_state:
+        return
+    tray_state = state
+    if tray_icon is None:
+        return
+    icon_fn, label = TRAY_STATES[state]
+    tray_icon.icon = icon_fn()
+    tray_icon.title = f"cmd-patrol — {label}"
+
+
+# ── Process watching ──────────────────────────────────────────
+def _record_crash(kind: str, uptime: float) -> float | None:
+    """Record a crash; return the restart delay, or None when crash-looping."""
+    now = time.monotonic()
+    times = crash_times[kind]
+    if uptime >= STABLE_UPTIME:
+        times.clear()  # it had recovered: start the backoff over
+    times.append(now)
+    while times and now - times[0] > CRASH_LOOP_WINDOW:
+        times.popleft()
+    if len(times) >= CRASH_LOOP_LIMIT:
+        return None
+    return min(RESTART_BACKOFF_MAX, RESTART_BACKOFF_MIN * 2 ** (len(times) - 1))
+
+
+def _watch(kind: str, proc: subprocess.Popen, current, restart):
+    """Block on the process handle; restart with backoff if it dies unexpectedly."""
+    started = time.monotonic()
+    rc = proc.wait()
+    with lock:
+        # Intentional stops clear/replace the global before we get the lock
+        if should_quit or current() is not proc:
+            return
+    delay = _record_crash(kind, time.monotonic() - started)
+    if delay is None:
+        print(f"[tray] {kind} crash loop detected (exit {rc}), auto-restart paused")
+        set_tray_state("crashloop")  # the tray menu's restart items reset it
+        return
+    print(f"[tray] {kind} died (exit {rc}), restarting in {delay:.0f}s...")
+    if kind == "backend":
+        set_tray_state("backoff")
+    if quit_event.wait(delay):
+        return
+    with lock:
+        if current() is not proc:
+            return  # someone restarted it manually meanwhile
+    restart()
+
+
+def _wait_ready(proc: subprocess.Popen):
+    """Probe /healthz with exponential backoff until the backend answers."""
+    delay = 0.1
+    deadline = time.monotonic() + READY_TIMEOUT
+    while not quit_event.is_set() and time.monotonic() < deadline:
+        if proc.poll() is not None:
+            return  # died during startup; _watch handles it
+        try:
+            urllib.request.urlopen(HEALTH_URL, timeout=2)
+            with lock:
+                if backend_proc is proc:
+                    set_tray_state("running")
+            return
+        except Exception:
+            pass
+        if quit_event.wait(delay):
+            return
+        delay = min(delay * 2, 2.0)
+
+
+def _spawn(script: str, extra_env: dict = None) -> subprocess.Popen:
+    env = os.environ.copy()
+    env["PYTHONIOENCODING"] = "utf-8"
+    env.update(extra_env or {})
+    return subprocess.Popen(
+        [sys.executable, script],
+        cwd=BACKEND_CWD,
+        env=env,
+        creationflags=subprocess.CREATE_NO_WINDOW,
+    )
+
+
+def _terminate(proc: subprocess.Popen):
+    if proc and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ── Supervisor management ─────────────────────────────────────
+def start_supervisor():
+    global supervisor_proc
+    with lock:
+        if supervisor_proc and supervisor_proc.poll() is None:
+            return  # already running
+        proc = supervisor_proc = _spawn(SUPERVISOR_SCRIPT)
+    threading.Thread(target=_watch, args=("supervisor", proc, lambda: supervisor_proc, start_supervisor),
+                     daemon=True).start()
+
+
+def stop_supervisor():
+    global supervisor_proc
+    with lock:
+        proc, supervisor_proc = supervisor_proc, None
+        _terminate(proc)
+
+
+def restart_supervisor():
+    crash_times["supervisor"].clear()  # manual restart resets crash-loop detection
+    stop_supervisor()
+    time.sleep(0.5)
+    start_supervisor()
+    with lock:
+        backend_up = backend_proc is not None and backend_proc.poll() is None
+    if backend_up:
+        set_tray_state("running")
+
+
 # ── Backend management ────────────────────────────────────────
 def start_backend():
     global backend_proc
     with lock:
         if backend_proc and backend_proc.poll() is None:
             return  # already running
-        env = os.environ.copy()
-        env["PYTHONIOENCODING"] = "utf-8"
-        backend_proc = subprocess.Popen(
-            [sys.executable, BACKEND_SCRIPT],
-            cwd=BACKEND_CWD,
-            env=env,
-            creationflags=subprocess.CREATE_NO_WINDOW,
-        )
-    update_icon_status()
+        proc = backend_proc = _spawn(BACKEND_SCRIPT, {"CMD_PATROL_SUPERVISOR": "1"})
+    set_tray_state("starting")
+    threading.Thread(target=_watch, args=("backend", proc, lambda: backend_proc, start_backend),
+                     daemon=True).start()
+    threading.Thread(target=_wait_ready, args=(proc,), daemon=True).start()
 
 
 def stop_backend():
     global backend_proc
     with lock:
-        if backend_proc and backend_proc.poll() is None:
-            backend_proc.terminate()
-            try:
-                backend_proc.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                backend_proc.kill()
-        backend_proc = None
-    update_icon_status()
+        proc, backend_proc = backend_proc, None
+        _terminate(proc)
+    set_tray_state("stopped")
 
 
 def restart_backend():
+    crash_times["backend"].clear()  # manual restart resets crash-loop detection
     stop_backend()
     time.sleep(0.5)
     start_backend()
 
 
-def is_backend_alive():
-    with lock:
-        if backend_proc is None or backend_proc.poll() is not None:
-            return False
-    # Also do a quick HTTP check
-    try:
-        urllib.request.urlopen(URL + "/api/mq/stats", timeout=3)
-        return True
-    except Exception:
-        # Process is alive but HTTP not ready yet — still alive
-        with lock:
-            return backend_proc is not None and backend_proc.poll() is None
-
-
-def update_icon_status():
-    if tray_icon is None:
-        return
-    alive = is_backend_alive()
-    tray_icon.icon = icon_green() if alive else icon_red()
-    tray_icon.title = f"cmd-patrol — {'运行中' if alive else '已停止'}"
-
-
-# ── Watchdog thread ───────────────────────────────────────────
-def watchdog():
-    """Monitor backend process; auto-restart if it dies."""
-    while not should_quit:
-        time.sleep(3)
-        if should_quit:
-            break
-        with lock:
-            proc_dead = backend_proc is None or backend_proc.poll() is not None
-        if proc_dead and not should_quit:
-            print("[tray] Backend died, auto-restarting...")
-            start_backend()
-        update_icon_status()
-
-
 # ── Tray menu actions ─────────────────────────────────────────
 def on_open_browser(icon, item):
     webbrowser.open(URL)
@@ -165,10 +273,16 @@ def on_restart_backend(icon, item):
     threading.Thread(target=restart_backend, daemon=True).start()
 
 
+def on_restart_supervisor(icon, item):
+    threading.Thread(target=restart_supervisor, daemon=True).start()
+
+
 def on_quit(icon, item):
     global should_quit
     should_quit = True
+    quit_event.set()
     stop_backend()
+    stop_supervisor()
     icon.stop()
 
 
@@ -183,19 +297,18 @@ def main():
         pystray.MenuItem("停止全部服务", on_stop_all),
         pystray.Menu.SEPARATOR,
         pystray.MenuItem("重启后端", on_restart_backend),
+        pystray.MenuItem("重启监管进程", on_restart_supervisor),
         pystray.Menu.SEPARATOR,
         pystray.MenuItem("退出", on_quit),
     )
 
     tray_icon = pystray.Icon("cmd-patrol", icon_blue(), "cmd-patrol — 启动中...", menu)
 
-    # Start backend before entering tray loop
+    # Start supervisor (owns services) and backend before entering tray loop.
+    # Each child gets a watcher thread blocked on its process handle.
+    start_supervisor()
     start_backend()
 
-    # Start watchdog
-    wd = threading.Thread(target=watchdog, daemon=True)
-    wd.start()
-
     # pystray.run() blocks — this is the main loop
     tray_icon.run()
 